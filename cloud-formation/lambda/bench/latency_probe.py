@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""Alarm-to-chat latency probe and SLO report.
+
+Breaches a volume with the disk fill tool, records the breach time and
+correlates it with the first breaching agent datapoint, the alarm's
+``StateChangeTime``, the SNS publish time and the notifier's
+``alarm delivered`` log line (invocation start, POST start, POST complete).
+Each trial is broken down into stages:
+
+    agent   breach -> end of the first breaching collection interval
+    alarm   agent datapoint -> StateChangeTime (flush, ingestion, evaluation)
+    sns     StateChangeTime -> SNS publish
+    lambda  SNS publish -> webhook POST start (delivery, cold start, handler)
+    http    POST start -> POST complete
+    total   breach -> POST complete
+
+and the report gives p50/p95/p99 per stage.
+
+Live mode runs on the disk monitor instance (needs boto3 and the notifier's
+LOG_LEVEL at INFO with LOG_SAMPLE_RATE=1):
+
+    python3 latency_probe.py live --mount /mnt/vol1 --alarm mnt_vol1_high_disk_usage \\
+        --function <notifier function name> --trials 5
+
+Local mode drives ``lambda_handler`` against the stub Rocket.Chat endpoint
+for the lambda and http stages and models agent/alarm/sns from the
+collection interval, alarm period and agent flush interval:
+
+    python3 latency_probe.py local --trials 200 --interval 60 --period 60 --flush-interval 60
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_CODE_DIR = os.path.normpath(os.path.join(BENCH_DIR, "..", "code"))
+TOOLS_DIR = os.path.normpath(os.path.join(BENCH_DIR, "..", "..", "sh"))
+for path in (BENCH_DIR, LAMBDA_CODE_DIR, TOOLS_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from notifier_bench import percentile  # noqa: E402
+from stubs import StubRocketChat, StubSSM, patched, synth_event  # noqa: E402
+
+STAGES = ("agent", "alarm", "sns", "lambda", "http", "total")
+
+# Log line written by lambda_function for every posted alarm
+DELIVERED_MSG = "alarm delivered"
+
+
+def stages(trial):
+    """Seconds per stage for one trial's timestamps (stages with a missing timestamp are None)."""
+    def span(start, end):
+        if trial.get(start) is None or trial.get(end) is None:
+            return None
+        return max(0.0, trial[end] - trial[start])
+
+    return {
+        "agent": span("breachAt", "datapointAt"),
+        "alarm": span("datapointAt", "stateChangeTime"),
+        "sns": span("stateChangeTime", "publishedAt"),
+        "lambda": span("publishedAt", "postStartedAt"),
+        "http": span("postStartedAt", "postedAt"),
+        "total": span("breachAt", "postedAt"),
+    }
+
+
+def slo_report(trials, modelled=()):
+    """p50/p95/p99/max seconds per stage over ``trials`` (dicts of timestamps)."""
+    breakdowns = [stages(trial) for trial in trials]
+    report = {"trials": len(trials), "modelled": list(modelled), "stages": {}}
+    for stage in STAGES:
+        values = [b[stage] for b in breakdowns if b[stage] is not None]
+        report["stages"][stage] = {
+            "samples": len(values),
+            "p50": round(percentile(values, 50), 3),
+            "p95": round(percentile(values, 95), 3),
+            "p99": round(percentile(values, 99), 3),
+            "max": round(max(values), 3) if values else 0.0,
+        }
+    parts = {stage: report["stages"][stage]["p95"] for stage in STAGES if stage != "total"}
+    report["dominant_stage"] = max(parts, key=parts.get) if any(parts.values()) else None
+    return report
+
+
+def check_slo(report, max_p95_seconds=None, max_p99_seconds=None):
+    """Return SLO violations on the total stage (empty when within the SLO)."""
+    total = report["stages"]["total"]
+    violations = []
+    if max_p95_seconds is not None and total["p95"] > max_p95_seconds:
+        violations.append(f"total p95 {total['p95']}s > {max_p95_seconds}s")
+    if max_p99_seconds is not None and total["p99"] > max_p99_seconds:
+        violations.append(f"total p99 {total['p99']}s > {max_p99_seconds}s")
+    return violations
+
+
+def format_report(report):
+    lines = [f"{'stage':<8}{'samples':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"]
+    for stage, s in report["stages"].items():
+        marker = " (modelled)" if stage in report["modelled"] else ""
+        lines.append(f"{stage:<8}{s['samples']:>9}{s['p50']:>10.3f}{s['p95']:>10.3f}"
+                     f"{s['p99']:>10.3f}{s['max']:>10.3f}{marker}")
+    lines.append(f"Dominant stage (p95): {report['dominant_stage']}")
+    return "\n".join(lines)
+
+
+def delivered_entry(message, alarm, after):
+    """Parse a notifier log line; returns its fields if it is ``alarm``'s ALARM delivery after ``after``."""
+    try:
+        entry = json.loads(message)
+    except ValueError:
+        return None
+    if entry.get("msg") != DELIVERED_MSG or entry.get("alarm") != alarm or entry.get("state") != "ALARM":
+        return None
+    if (entry.get("stateChangeTime") or 0) < after:
+        return None
+    return entry
+
+
+# === Local mode ===
+
+def model_upstream(rng, interval, period, flush_interval, evaluation_lag, sns_seconds):
+    """Draw (agent, alarm, sns) seconds for a breach at a random phase of the collection cycle."""
+    # The agent samples on interval boundaries, so a breach waits for the next one
+    agent = rng.uniform(0, interval)
+    # The sample sits in the agent buffer until the next flush, then alarms
+    # evaluate once the datapoint's period has closed
+    alarm = rng.uniform(0, flush_interval) + rng.uniform(0, period) + evaluation_lag
+    return agent, alarm, sns_seconds
+
+
+def run_local(trials=50, interval=60, period=60, flush_interval=60, evaluation_lag=0.0,
+              sns_ms=50.0, latency_ms=20.0, jitter_ms=10.0, seed=0, quiet=True):
+    """Timestamps for ``trials`` simulated breaches, one real handler invocation each."""
+    import lambda_function
+    from dedup import Deduplicator
+    from ssm_cache import ParameterCache
+    from structured_log import logger
+
+    rng = random.Random(seed)
+    parameter_name = os.environ.get("WEBHOOK_PARAM_NAME", "/rocketchat/webhook_url")
+    results = []
+
+    with StubRocketChat(latency_ms / 1000, jitter_ms / 1000, seed=seed) as chat:
+        ssm = StubSSM({parameter_name: chat.url})
+        # The handler's singletons point at this run's stubs only while it lasts
+        with patched(lambda_function, parameters=ParameterCache(client_factory=lambda: ssm),
+                     deduplicator=Deduplicator()):
+            for n in range(trials):
+                agent, alarm, sns = model_upstream(rng, interval, period, flush_interval, evaluation_lag,
+                                                   sns_ms / 1000)
+                # Place the modelled upstream stages just before "now" so SNS hands over immediately
+                published_at = time.time()
+                state_change_time = published_at - sns
+                datapoint_at = state_change_time - alarm
+                breach_at = datapoint_at - agent
+                event = synth_event(1, alarm_prefix=f"probe{n}", state_change_time=_iso(state_change_time))
+                event["Records"][0]["Sns"]["Timestamp"] = _iso(published_at)
+
+                lines = []
+                with _capture(logger, lines, quiet):
+                    lambda_function.lambda_handler(event, None)
+                delivered = next(filter(None, (delivered_entry(line, f"probe{n}_mnt_vol1_high_disk_usage", 0)
+                                               for line in lines)), None)
+                if delivered is None:
+                    continue
+                results.append({
+                    "breachAt": breach_at,
+                    "datapointAt": datapoint_at,
+                    "stateChangeTime": delivered["stateChangeTime"],
+                    "publishedAt": delivered["publishedAt"],
+                    "postStartedAt": delivered["postStartedAt"],
+                    "postedAt": delivered["postedAt"],
+                })
+    return results
+
+
+def _iso(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "+0000"
+
+
+@contextlib.contextmanager
+def _capture(logger, lines, quiet):
+    """Collect the notifier's log lines (and hide the rest of its stdout when quiet)."""
+    class Sink:
+        def write(self, text):
+            lines.extend(line for line in text.splitlines() if line)
+            if not quiet:
+                sys.stdout.write(text)
+
+        def flush(self):
+            pass
+
+    sink = Sink()
+    previous = logger.stream
+    logger.stream = sink
+    try:
+        with contextlib.redirect_stdout(sink):
+            yield
+    finally:
+        logger.stream = previous
+
+
+# === Live mode ===
+
+class LiveProbe:
+    """Breaches a real volume and correlates the alarm, SNS and notifier timestamps."""
+
+    def __init__(self, mount, alarm, function_name, margin=3.0, timeout=900, poll_seconds=10, clients=None):
+        self.mount = mount
+        self.alarm = alarm
+        self.log_group = f"/aws/lambda/{function_name}"
+        self.margin = margin
+        self.timeout = timeout
+        self.poll_seconds = poll_seconds
+        if clients is None:
+            import boto3
+            clients = {name: boto3.client(name) for name in ("cloudwatch", "logs")}
+        self.cloudwatch = clients["cloudwatch"]
+        self.logs = clients["logs"]
+
+    def alarm_config(self):
+        return self.cloudwatch.describe_alarms(AlarmNames=[self.alarm])["MetricAlarms"][0]
+
+    def wait_for_state(self, state):
+        deadline = time.time() + self.timeout
+        while time.time() < deadline:
+            if self.alarm_config()["StateValue"] == state:
+                return True
+            time.sleep(self.poll_seconds)
+        return False
+
+    def first_breach(self, alarm, after):
+        """Epoch end of the first agent period above the threshold after ``after``.
+
+        Rollup alarms have no single metric, so their agent/alarm split is left out.
+        """
+        if "Namespace" not in alarm:
+            return None
+        dimensions = [{"Name": d["Name"], "Value": d["Value"]} for d in alarm.get("Dimensions", [])]
+        response = self.cloudwatch.get_metric_data(
+            MetricDataQueries=[{
+                "Id": "disk",
+                "MetricStat": {
+                    "Metric": {"Namespace": alarm["Namespace"], "MetricName": alarm["MetricName"],
+                               "Dimensions": dimensions},
+                    "Period": alarm["Period"],
+                    "Stat": "Maximum",
+                },
+            }],
+            StartTime=datetime.fromtimestamp(after - alarm["Period"], timezone.utc),
+            EndTime=datetime.fromtimestamp(time.time(), timezone.utc),
+            ScanBy="TimestampAscending",
+        )
+        result = response["MetricDataResults"][0]
+        for timestamp, value in zip(result["Timestamps"], result["Values"]):
+            if value > alarm["Threshold"]:
+                return timestamp.timestamp() + alarm["Period"]
+        return None
+
+    def delivery(self, after):
+        deadline = time.time() + self.timeout
+        while time.time() < deadline:
+            response = self.logs.filter_log_events(
+                logGroupName=self.log_group,
+                startTime=int(after * 1000),
+                filterPattern=f'"{DELIVERED_MSG}" "{self.alarm}"',
+            )
+            for event in response.get("events", []):
+                entry = delivered_entry(event["message"], self.alarm, after)
+                if entry:
+                    return entry
+            time.sleep(self.poll_seconds)
+        return None
+
+    def trial(self):
+        from disk_fill_tool import clear, fill
+
+        alarm = self.alarm_config()
+        if alarm["StateValue"] != "OK" and not self.wait_for_state("OK"):
+            raise RuntimeError(f"{self.alarm} did not return to OK")
+        started = time.time()
+        try:
+            fill(self.mount, alarm["Threshold"] + self.margin)
+            # fallocate is near-instant, so the breach is when the fill returns
+            breach_at = time.time()
+            entry = self.delivery(started)
+            datapoint_at = self.first_breach(alarm, breach_at)
+        finally:
+            clear([self.mount])
+        if entry is None:
+            raise RuntimeError(f"no delivery of {self.alarm} within {self.timeout}s")
+        return {
+            "breachAt": breach_at,
+            "datapointAt": datapoint_at,
+            "stateChangeTime": entry["stateChangeTime"],
+            "publishedAt": entry["publishedAt"],
+            "postStartedAt": entry["postStartedAt"],
+            "postedAt": entry["postedAt"],
+        }
+
+    def run(self, trials):
+        results = []
+        for n in range(trials):
+            results.append(self.trial())
+            print(json.dumps(dict(results[-1], trial=n + 1, stages=stages(results[-1]))), file=sys.stderr)
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=("local", "live"))
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--report", help="Write the SLO report and raw trials as JSON to this file")
+    parser.add_argument("--max-p95-seconds", type=float, help="Fail when total p95 exceeds this")
+    parser.add_argument("--max-p99-seconds", type=float, help="Fail when total p99 exceeds this")
+    local = parser.add_argument_group("local mode")
+    local.add_argument("--interval", type=float, default=60, help="Agent collection interval (default: 60)")
+    local.add_argument("--period", type=float, default=60, help="Alarm period (default: 60)")
+    local.add_argument("--flush-interval", type=float, default=60, help="Agent force_flush_interval (default: 60)")
+    local.add_argument("--evaluation-lag", type=float, default=0.0, help="Extra seconds before evaluation")
+    local.add_argument("--sns-ms", type=float, default=50.0, help="SNS publish delay (default: 50)")
+    local.add_argument("--latency-ms", type=float, default=20.0, help="Stub Rocket.Chat latency (default: 20)")
+    local.add_argument("--seed", type=int, default=0)
+    live = parser.add_argument_group("live mode")
+    live.add_argument("--mount", default="/mnt/vol1")
+    live.add_argument("--alarm", default="mnt_vol1_high_disk_usage")
+    live.add_argument("--function", help="Notifier Lambda function name")
+    live.add_argument("--margin", type=float, default=3.0, help="Percent filled above the threshold (default: 3)")
+    live.add_argument("--timeout", type=float, default=900, help="Seconds to wait per trial (default: 900)")
+    args = parser.parse_args(argv)
+
+    if args.mode == "local":
+        trials = run_local(args.trials, args.interval, args.period, args.flush_interval, args.evaluation_lag,
+                           args.sns_ms, args.latency_ms, seed=args.seed)
+        report = slo_report(trials, modelled=("agent", "alarm", "sns"))
+    else:
+        if not args.function:
+            parser.error("live mode needs --function")
+        probe = LiveProbe(args.mount, args.alarm, args.function, margin=args.margin, timeout=args.timeout)
+        trials = probe.run(args.trials)
+        report = slo_report(trials)
+
+    print(format_report(report))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(dict(report, trials_raw=trials), f, indent=2)
+
+    violations = check_slo(report, args.max_p95_seconds, args.max_p99_seconds)
+    for violation in violations:
+        print(f"❌ SLO exceeded: {violation}", file=sys.stderr)
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Offline replay and load benchmark for the Rocket.Chat notifier Lambda.
+
+Drives ``lambda_handler`` with synthesised SNS events against a local stub
+Rocket.Chat webhook and a stubbed SSM client, then reports throughput,
+handler latency percentiles, peak RSS and cold-start import time.
+
+    python3 cloud-formation/lambda/bench/notifier_bench.py --records 50 --invocations 20
+    python3 cloud-formation/lambda/bench/notifier_bench.py --latency-ms 200 --throttle-rate 0.1 --max-p99-ms 1500
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_CODE_DIR = os.path.normpath(os.path.join(BENCH_DIR, "..", "code"))
+for path in (BENCH_DIR, LAMBDA_CODE_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from stubs import StubRocketChat, StubSSM, patched, synth_event  # noqa: E402
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def measure_import_time(module="lambda_function"):
+    """Time a cold import of the handler module in a fresh interpreter."""
+    code = (
+        "import time; t = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - t)"
+    )
+    env = dict(os.environ, PYTHONPATH=LAMBDA_CODE_DIR, PYTHONDONTWRITEBYTECODE="1")
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_benchmark(records=10, dimensions=3, invocations=10, latency=0.0, jitter=0.0,
+                  error_rate=0.0, throttle_rate=0.0, ssm_latency=0.0, concurrency=None,
+                  seed=0, measure_import=True, quiet=True):
+    """Run the handler ``invocations`` times and return a report dict."""
+    import lambda_function
+    from dedup import Deduplicator
+    from ssm_cache import ParameterCache
+
+    parameter_name = os.environ.get("WEBHOOK_PARAM_NAME", "/rocketchat/webhook_url")
+
+    latencies = []
+    outcome = {"posted": 0, "deduped": 0, "failed": 0}
+
+    with StubRocketChat(latency, jitter, error_rate, throttle_rate, seed=seed) as chat:
+        ssm = StubSSM({parameter_name: chat.url}, latency=ssm_latency)
+        # The handler's singletons point at this run's stubs only while it lasts
+        stubbed = patched(lambda_function, parameters=ParameterCache(client_factory=lambda: ssm),
+                          deduplicator=Deduplicator(),
+                          MAX_CONCURRENCY=concurrency or lambda_function.MAX_CONCURRENCY)
+
+        sink = open(os.devnull, "w") if quiet else sys.stdout
+        started = time.perf_counter()
+        try:
+            with stubbed:
+                for n in range(invocations):
+                    event = synth_event(records, dimensions, alarm_prefix=f"bench{n}")
+                    t0 = time.perf_counter()
+                    with contextlib.redirect_stdout(sink):
+                        result = lambda_function.lambda_handler(event, None)
+                    latencies.append(time.perf_counter() - t0)
+                    for r in result.get("results", []):
+                        outcome[r["status"]] = outcome.get(r["status"], 0) + 1
+        finally:
+            if quiet:
+                sink.close()
+        elapsed = time.perf_counter() - started
+        statuses = dict(chat.statuses)
+
+    total = records * invocations
+    return {
+        "records": total,
+        "invocations": invocations,
+        "dimensions": dimensions,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(max(latencies) * 1000, 2) if latencies else 0.0,
+        },
+        "outcome": outcome,
+        "webhook_statuses": statuses,
+        "ssm_calls": ssm.calls,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "import_time_ms": round(measure_import_time() * 1000, 2) if measure_import else None,
+    }
+
+
+def check_budget(report, max_p99_ms=None, min_throughput=None, max_import_ms=None):
+    """Return a list of budget violations (empty when the run is within budget)."""
+    violations = []
+    if max_p99_ms is not None and report["latency_ms"]["p99"] > max_p99_ms:
+        violations.append(f"p99 {report['latency_ms']['p99']}ms > {max_p99_ms}ms")
+    if min_throughput is not None and report["throughput_rps"] < min_throughput:
+        violations.append(f"throughput {report['throughput_rps']}/s < {min_throughput}/s")
+    if max_import_ms is not None and report["import_time_ms"] is not None and report["import_time_ms"] > max_import_ms:
+        violations.append(f"import {report['import_time_ms']}ms > {max_import_ms}ms")
+    return violations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=10, help="SNS records per event (default: 10)")
+    parser.add_argument("--dimensions", type=int, default=3, help="Dimensions per alarm (default: 3)")
+    parser.add_argument("--invocations", type=int, default=20, help="Handler invocations (default: 20)")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Stub Rocket.Chat latency (default: 20)")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="Extra random latency (default: 10)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of POSTs answering 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of POSTs answering 429")
+    parser.add_argument("--ssm-latency-ms", type=float, default=30.0, help="Stub SSM latency (default: 30)")
+    parser.add_argument("--concurrency", type=int, help="Override MAX_CONCURRENCY")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-p99-ms", type=float, help="Fail when handler p99 exceeds this")
+    parser.add_argument("--min-throughput", type=float, help="Fail when records/s drops below this")
+    parser.add_argument("--max-import-ms", type=float, help="Fail when cold import exceeds this")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(
+        records=args.records,
+        dimensions=args.dimensions,
+        invocations=args.invocations,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        ssm_latency=args.ssm_latency_ms / 1000,
+        concurrency=args.concurrency,
+        seed=args.seed,
+    )
+    print(json.dumps(report, indent=2))
+
+    violations = check_budget(report, args.max_p99_ms, args.min_throughput, args.max_import_ms)
+    for violation in violations:
+        print(f"❌ Budget exceeded: {violation}", file=sys.stderr)
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
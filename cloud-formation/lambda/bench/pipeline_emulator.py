@@ -0,0 +1,712 @@
+#!/usr/bin/env python3
+"""Local end-to-end emulation of alarm -> SNS -> notifier -> Rocket.Chat.
+
+Reads the templates ``cdk synth`` writes to ``code/cdk.out`` and takes from
+them the disk alarms (metric, dimensions, statistic, period, evaluation
+periods, comparison, threshold, actions), the notifier's environment and its
+subscription: direct SNS, or the digest SQS queue with its batch size and
+batching window. A metric series file is then replayed through
+CloudWatch-style alarm evaluation on simulated time. Every transition into a
+state with an alarm action is published to an in-process SNS topic that
+invokes the real ``lambda_handler`` (re-imported with the template's
+environment) against stub SSM and a stub Rocket.Chat webhook. Hours of
+alarm traffic run in seconds with no AWS access.
+
+The series is CSV with a ``timestamp,instance,path,fstype,value`` header or
+JSON lines with the same keys, plus an optional ``metric`` (default
+``disk_used_percent``). ``timestamp`` is epoch seconds or ISO 8601,
+``instance`` is the fleet.json instance name (what the alarms' InstanceId
+resolves to here) and a missing ``fstype`` matches any.
+
+    cd code && cdk synth -q && cd ..
+    python3 cloud-formation/lambda/bench/pipeline_emulator.py --series cloud-formation/lambda/bench/sample_series.csv
+    python3 cloud-formation/lambda/bench/pipeline_emulator.py --series storm.jsonl --duplicate-rate 0.2 \\
+        --latency-ms 50 --env DEDUP_SUPPRESSION_SECONDS=0 --report emulator-report.json
+
+Alarm evaluation, SNS and SQS run on simulated time; the notifier's dedup
+windows and SSM cache run on wall time, so a whole run falls inside one
+suppression window unless ``--env DEDUP_SUPPRESSION_SECONDS=0`` is given.
+Resources the emulator has no stand-in for (the DynamoDB dedup table, the
+retry queue) are dropped from the environment and listed in the report.
+"""
+import argparse
+import contextlib
+import csv
+import glob
+import importlib
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_CODE_DIR = os.path.normpath(os.path.join(BENCH_DIR, "..", "code"))
+CDK_OUT = os.path.normpath(os.path.join(BENCH_DIR, "..", "..", "..", "code", "cdk.out"))
+for path in (BENCH_DIR, LAMBDA_CODE_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from latency_probe import _capture  # noqa: E402
+from notifier_bench import percentile  # noqa: E402
+from stubs import StubRocketChat, StubSSM  # noqa: E402
+
+NOTIFIER_HANDLER = "lambda_function.lambda_handler"
+TOPIC_ARN = "arn:aws:sns:local:000000000000:disk-usage-alerts"
+
+# Template parameters without a default that the emulator fills in
+DEFAULT_PARAMETERS = {
+    "InstanceId": "EBSAlertTestEC2",
+    "DiskThresholdPercent": "85",
+}
+
+# DiskMonitorStack exports one per fleet instance; the series names instances
+EXPORT_INSTANCE = re.compile(r"^DiskMonitor-(.+)-InstanceId$")
+
+COMPARISONS = {
+    "GreaterThanThreshold": (lambda v, t: v > t, "greater than"),
+    "GreaterThanOrEqualToThreshold": (lambda v, t: v >= t, "greater than or equal to"),
+    "LessThanThreshold": (lambda v, t: v < t, "less than"),
+    "LessThanOrEqualToThreshold": (lambda v, t: v <= t, "less than or equal to"),
+}
+
+STATISTICS = {
+    "Average": lambda values: sum(values) / len(values),
+    "Maximum": max,
+    "Minimum": min,
+    "Sum": sum,
+    "SampleCount": len,
+}
+
+
+class Unresolved:
+    """A template value that needs a resource the emulator does not have."""
+
+    def __init__(self, what):
+        self.what = what
+
+    def __repr__(self):
+        return f"<unresolved {self.what}>"
+
+
+def _unresolved(value):
+    if isinstance(value, Unresolved):
+        return True
+    if isinstance(value, list):
+        return any(_unresolved(v) for v in value)
+    return False
+
+
+class Resolver:
+    """Resolves the intrinsic functions CDK emits, as far as they can be offline.
+
+    ``Ref`` to a parameter gives the override, the default, or the SSM value
+    for ``AWS::SSM::Parameter::Value`` parameters; ``Ref`` to an SSM
+    parameter resource gives its name. Nested-stack parameters fall back to
+    the parent's parameter of the same logical id.
+    """
+
+    def __init__(self, template, overrides, ssm_values, parent=None):
+        self.template = template
+        self.overrides = overrides
+        self.ssm_values = ssm_values
+        self.parent = parent
+
+    def __call__(self, value):
+        if isinstance(value, list):
+            return [self(v) for v in value]
+        if not isinstance(value, dict):
+            return value
+        if "Ref" in value:
+            return self.ref(value["Ref"])
+        if "Fn::ImportValue" in value:
+            name = self(value["Fn::ImportValue"])
+            if name in self.overrides:
+                return self.overrides[name]
+            match = EXPORT_INSTANCE.match(name) if isinstance(name, str) else None
+            return match.group(1) if match else Unresolved(f"export {name}")
+        if "Fn::Join" in value:
+            separator, parts = value["Fn::Join"]
+            parts = self(parts)
+            return Unresolved("join") if _unresolved(parts) else separator.join(str(p) for p in parts)
+        if "Fn::Sub" in value:
+            text = value["Fn::Sub"] if isinstance(value["Fn::Sub"], str) else value["Fn::Sub"][0]
+            return re.sub(r"\$\{([^}!]+)\}", lambda m: str(self.ref(m.group(1))), text)
+        return Unresolved(next(iter(value), "value"))
+
+    def ref(self, name):
+        if name.startswith("AWS::"):
+            return {"AWS::Region": "local", "AWS::AccountId": "000000000000", "AWS::Partition": "aws"}.get(
+                name, Unresolved(name))
+        if name in self.overrides:
+            return self.overrides[name]
+        parameter = self.template.get("Parameters", {}).get(name)
+        if parameter is not None:
+            default = parameter.get("Default")
+            if parameter.get("Type", "").startswith("AWS::SSM::Parameter::Value") and default is not None:
+                return self.ssm_values.get(default, Unresolved(default))
+            if default is not None:
+                return default
+            if self.parent is not None:
+                # CDK passes parent values in as "referenceto<Stack><LogicalId>Ref"
+                for parent_name in self.parent.template.get("Parameters", {}):
+                    if name.endswith(parent_name + "Ref") or name.endswith(parent_name):
+                        return self.parent.ref(parent_name)
+            return DEFAULT_PARAMETERS.get(name, Unresolved(name))
+        resource = self.template.get("Resources", {}).get(name)
+        if resource is not None and resource["Type"] == "AWS::SSM::Parameter":
+            return self(resource["Properties"]["Name"])
+        return Unresolved(name)
+
+
+def load_templates(cdk_out=CDK_OUT):
+    """Stack name -> template for every ``*.template.json`` in ``cdk_out`` (nested stacks included)."""
+    templates = {}
+    for path in sorted(glob.glob(os.path.join(cdk_out, "*.template.json"))):
+        with open(path) as f:
+            templates[os.path.basename(path)[:-len(".template.json")]] = json.load(f)
+    if not templates:
+        raise FileNotFoundError(f"no templates in {cdk_out}; run `cdk synth` in code/ first")
+    return templates
+
+
+def _resources(template, kind):
+    return [(logical_id, resource) for logical_id, resource in template.get("Resources", {}).items()
+            if resource.get("Type") == kind]
+
+
+def resolvers(templates, overrides=None):
+    """One resolver per template; nested templates get the stack whose name prefixes theirs as parent."""
+    overrides = dict(overrides or {})
+    tops = {name: Resolver(t, overrides, {}) for name, t in templates.items() if not name.endswith(".nested")}
+    result = dict(tops)
+    for name, template in templates.items():
+        if name in result:
+            continue
+        parent = next((tops[top] for top in sorted(tops, key=len, reverse=True) if name.startswith(top)), None)
+        result[name] = Resolver(template, overrides, {}, parent)
+    return result
+
+
+def ssm_parameters(templates, resolver_for):
+    """SSM parameter name -> value for every ``AWS::SSM::Parameter`` the stacks create."""
+    values = {}
+    for name, template in templates.items():
+        resolve = resolver_for[name]
+        for _, resource in _resources(template, "AWS::SSM::Parameter"):
+            properties = resource["Properties"]
+            parameter_name, value = resolve(properties.get("Name")), resolve(properties.get("Value"))
+            if isinstance(parameter_name, str) and not _unresolved(value):
+                values[parameter_name] = value
+    return values
+
+
+class Notifier:
+    """The notifier function's environment and subscription, read from the template."""
+
+    def __init__(self, environment, dropped=(), batch_size=None, batching_window=0):
+        self.environment = environment
+        self.dropped = list(dropped)
+        # None: SNS invokes the function directly, one record per invocation
+        self.batch_size = batch_size
+        self.batching_window = batching_window
+
+    @property
+    def via_sqs(self):
+        return self.batch_size is not None
+
+    @classmethod
+    def from_templates(cls, templates, resolver_for):
+        for name, template in templates.items():
+            for logical_id, resource in _resources(template, "AWS::Lambda::Function"):
+                if resource["Properties"].get("Handler") != NOTIFIER_HANDLER:
+                    continue
+                resolve = resolver_for[name]
+                environment, dropped = {}, []
+                for key, value in resource["Properties"].get("Environment", {}).get("Variables", {}).items():
+                    value = resolve(value)
+                    if _unresolved(value):
+                        dropped.append(key)
+                    else:
+                        environment[key] = str(value)
+                notifier = cls(environment, dropped)
+                targets = {logical_id} | {alias_id for alias_id, alias in _resources(template, "AWS::Lambda::Alias")
+                                          if alias["Properties"].get("FunctionName", {}).get("Ref") == logical_id}
+                for _, mapping in _resources(template, "AWS::Lambda::EventSourceMapping"):
+                    function = mapping["Properties"].get("FunctionName", {})
+                    if isinstance(function, dict) and function.get("Ref") in targets:
+                        notifier.batch_size = int(mapping["Properties"].get("BatchSize", 10))
+                        notifier.batching_window = int(mapping["Properties"].get("MaximumBatchingWindowInSeconds", 0))
+                return notifier
+        raise LookupError(f"no {NOTIFIER_HANDLER} function in the templates")
+
+
+class Alarm:
+    """A metric alarm from the template, evaluated period by period like CloudWatch."""
+
+    def __init__(self, name, metric, dimensions, threshold, comparison="GreaterThanThreshold", period=60,
+                 evaluation_periods=1, datapoints_to_alarm=None, statistic="Average",
+                 treat_missing_data="missing", actions=None, description=None, namespace="CWAgent", unit=None):
+        if comparison not in COMPARISONS:
+            raise ValueError(f"unsupported comparison {comparison!r}")
+        self.name = name
+        self.metric = metric
+        self.namespace = namespace
+        self.dimensions = dimensions
+        self.threshold = float(threshold)
+        self.comparison = comparison
+        self.period = int(period)
+        self.evaluation_periods = int(evaluation_periods)
+        self.datapoints_to_alarm = int(datapoints_to_alarm or evaluation_periods)
+        self.statistic = statistic
+        self.treat_missing_data = treat_missing_data
+        # State -> whether the alarm has an action for it (ALARM/OK/INSUFFICIENT_DATA)
+        self.actions = actions or {"ALARM": True}
+        self.description = description
+        self.unit = unit
+        self.state = "INSUFFICIENT_DATA"
+        self._buckets = {}
+
+    def matches(self, point):
+        if point["metric"] != self.metric:
+            return False
+        return all(point["dimensions"].get(name, value) == value for name, value in self.dimensions.items())
+
+    def add(self, point):
+        start = int(point["timestamp"] // self.period * self.period)
+        self._buckets.setdefault(start, []).append(point["value"])
+
+    def aggregate(self, start):
+        values = self._buckets.get(start)
+        if not values:
+            return None
+        if self.statistic.startswith("p"):
+            return percentile(values, float(self.statistic[1:]))
+        return STATISTICS[self.statistic](values)
+
+    def evaluate(self, period_end):
+        """The transition (dict) when the periods ending at ``period_end`` change the state, else None."""
+        starts = [period_end - self.period * n for n in range(self.evaluation_periods, 0, -1)]
+        datapoints = [(start, self.aggregate(start)) for start in starts]
+        compare, _ = COMPARISONS[self.comparison]
+        breaching, counted = [], 0
+        for start, value in datapoints:
+            if value is None:
+                if self.treat_missing_data == "breaching":
+                    breaching.append((start, None))
+                if self.treat_missing_data in ("breaching", "notBreaching"):
+                    counted += 1
+                continue
+            counted += 1
+            if compare(value, self.threshold):
+                breaching.append((start, value))
+        if counted == 0:
+            if self.treat_missing_data == "ignore":
+                return None
+            new_state = "INSUFFICIENT_DATA"
+        else:
+            new_state = "ALARM" if len(breaching) >= self.datapoints_to_alarm else "OK"
+        if new_state == self.state:
+            return None
+        old_state, self.state = self.state, new_state
+        return {"alarm": self, "oldState": old_state, "newState": new_state, "time": period_end,
+                "reason": self._reason(new_state, datapoints, breaching)}
+
+    def _reason(self, state, datapoints, breaching):
+        if state == "INSUFFICIENT_DATA":
+            return "Insufficient Data: no datapoints were received for the evaluation periods."
+        _, words = COMPARISONS[self.comparison]
+        shown = [(start, value) for start, value in (breaching if state == "ALARM" else datapoints)
+                 if value is not None]
+        quoted = ", ".join(f"{value:g} ({_reason_time(start)})" for start, value in reversed(shown))
+        if not quoted:
+            return f"Threshold Crossed: no datapoints were received for {len(datapoints)} periods."
+        count = f"{len(shown)} datapoint" if self.evaluation_periods == 1 else \
+            f"{len(shown)} out of the last {self.evaluation_periods} datapoints"
+        verb = ("was" if len(shown) == 1 else "were") + ("" if state == "ALARM" else " not")
+        return f"Threshold Crossed: {count} [{quoted}] {verb} {words} the threshold ({self.threshold:g})."
+
+    def payload(self, transition):
+        """The JSON CloudWatch publishes to SNS for ``transition``."""
+        trigger = {
+            "MetricName": self.metric,
+            "Namespace": self.namespace,
+            "StatisticType": "ExtendedStatistic" if self.statistic.startswith("p") else "Statistic",
+            "Statistic": self.statistic.upper(),
+            "Unit": self.unit,
+            "Dimensions": [{"value": value, "name": name} for name, value in self.dimensions.items()],
+            "Period": self.period,
+            "EvaluationPeriods": self.evaluation_periods,
+            "DatapointsToAlarm": self.datapoints_to_alarm,
+            "ComparisonOperator": self.comparison,
+            "Threshold": self.threshold,
+            "TreatMissingData": self.treat_missing_data,
+        }
+        return {
+            "AlarmName": self.name,
+            "AlarmDescription": self.description,
+            "AWSAccountId": "000000000000",
+            "NewStateValue": transition["newState"],
+            "NewStateReason": transition["reason"],
+            "StateChangeTime": _iso(transition["time"]),
+            "Region": "local",
+            "AlarmArn": f"arn:aws:cloudwatch:local:000000000000:alarm:{self.name}",
+            "OldStateValue": transition["oldState"],
+            "Trigger": trigger,
+        }
+
+
+def alarms_from_templates(templates, resolver_for, default_threshold=None):
+    """(alarms, skipped) for every ``AWS::CloudWatch::Alarm``; metric-math and anomaly alarms are skipped."""
+    alarms, skipped = [], []
+    for name, template in templates.items():
+        resolve = resolver_for[name]
+        for logical_id, resource in _resources(template, "AWS::CloudWatch::Alarm"):
+            properties = resource["Properties"]
+            alarm_name = resolve(properties.get("AlarmName", logical_id))
+            if "Metrics" in properties:
+                skipped.append(alarm_name)
+                continue
+            threshold = resolve(properties.get("Threshold"))
+            if _unresolved(threshold):
+                threshold = default_threshold
+            dimensions = {d["Name"]: resolve(d["Value"]) for d in properties.get("Dimensions", [])}
+            if threshold is None or any(_unresolved(v) for v in dimensions.values()):
+                skipped.append(alarm_name)
+                continue
+            description = resolve(properties.get("AlarmDescription"))
+            alarms.append(Alarm(
+                alarm_name,
+                properties["MetricName"],
+                dimensions,
+                threshold,
+                comparison=properties.get("ComparisonOperator", "GreaterThanThreshold"),
+                period=properties.get("Period", 60),
+                evaluation_periods=properties.get("EvaluationPeriods", 1),
+                datapoints_to_alarm=properties.get("DatapointsToAlarm"),
+                statistic=properties.get("Statistic") or properties.get("ExtendedStatistic", "Average"),
+                treat_missing_data=properties.get("TreatMissingData", "missing"),
+                actions={"ALARM": bool(properties.get("AlarmActions")), "OK": bool(properties.get("OKActions")),
+                         "INSUFFICIENT_DATA": bool(properties.get("InsufficientDataActions"))},
+                description=None if _unresolved(description) else description,
+                namespace=properties.get("Namespace", "CWAgent"),
+                unit=properties.get("Unit"),
+            ))
+    return alarms, skipped
+
+
+def _timestamp(value):
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+def load_series(path):
+    """Datapoints from a CSV or JSON lines series file, oldest first."""
+    with open(path) as f:
+        if path.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    points = []
+    for row in rows:
+        dimensions = {"InstanceId": row.get("instance"), "path": row.get("path"), "fstype": row.get("fstype")}
+        points.append({
+            "timestamp": _timestamp(row["timestamp"]),
+            "metric": row.get("metric") or "disk_used_percent",
+            "dimensions": {name: value for name, value in dimensions.items() if value},
+            "value": float(row["value"]),
+        })
+    return sorted(points, key=lambda point: point["timestamp"])
+
+
+def transitions(alarms, series):
+    """Every actionable transition of ``alarms`` over ``series``, in time order."""
+    if not series:
+        return []
+    for point in series:
+        for alarm in alarms:
+            if alarm.matches(point):
+                alarm.add(point)
+    first, last = series[0]["timestamp"], series[-1]["timestamp"]
+    found = []
+    for alarm in alarms:
+        period_end = int(first // alarm.period * alarm.period) + alarm.period
+        while period_end <= last + alarm.period:
+            transition = alarm.evaluate(period_end)
+            if transition and alarm.actions.get(transition["newState"]):
+                found.append(transition)
+            period_end += alarm.period
+    return sorted(found, key=lambda t: (t["time"], t["alarm"].name))
+
+
+class StubSNS:
+    """The alerts topic: each publish reaches the notifier directly or through the digest queue.
+
+    Direct subscriptions invoke ``handler`` with one record per message.
+    Through SQS, messages are buffered and handed over in batches of up to
+    ``batch_size`` once the batch is full or ``batching_window`` simulated
+    seconds have passed since its first message. ``duplicate_rate`` of the
+    messages are delivered twice, as SNS's at-least-once delivery can.
+    """
+
+    def __init__(self, handler, batch_size=None, batching_window=0, duplicate_rate=0.0, seed=0):
+        self.handler = handler
+        self.batch_size = batch_size
+        self.batching_window = batching_window
+        self.duplicate_rate = duplicate_rate
+        self._random = random.Random(seed)
+        self._buffer = []
+        self._buffer_since = None
+        self.published = 0
+        self.duplicates = 0
+
+    def publish(self, message, at):
+        self.flush_due(at)
+        notification = {
+            "Type": "Notification",
+            "MessageId": str(uuid.UUID(int=self._random.getrandbits(128))),
+            "TopicArn": TOPIC_ARN,
+            "Message": json.dumps(message),
+            "Timestamp": _iso(at),
+        }
+        self.published += 1
+        copies = 1
+        if self._random.random() < self.duplicate_rate:
+            self.duplicates += 1
+            copies = 2
+        for _ in range(copies):
+            self._deliver(notification, at)
+
+    def _deliver(self, notification, at):
+        if self.batch_size is None:
+            self.handler({"Records": [{"EventSource": "aws:sns", "Sns": notification}]})
+            return
+        if not self._buffer:
+            self._buffer_since = at
+        self._buffer.append({
+            "messageId": str(uuid.UUID(int=self._random.getrandbits(128))),
+            "eventSource": "aws:sqs",
+            "body": json.dumps(notification),
+            "attributes": {"SentTimestamp": str(int(at * 1000))},
+        })
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush_due(self, now):
+        if self._buffer and now - self._buffer_since >= self.batching_window:
+            self.flush()
+
+    def flush(self):
+        while self._buffer:
+            batch, self._buffer = self._buffer[:self.batch_size], self._buffer[self.batch_size:]
+            self.handler({"Records": batch})
+        self._buffer_since = None
+
+
+@contextlib.contextmanager
+def notifier_module(environment, ssm):
+    """``lambda_function`` imported fresh with ``environment`` and every AWS client pointed at ``ssm``.
+
+    The module's singletons are built at import time from the environment,
+    so it is reloaded on entry and, with the previous environment restored,
+    again on exit.
+    """
+    import lambda_function
+    import ssm_cache
+    import thresholds
+
+    saved_env = {key: os.environ.get(key) for key in environment}
+    saved_clients = (ssm_cache._default_client, thresholds._default_client)
+    os.environ.update(environment)
+    ssm_cache._default_client = thresholds._default_client = lambda: ssm
+    try:
+        yield importlib.reload(lambda_function)
+    finally:
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        ssm_cache._default_client, thresholds._default_client = saved_clients
+        importlib.reload(lambda_function)
+
+
+def emulate(templates, series, overrides=None, env=None, ssm_overrides=None, webhook_params=(),
+            duplicate_rate=0.0, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, throttle_rate=0.0,
+            seed=0, quiet=True):
+    """Replay ``series`` through the alarms and notifier defined by ``templates``; return a report dict."""
+    from structured_log import logger
+
+    resolver_for = resolvers(templates, overrides)
+    ssm_values = ssm_parameters(templates, resolver_for)
+    ssm_values.update(ssm_overrides or {})
+    for resolve in resolver_for.values():
+        resolve.ssm_values = ssm_values
+    notifier = Notifier.from_templates(templates, resolver_for)
+    environment = dict(notifier.environment, **(env or {}))
+    default_threshold = ssm_values.get("/diskmonitor/threshold/percent")
+    alarms, skipped = alarms_from_templates(templates, resolver_for, default_threshold)
+    found = transitions(alarms, series)
+
+    invocations, lines = [], []
+    totals = {"records": 0, "posted": 0, "deduped": 0, "queued": 0, "deadLettered": 0, "failed": 0,
+              "deliveries": 0}
+    with StubRocketChat(latency_ms / 1000, jitter_ms / 1000, error_rate, throttle_rate, seed=seed) as chat:
+        webhook_param = environment.get("WEBHOOK_PARAM_NAME", "/rocketchat/webhook_url")
+        for name in (webhook_param, *webhook_params):
+            ssm_values[name] = chat.url
+        ssm = StubSSM(ssm_values)
+        started = time.perf_counter()
+        with notifier_module(environment, ssm) as lambda_function:
+            def handler(event):
+                invoke_started = time.perf_counter()
+                with _capture(logger, lines, quiet):
+                    response = lambda_function.lambda_handler(event, None)
+                invocations.append((time.perf_counter() - invoke_started) * 1000)
+                for result in response["results"]:
+                    status = "deadLettered" if result["status"] == "dead-lettered" else result["status"]
+                    totals[status] = totals.get(status, 0) + 1
+                    totals["records"] += 1
+                totals["deliveries"] += response["deliveries"]
+
+            topic = StubSNS(handler, notifier.batch_size, notifier.batching_window, duplicate_rate, seed)
+            for transition in found:
+                topic.publish(transition["alarm"].payload(transition), transition["time"])
+            topic.flush()
+        wall = time.perf_counter() - started
+        statuses = dict(chat.statuses)
+        messages = [payload for _, payload in chat.received]
+
+    handler_seconds = sum(invocations) / 1000
+    return {
+        "alarms": len(alarms),
+        "skippedAlarms": skipped,
+        "droppedEnvironment": notifier.dropped,
+        "subscription": "sqs" if notifier.via_sqs else "sns",
+        "batchSize": notifier.batch_size,
+        "batchingWindowSeconds": notifier.batching_window if notifier.via_sqs else None,
+        "datapoints": len(series),
+        "transitions": len(found),
+        "states": _count(t["newState"] for t in found),
+        "published": topic.published,
+        "duplicatesInjected": topic.duplicates,
+        "invocations": len(invocations),
+        **totals,
+        "messages": len(messages),
+        "webhookStatuses": {str(status): count for status, count in sorted(statuses.items())},
+        "ssmCalls": ssm.calls,
+        "handlerMs": {
+            "p50": round(percentile(invocations, 50), 2),
+            "p99": round(percentile(invocations, 99), 2),
+            "max": round(max(invocations, default=0.0), 2),
+        },
+        "recordsPerSecond": round(totals["records"] / handler_seconds, 1) if handler_seconds else 0.0,
+        "wallSeconds": round(wall, 3),
+        "sample": messages[:3],
+    }
+
+
+def _count(values):
+    counts = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    return counts
+
+
+def _iso(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "+0000"
+
+
+def _reason_time(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%d/%m/%y %H:%M:%S")
+
+
+def format_report(report):
+    handler = report["handlerMs"]
+    window = f", window {report['batchingWindowSeconds']}s" if report["subscription"] == "sqs" else ""
+    lines = [
+        f"alarms       {report['alarms']} emulated, {len(report['skippedAlarms'])} skipped",
+        f"subscription {report['subscription']}" + (f" (batch {report['batchSize']}{window})"
+                                                     if report["subscription"] == "sqs" else ""),
+        f"series       {report['datapoints']} datapoints -> {report['transitions']} transitions "
+        f"{json.dumps(report['states'])}",
+        f"sns          {report['published']} published, {report['duplicatesInjected']} redelivered",
+        f"notifier     {report['invocations']} invocations, {report['records']} records: "
+        f"{report['posted']} posted, {report['deduped']} deduped, {report['queued']} queued, "
+        f"{report['deadLettered']} dead-lettered, {report['failed']} failed ({report['deliveries']} deliveries)",
+        f"rocket.chat  {report['messages']} messages {json.dumps(report['webhookStatuses'])}",
+        f"handler      p50 {handler['p50']} ms, p99 {handler['p99']} ms, max {handler['max']} ms, "
+        f"{report['recordsPerSecond']} records/s",
+    ]
+    if report["droppedEnvironment"]:
+        lines.append(f"not emulated {', '.join(report['droppedEnvironment'])}")
+    return "\n".join(lines)
+
+
+def _pairs(values, option):
+    pairs = {}
+    for value in values:
+        key, sep, text = value.partition("=")
+        if not sep:
+            raise SystemExit(f"{option} expects KEY=VALUE, got {value!r}")
+        if text.startswith("@"):
+            with open(text[1:]) as f:
+                text = f.read()
+        pairs[key] = text
+    return pairs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cdk-out", default=CDK_OUT, help="directory `cdk synth` wrote the templates to")
+    parser.add_argument("--series", required=True, help="metric series file (.csv or JSON lines)")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUE",
+                        help="template parameter or export value, e.g. DiskThresholdPercent=80")
+    parser.add_argument("--ssm", action="append", default=[], metavar="NAME=VALUE",
+                        help="SSM parameter value (VALUE may be @file), e.g. /rocketchat/routes=@routes.json")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="override the notifier environment from the template")
+    parser.add_argument("--webhook-param", action="append", default=[],
+                        help="extra SSM parameter (e.g. a routed sink's URL) pointed at the stub webhook")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0, help="fraction of SNS messages delivered twice")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="show the notifier's log lines")
+    parser.add_argument("--report", help="write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    report = emulate(
+        load_templates(args.cdk_out),
+        load_series(args.series),
+        overrides=_pairs(args.param, "--param"),
+        env=_pairs(args.env, "--env"),
+        ssm_overrides=_pairs(args.ssm, "--ssm"),
+        webhook_params=args.webhook_param,
+        duplicate_rate=args.duplicate_rate,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        seed=args.seed,
+        quiet=not args.verbose,
+    )
+    print(format_report(report))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+import contextlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+@contextlib.contextmanager
+def patched(module, **values):
+    """Set ``values`` as attributes of ``module`` for the block, restoring the originals afterwards."""
+    saved = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield module
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+class StubSSM:
+    """Minimal stand-in for the boto3 SSM client used by ParameterCache."""
+
+    def __init__(self, values, latency=0.0):
+        self.values = dict(values)
+        self.latency = latency
+        self.calls = 0
+
+    def get_parameter(self, Name, WithDecryption=False):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return {"Parameter": {"Name": Name, "Value": self.values[Name]}}
+
+    def get_paginator(self, operation):
+        """``get_parameters_by_path`` paginator (one page), as used by the threshold index."""
+        stub = self
+
+        class Paginator:
+            def paginate(self, Path, Recursive=False, **kwargs):
+                stub.calls += 1
+                prefix = Path.rstrip("/") + "/"
+                names = sorted(name for name in stub.values if name.startswith(prefix)
+                               and (Recursive or "/" not in name[len(prefix):]))
+                yield {"Parameters": [{"Name": name, "Value": stub.values[name]} for name in names]}
+
+        if operation != "get_parameters_by_path":
+            raise NotImplementedError(operation)
+        return Paginator()
+
+
+class StubRocketChat:
+    """Local keep-alive webhook endpoint that simulates Rocket.Chat behaviour.
+
+    ``latency`` (+ up to ``jitter``) seconds are added to every POST, a
+    fraction ``error_rate`` answer 500 and ``throttle_rate`` answer 429 with
+    ``Retry-After: retry_after``. Every accepted message is kept in
+    ``received`` along with the time it landed.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, retry_after=0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.received = []
+        self.statuses = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/hooks/bench/token"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _pick_status(self):
+        with self._lock:
+            roll = self._random.random()
+            delay = self.latency + self._random.random() * self.jitter
+        if roll < self.throttle_rate:
+            return 429, delay
+        if roll < self.throttle_rate + self.error_rate:
+            return 500, delay
+        return 200, delay
+
+    def _record(self, status, payload):
+        with self._lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if status == 200:
+                self.received.append((time.time(), payload))
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status, delay = stub._pick_status()
+                if delay:
+                    time.sleep(delay)
+                stub._record(status, json.loads(body or b"{}"))
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", str(stub.retry_after))
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def synth_alarm(index, dimensions=3, state="ALARM", instance_id="i-0bench000000000000",
+                alarm_prefix="bench", state_change_time=None):
+    """Build a CloudWatch alarm payload with ``dimensions`` dimensions."""
+    volume = f"vol{index + 1}"
+    dims = [
+        {"name": "InstanceId", "value": instance_id},
+        {"name": "path", "value": f"/mnt/{volume}"},
+        {"name": "fstype", "value": "ext4"},
+    ]
+    dims.extend({"name": f"extra{k}", "value": f"value{k}"} for k in range(max(0, dimensions - 3)))
+    return {
+        "AlarmName": f"{alarm_prefix}_mnt_{volume}_high_disk_usage",
+        "NewStateValue": state,
+        "OldStateValue": "OK" if state == "ALARM" else "ALARM",
+        "NewStateReason": "Threshold Crossed: 1 datapoint [90.3] was greater than the threshold (85.0).",
+        "StateChangeTime": state_change_time or time.strftime("%Y-%m-%dT%H:%M:%S.000+0000", time.gmtime()),
+        "Trigger": {
+            "MetricName": "disk_used_percent",
+            "Namespace": "CWAgent",
+            "Threshold": 85.0,
+            "Dimensions": dims[:dimensions],
+        },
+    }
+
+
+def synth_event(records, dimensions=3, alarm_prefix="bench", **alarm_kwargs):
+    """Build an SNS event with ``records`` alarm records."""
+    return {
+        "Records": [
+            {
+                "EventSource": "aws:sns",
+                "Sns": {
+                    "Type": "Notification",
+                    "MessageId": f"{alarm_prefix}-{i}",
+                    "TopicArn": "arn:aws:sns:us-east-1:123456789012:disk-usage-alerts",
+                    "Message": json.dumps(synth_alarm(i, dimensions, alarm_prefix=alarm_prefix, **alarm_kwargs)),
+                },
+            }
+            for i in range(records)
+        ]
+    }
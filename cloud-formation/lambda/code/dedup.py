@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import OrderedDict
+
+from structured_log import logger
+
+
+class LRUStore:
+    """In-memory seen-set for warm containers, bounded by entry count."""
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, key, window, now=None):
+        """Record ``key`` for ``window`` seconds; return False if it was already live."""
+        now = time.time() if now is None else now
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is not None and expires_at > now:
+                self._entries.move_to_end(key)
+                return False
+            self._entries[key] = now + window
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            return True
+
+    def release(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class DynamoDBStore:
+    """Seen-set shared across containers, using a conditional put per key.
+
+    Items are ``{"pk": key, "expires_at": epoch}``; enable DynamoDB TTL on
+    ``expires_at`` so old keys are reaped for free. Any client exposing
+    ``put_item``/``delete_item`` with the boto3 signature can stand in.
+    """
+
+    def __init__(self, table_name, client_factory=None):
+        self.table_name = table_name
+        self._client_factory = client_factory or _default_client
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    def claim(self, key, window, now=None):
+        now = int(time.time() if now is None else now)
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={"pk": {"S": key}, "expires_at": {"N": str(now + int(window))}},
+                ConditionExpression="attribute_not_exists(pk) OR expires_at < :now",
+                ExpressionAttributeValues={":now": {"N": str(now)}},
+            )
+        except Exception as e:
+            if _error_code(e) == "ConditionalCheckFailedException":
+                return False
+            raise
+        return True
+
+    def release(self, key):
+        self.client.delete_item(TableName=self.table_name, Key={"pk": {"S": key}})
+
+
+class Deduplicator:
+    """Skip repeated SNS deliveries and rapid re-fires of the same alarm state.
+
+    Three keys are claimed per alarm, cheapest first:
+    * ``msg:<Sns.MessageId>`` – the same SNS delivery arriving twice
+    * ``state:<AlarmName>:<NewStateValue>:<StateChangeTime>`` – the same
+      transition published under a different MessageId
+    * ``fire:<AlarmName>:<NewStateValue>`` – a flapping alarm re-entering a
+      state within ``suppression_seconds``
+
+    The in-memory store is always consulted first so warm duplicates never
+    reach DynamoDB.
+    """
+
+    def __init__(self, local=None, remote=None, ttl_seconds=3600, suppression_seconds=120):
+        self.local = local or LRUStore()
+        self.remote = remote
+        self.ttl_seconds = ttl_seconds
+        self.suppression_seconds = suppression_seconds
+
+    def keys_for(self, message_id, fields):
+        keys = []
+        if message_id:
+            keys.append((f"msg:{message_id}", self.ttl_seconds))
+        keys.append((f"state:{fields['alarm_name']}:{fields['new_state']}:{fields['state_change_time']}", self.ttl_seconds))
+        if self.suppression_seconds > 0:
+            keys.append((f"fire:{fields['alarm_name']}:{fields['new_state']}", self.suppression_seconds))
+        return keys
+
+    def claim(self, message_id, fields):
+        """Return the claimed keys, or None if the alarm is a duplicate."""
+        claimed = []
+        for key, window in self.keys_for(message_id, fields):
+            if not self.local.claim(key, window) or not self._claim_remote(key, window):
+                self.release(claimed)
+                return None
+            claimed.append(key)
+        return claimed
+
+    def _claim_remote(self, key, window):
+        if not self.remote:
+            return True
+        try:
+            return self.remote.claim(key, window)
+        except Exception as e:
+            # Fail open: a duplicate chat post beats a dropped alert
+            logger.warning("dedup store error", key=key, error=str(e))
+            return True
+
+    def release(self, keys):
+        """Forget keys for an alarm whose delivery failed so a retry is not dropped."""
+        for key in keys:
+            self.local.release(key)
+            if self.remote:
+                try:
+                    self.remote.release(key)
+                except Exception as e:
+                    logger.warning("dedup release failed", key=key, error=str(e))
+
+
+def _error_code(error):
+    return getattr(error, "response", {}).get("Error", {}).get("Code")
+
+
+def _default_client():
+    import boto3
+    return boto3.client('dynamodb')
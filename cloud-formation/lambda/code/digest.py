@@ -0,0 +1,45 @@
+from collections import Counter
+
+# Supported DIGEST_MODE values and the alarm field each one groups on
+GROUP_KEYS = {
+    "instance": "instance_id",
+    "family": "metric",
+}
+
+
+def group_alarms(items, mode):
+    """Bucket decoded items by instance or alarm family, preserving arrival order."""
+    field = GROUP_KEYS[mode]
+    groups = {}
+    for item in items:
+        groups.setdefault(item["fields"][field], []).append(item)
+    return groups
+
+
+def render_digest(mode, key, items):
+    """Render one aggregated message for a group of alarm transitions."""
+    states = Counter(item["fields"]["new_state"] for item in items)
+
+    # Only the latest transition per volume goes in the table
+    latest = {}
+    for item in sorted(items, key=lambda i: i["fields"]["state_change_time"]):
+        fields = item["fields"]
+        latest[(fields["instance_id"], fields["path"])] = fields
+
+    label = "Instance ID" if mode == "instance" else "Alarm family"
+    summary = ", ".join(f"{state}: {count}" for state, count in sorted(states.items()))
+
+    rows = [("Instance", "Volume", "State", "Filesystem", "Alarm")]
+    rows.extend(
+        (f["instance_id"], f["path"], f["new_state"], f["fstype"], f["alarm_name"])
+        for _, f in sorted(latest.items())
+    )
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    table = "\n".join("  ".join(col.ljust(w) for col, w in zip(row, widths)).rstrip() for row in rows)
+
+    return (
+        f"*Disk Alarm Digest*\n"
+        f"🔹 {label}: `{key}`\n"
+        f"🔹 Transitions: {len(items)} ({summary}) across {len(latest)} volume(s)\n"
+        f"```\n{table}\n```"
+    )
@@ -0,0 +1,266 @@
+import math
+import os
+import time
+from datetime import datetime, timezone
+
+from dedup import Deduplicator, DynamoDBStore
+from rollup import GROUP_LABEL
+from structured_log import logger
+
+# Hours of history fitted per volume and the warning horizon
+LOOKBACK_HOURS = float(os.environ.get("FORECAST_LOOKBACK_HOURS", "6"))
+HORIZON_HOURS = float(os.environ.get("FORECAST_HORIZON_HOURS", "24"))
+
+# "linear" (steady writers) or "exponential" (growth proportional to usage)
+MODEL = os.environ.get("FORECAST_MODEL", "linear").lower()
+
+# Fewer datapoints than this are not fitted
+MIN_POINTS = int(os.environ.get("FORECAST_MIN_POINTS", "6"))
+
+PERIOD_SECONDS = int(os.environ.get("FORECAST_PERIOD_SECONDS", "300"))
+
+# Every CWAgent disk_used_percent series with the alarm dimensions
+SEARCH_EXPRESSION = (
+    "SEARCH('{CWAgent,InstanceId,fstype,path} MetricName=\"disk_used_percent\"', 'Average', %d)"
+)
+
+# A SEARCH returns at most this many series; larger fleets are searched a batch of instances at a time
+SEARCH_LIMIT = 500
+# CloudWatch rejects SEARCH expressions longer than this, which bounds each batch
+SEARCH_MAX_CHARS = 1024
+
+# A volume is warned about at most once per window (shares the notifier's dedup table)
+deduplicator = Deduplicator(
+    remote=DynamoDBStore(os.environ["DEDUP_TABLE_NAME"]) if os.environ.get("DEDUP_TABLE_NAME") else None,
+    suppression_seconds=int(os.environ.get("FORECAST_REPEAT_SECONDS", "21600")),
+)
+
+
+def _epoch(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    return float(value)
+
+
+def series_from_results(results, series=None):
+    """Merge GetMetricData results (live or recorded) into {(instance, path, fstype): [(t, value)]}."""
+    series = {} if series is None else series
+    for result in results:
+        key = tuple((result.get("Label", "").split("|") + ["unknown"] * 3)[:3])
+        points = series.setdefault(key, [])
+        points.extend(zip((_epoch(t) for t in result.get("Timestamps", [])), result.get("Values", [])))
+    for points in series.values():
+        points.sort()
+    return series
+
+
+def search_expression(period, instance_ids=None):
+    """The SEARCH for every volume, or only those of ``instance_ids``."""
+    if not instance_ids:
+        return SEARCH_EXPRESSION % period
+    instances = " OR ".join(f'InstanceId=\"{instance_id}\"' for instance_id in instance_ids)
+    return SEARCH_EXPRESSION.replace("\"disk_used_percent\"", f"\"disk_used_percent\" ({instances})") % period
+
+
+def instance_batches(period, instance_ids):
+    """Split ``instance_ids`` into in-order batches whose search fits in SEARCH_MAX_CHARS."""
+    batch = []
+    for instance_id in instance_ids:
+        if batch and len(search_expression(period, batch + [instance_id])) > SEARCH_MAX_CHARS:
+            yield batch
+            batch = []
+        batch.append(instance_id)
+    if batch:
+        yield batch
+
+
+def fetch_series(client, now, lookback_hours=LOOKBACK_HOURS, period=PERIOD_SECONDS):
+    """Pull every volume's recent datapoints with paginated GetMetricData searches.
+
+    One SEARCH covers fleets of up to SEARCH_LIMIT volumes. When it comes back
+    full, the instances are listed with ListMetrics and searched as many at a
+    time as fit in SEARCH_MAX_CHARS so no volume is silently dropped.
+    """
+    start = datetime.fromtimestamp(now - lookback_hours * 3600, timezone.utc)
+    end = datetime.fromtimestamp(now, timezone.utc)
+    series = _search(client, search_expression(period), period, start, end)
+    if len(series) < SEARCH_LIMIT:
+        return series
+
+    instance_ids = list_instances(client)
+    logger.warning("forecast search hit the series limit, searching by instance",
+                   limit=SEARCH_LIMIT, instances=len(instance_ids))
+    series = {}
+    for batch in instance_batches(period, instance_ids):
+        found = _search(client, search_expression(period, batch), period, start, end)
+        if len(found) >= SEARCH_LIMIT:
+            logger.warning("forecast search truncated", limit=SEARCH_LIMIT, instances=len(batch))
+        series.update(found)
+    return series
+
+
+def _search(client, expression, period, start, end):
+    request = {
+        "MetricDataQueries": [{"Id": "disk", "Expression": expression, "Label": GROUP_LABEL, "Period": period}],
+        "StartTime": start,
+        "EndTime": end,
+        "ScanBy": "TimestampAscending",
+    }
+    series = {}
+    while True:
+        response = client.get_metric_data(**request)
+        series_from_results(response.get("MetricDataResults", []), series)
+        if not response.get("NextToken"):
+            return series
+        request["NextToken"] = response["NextToken"]
+
+
+def list_instances(client):
+    """Instance ids publishing disk_used_percent in the last three hours, from paginated ListMetrics."""
+    instance_ids = set()
+    pages = client.get_paginator("list_metrics").paginate(
+        Namespace="CWAgent", MetricName="disk_used_percent", RecentlyActive="PT3H")
+    for page in pages:
+        for metric in page.get("Metrics", []):
+            for dimension in metric.get("Dimensions", []):
+                if dimension["Name"] == "InstanceId":
+                    instance_ids.add(dimension["Value"])
+    return sorted(instance_ids)
+
+
+def fit(points, model=MODEL):
+    """Least-squares fit of ``points``; returns (intercept, slope per second, origin time).
+
+    The exponential model fits ln(value), so its slope is a growth rate.
+    Closed-form sums keep this a single pass per series without NumPy.
+    """
+    origin = points[0][0]
+    n = sx = sy = sxx = sxy = 0.0
+    for t, value in points:
+        if model == "exponential":
+            if value <= 0:
+                continue
+            value = math.log(value)
+        x = t - origin
+        n += 1
+        sx += x
+        sy += value
+        sxx += x * x
+        sxy += x * value
+    denominator = n * sxx - sx * sx
+    if n < 2 or denominator == 0:
+        return None
+    slope = (n * sxy - sx * sy) / denominator
+    return (sy - slope * sx) / n, slope, origin
+
+
+def hours_to_full(points, now, model=MODEL, fitted=None):
+    """Projected hours until the volume reaches 100%, or None if it is not filling."""
+    if fitted is None:
+        fitted = fit(points, model)
+    if fitted is None:
+        return None
+    intercept, slope, origin = fitted
+    if slope <= 0:
+        return None
+    if model == "exponential":
+        seconds = (math.log(100.0) - intercept) / slope
+    else:
+        seconds = (100.0 - intercept) / slope
+    return max(0.0, (origin + seconds - now) / 3600)
+
+
+def rate_per_hour(fitted, at, model=MODEL):
+    """The fitted fill rate in percentage points per hour at time ``at``."""
+    intercept, slope, origin = fitted
+    if model == "exponential":
+        # d/dt exp(a + b t) = b exp(a + b t)
+        return slope * math.exp(intercept + slope * (at - origin)) * 3600
+    return slope * 3600
+
+
+def forecast(series, now, horizon_hours=HORIZON_HOURS, model=MODEL, min_points=MIN_POINTS):
+    """Alarm-like field dicts for every volume projected to fill within ``horizon_hours``."""
+    warnings = []
+    for (instance_id, path, fstype), points in series.items():
+        if len(points) < min_points:
+            continue
+        fitted = fit(points, model)
+        hours = hours_to_full(points, now, model, fitted)
+        if hours is None or hours > horizon_hours:
+            continue
+        # From the regression, so one noisy first or last sample does not skew it
+        rate = rate_per_hour(fitted, points[-1][0], model)
+        warnings.append({
+            "alarm_name": f"{instance_id}:{path} fill forecast",
+            # Dedup keys on alarm name + state, so repeats are suppressed per volume
+            "new_state": "FORECAST",
+            "state_change_time": "",
+            "namespace": "CWAgent",
+            "metric": "disk_used_percent",
+            "variant": "forecast",
+            "instance_id": instance_id,
+            "path": path,
+            "fstype": fstype,
+            "used_percent": round(points[-1][1], 1),
+            "hours_to_full": round(hours, 1),
+            "rate_per_hour": round(rate, 2),
+            "horizon_hours": horizon_hours,
+            "model": model,
+            "reason": f"Projected to reach 100% in {hours:.1f}h ({model} fit over {len(points)} datapoints).",
+            "dimensions": {"instanceid": instance_id, "path": path, "fstype": fstype},
+        })
+    return sorted(warnings, key=lambda w: w["hours_to_full"])
+
+
+def _default_client():
+    import boto3
+    return boto3.client('cloudwatch')
+
+
+_client = None
+
+
+def lambda_handler(event, context):
+    """Scheduled entry point: fit every volume and warn on those filling within the horizon."""
+    global _client
+    # Shares the notifier's webhook client, SSM cache and templates
+    from lambda_function import parameters, post_message, templates
+
+    logger.start_invocation(context)
+    now = time.time()
+    if _client is None:
+        _client = _default_client()
+
+    with logger.stage("fetch"):
+        series = fetch_series(_client, now)
+    with logger.stage("fit"):
+        warnings = forecast(series, now)
+
+    fresh = []
+    for warning in warnings:
+        keys = deduplicator.claim(None, warning)
+        if keys is not None:
+            fresh.append((warning, keys))
+
+    posted = failed = 0
+    if fresh:
+        parameter_name = os.environ.get("WEBHOOK_PARAM_NAME", "/rocketchat/webhook_url")
+        with logger.stage("ssm"):
+            url = parameters.get(parameter_name)
+        templates.refresh()
+        with logger.stage("post"):
+            for warning, keys in fresh:
+                try:
+                    post_message(url, templates.render(warning))
+                    posted += 1
+                except Exception as e:
+                    deduplicator.release(keys)
+                    failed += 1
+                    logger.warning("forecast post failed", volume=warning["alarm_name"], error=str(e))
+
+    summary = {"volumes": len(series), "warnings": len(warnings), "posted": posted, "failed": failed}
+    logger.log("WARNING" if failed else "INFO", "forecast complete", timingsMs=logger.timings, **summary)
+    return dict(summary, statusCode=502 if failed else 200)
@@ -0,0 +1,313 @@
+import base64
+import hmac
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from metrics import parse_state_change_time
+from structured_log import logger
+
+# DynamoDB BatchWriteItem takes at most 25 puts per call
+MAX_BATCH_WRITE = 25
+
+# Global secondary index over one volume's transitions, ordered by time
+VOLUME_INDEX = "volume-time"
+
+DEFAULT_WINDOW_SECONDS = 24 * 3600
+
+# "24h", "90m", "7d", "3600s"
+WINDOW = re.compile(r"^(\d+(?:\.\d+)?)([smhd])$")
+WINDOW_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def transition(item):
+    """The history entry for one decoded alarm (a ``_process`` item)."""
+    fields = item["fields"]
+    at = parse_state_change_time(fields["state_change_time"]) or time.time()
+    return {
+        "instance": fields["instance_id"],
+        "volume": fields["path"],
+        "at": round(at, 3),
+        "alarm": fields["alarm_name"],
+        "state": fields["new_state"],
+        "old_state": item["alarm"].get("OldStateValue", "UNKNOWN"),
+        "value": fields.get("used_percent"),
+    }
+
+
+class SQLiteHistory:
+    """Transition history in SQLite, for local runs and tests.
+
+    Rows are unique per (alarm, time, state), so a redelivered alarm is
+    written once; the (instance, at) and (instance, volume, at) indexes serve
+    the same queries as the DynamoDB table's key and volume index.
+    """
+
+    def __init__(self, path=":memory:"):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS history (instance TEXT, volume TEXT, at REAL, alarm TEXT, "
+                             "state TEXT, old_state TEXT, value REAL, PRIMARY KEY (alarm, at, state))")
+            self._db.execute("CREATE INDEX IF NOT EXISTS history_instance ON history (instance, at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS history_volume ON history (instance, volume, at)")
+
+    def append(self, entries):
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO history VALUES (:instance, :volume, :at, :alarm, :state, :old_state, :value)",
+                entries)
+
+    def query(self, instance, since, until=None, volume=None, limit=500):
+        """Transitions of ``instance`` (one ``volume`` if given) between ``since`` and ``until``, oldest first."""
+        sql = "SELECT instance, volume, at, alarm, state, old_state, value FROM history WHERE instance = ?"
+        args = [instance]
+        if volume:
+            sql += " AND volume = ?"
+            args.append(volume)
+        sql += " AND at BETWEEN ? AND ? ORDER BY at DESC LIMIT ?"
+        args += [since, until if until is not None else time.time(), limit]
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        keys = ("instance", "volume", "at", "alarm", "state", "old_state", "value")
+        return [dict(zip(keys, row)) for row in reversed(rows)]
+
+
+class DynamoDBHistory:
+    """Transition history in DynamoDB, one item per transition.
+
+    Items are keyed ``pk = "i#<instance>"`` and ``sk = "<epoch ms>#<alarm>#<state>"``
+    so an instance's window is one ``Query`` on the table; ``vk =
+    "<instance>#<volume>"`` with the numeric ``at`` feeds the ``volume-time``
+    index for one volume. ``expires_at`` lets DynamoDB TTL drop entries after
+    ``retention_days``. Writes go out in ``BatchWriteItem`` calls of 25.
+    """
+
+    def __init__(self, table_name, retention_days=30, client_factory=None):
+        self.table_name = table_name
+        self.retention_days = retention_days
+        self._client_factory = client_factory or _default_client
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    def _item(self, entry):
+        item = {
+            "pk": {"S": f"i#{entry['instance']}"},
+            "sk": {"S": f"{int(entry['at'] * 1000):013d}#{entry['alarm']}#{entry['state']}"},
+            "vk": {"S": f"{entry['instance']}#{entry['volume']}"},
+            "at": {"N": str(entry["at"])},
+            "volume": {"S": entry["volume"]},
+            "alarm": {"S": entry["alarm"]},
+            "state": {"S": entry["state"]},
+            "old_state": {"S": entry["old_state"]},
+            "expires_at": {"N": str(int(entry["at"] + self.retention_days * 86400))},
+        }
+        if entry.get("value") is not None:
+            item["value"] = {"N": str(entry["value"])}
+        return item
+
+    def append(self, entries):
+        requests = [{"PutRequest": {"Item": self._item(entry)}} for entry in entries]
+        for start in range(0, len(requests), MAX_BATCH_WRITE):
+            pending = {self.table_name: requests[start:start + MAX_BATCH_WRITE]}
+            # Throttled puts come back unprocessed; retry them once before giving up
+            for _ in range(2):
+                pending = self.client.batch_write_item(RequestItems=pending).get("UnprocessedItems") or {}
+                if not pending:
+                    break
+            if pending:
+                raise RuntimeError(f"{len(pending[self.table_name])} history entries left unprocessed")
+
+    def query(self, instance, since, until=None, volume=None, limit=500):
+        until = until if until is not None else time.time()
+        if volume:
+            kwargs = {
+                "IndexName": VOLUME_INDEX,
+                "KeyConditionExpression": "vk = :key AND #at BETWEEN :since AND :until",
+                "ExpressionAttributeNames": {"#at": "at"},
+                "ExpressionAttributeValues": {":key": {"S": f"{instance}#{volume}"},
+                                              ":since": {"N": str(since)}, ":until": {"N": str(until)}},
+            }
+        else:
+            kwargs = {
+                "KeyConditionExpression": "pk = :key AND sk BETWEEN :since AND :until",
+                "ExpressionAttributeValues": {":key": {"S": f"i#{instance}"},
+                                              ":since": {"S": f"{int(since * 1000):013d}"},
+                                              ":until": {"S": f"{int(until * 1000):013d}~"}},
+            }
+        # Newest first, so the limit keeps the most recent transitions
+        kwargs.update(TableName=self.table_name, ScanIndexForward=False)
+        entries = []
+        while len(entries) < limit:
+            page = self.client.query(Limit=limit - len(entries), **kwargs)
+            entries.extend(_entry(instance, item) for item in page.get("Items", []))
+            if "LastEvaluatedKey" not in page:
+                break
+            kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+        return list(reversed(entries))
+
+
+def _entry(instance, item):
+    return {
+        "instance": instance,
+        "volume": item["volume"]["S"],
+        "at": float(item["at"]["N"]),
+        "alarm": item["alarm"]["S"],
+        "state": item["state"]["S"],
+        "old_state": item["old_state"]["S"],
+        "value": float(item["value"]["N"]) if "value" in item else None,
+    }
+
+
+def _default_client():
+    import boto3
+    return boto3.client('dynamodb')
+
+
+def load_history():
+    """The container's history store from HISTORY_TABLE_NAME (or HISTORY_DB_PATH locally), or None."""
+    table_name = os.environ.get("HISTORY_TABLE_NAME")
+    if table_name:
+        return DynamoDBHistory(table_name, retention_days=int(os.environ.get("HISTORY_RETENTION_DAYS", "30")))
+    db_path = os.environ.get("HISTORY_DB_PATH")
+    if db_path:
+        return SQLiteHistory(db_path)
+    return None
+
+
+# === Read path: "what's been alarming on <instance>?" ===
+
+def parse_window(text):
+    match = WINDOW.match(text.lower())
+    if not match:
+        raise ValueError(f"window must look like 24h, 90m or 7d, got {text!r}")
+    return float(match.group(1)) * WINDOW_UNITS[match.group(2)]
+
+
+def parse_command(text, trigger_word=None):
+    """(instance, volume, window seconds) from ``[trigger] <instance> [/mount/path] [24h]``."""
+    words = (text or "").split()
+    if trigger_word and words and words[0] == trigger_word:
+        words = words[1:]
+    if not words:
+        raise ValueError("usage: <instance id> [mount path] [window, e.g. 24h]")
+    instance, volume, window = words[0], None, DEFAULT_WINDOW_SECONDS
+    for word in words[1:]:
+        if word.startswith("/"):
+            volume = word
+        else:
+            window = parse_window(word)
+    return instance, volume, window
+
+
+def summarize(entries, since, now):
+    """Per (volume, alarm): transitions into ALARM, seconds spent in ALARM, peak value and current state."""
+    summary = {}
+    for entry in entries:
+        key = (entry["volume"], entry["alarm"])
+        volume = summary.get(key)
+        if volume is None:
+            # An alarm already firing when the window opened counts from the window start
+            volume = summary[key] = {"alarms": 0, "alarm_seconds": 0.0, "peak": None,
+                                     "state": entry["old_state"], "since": since}
+        if volume["state"] == "ALARM":
+            volume["alarm_seconds"] += entry["at"] - volume["since"]
+        if entry["state"] == "ALARM":
+            volume["alarms"] += 1
+            if entry["value"] is not None and (volume["peak"] is None or entry["value"] > volume["peak"]):
+                volume["peak"] = entry["value"]
+        volume["state"], volume["since"] = entry["state"], entry["at"]
+    for volume in summary.values():
+        if volume["state"] == "ALARM":
+            volume["alarm_seconds"] += now - volume["since"]
+    return summary
+
+
+def _duration(seconds):
+    minutes = int(round(seconds / 60))
+    if minutes < 60:
+        return f"{minutes}m"
+    return f"{minutes // 60}h {minutes % 60:02d}m"
+
+
+def render_history(instance, entries, window, now, volume=None):
+    """The chat reply for one instance's transitions over the last ``window`` seconds."""
+    scope = f"{instance} {volume}" if volume else instance
+    header = f"*Disk alarm history for {scope} (last {_duration(window)})*"
+    if not entries:
+        return f"{header}\nNo alarm transitions recorded."
+    lines = [header]
+    summary = summarize(entries, now - window, now)
+    for (path, alarm), item in sorted(summary.items(), key=lambda kv: -kv[1]["alarm_seconds"]):
+        current = item["state"]
+        if current == "ALARM":
+            at = datetime.fromtimestamp(item["since"], timezone.utc).strftime("%H:%M UTC")
+            current = f"ALARM since {at}"
+        peak = f", peak {item['peak']:g}%" if item["peak"] is not None else ""
+        lines.append(f"• {path} `{alarm}`: {item['alarms']} alarm(s), {_duration(item['alarm_seconds'])} "
+                     f"in ALARM{peak}, now {current}")
+    return "\n".join(lines)
+
+
+def _request(event):
+    """The outgoing-webhook payload from a function URL / API Gateway event (or a direct invoke)."""
+    body = event.get("body")
+    if body is None:
+        return event
+    if event.get("isBase64Encoded"):
+        body = base64.b64decode(body).decode()
+    return json.loads(body or "{}")
+
+
+def _reply(status, text):
+    return {"statusCode": status, "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"text": text})}
+
+
+def lambda_handler(event, context):
+    """Rocket.Chat outgoing webhook / slash command: summarize an instance's recent alarms.
+
+    Requests carry the integration's ``token``, checked against the SSM
+    parameter named by HISTORY_TOKEN_PARAM_NAME. The reply is answered from
+    the history index only; CloudWatch alarm history is never read.
+    """
+    # Shares the notifier's SSM cache and history store
+    from lambda_function import history, parameters
+
+    logger.start_invocation(context)
+    request = _request(event)
+    token_param = os.environ.get("HISTORY_TOKEN_PARAM_NAME", "/rocketchat/history_token")
+    try:
+        with logger.stage("ssm"):
+            expected = parameters.get(token_param)
+    except Exception as e:
+        # Until the token is stored (see README) every request is refused, not a 500
+        logger.error("history token fetch failed", parameter=token_param, error=str(e))
+        return _reply(503, "The history command is not configured.")
+    # compare_digest rejects non-ASCII str; bytes compare any token
+    if not hmac.compare_digest(str(request.get("token", "")).encode(), expected.encode()):
+        logger.warning("history command rejected", user=request.get("user_name"))
+        return _reply(403, "Invalid token.")
+    if history is None:
+        return _reply(503, "Alarm history is not enabled.")
+
+    try:
+        instance, volume, window = parse_command(request.get("text"), request.get("trigger_word"))
+    except ValueError as e:
+        return _reply(200, str(e))
+
+    now = time.time()
+    with logger.stage("query"):
+        entries = history.query(instance, now - window, now, volume=volume)
+    logger.info("history command", user=request.get("user_name"), instance=instance, volume=volume,
+                transitions=len(entries), timingsMs=logger.timings)
+    return _reply(200, render_history(instance, entries, window, now, volume))
@@ -0,0 +1,173 @@
+import http.client
+import json
+import queue
+import random
+import threading
+import time
+import urllib.error
+from urllib.parse import urlsplit
+
+from retry_queue import parse_retry_after
+
+# Responses worth retrying: throttling and transient server-side failures
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+# HTTP statuses that mean a cached webhook URL is stale (rotated or revoked)
+STALE_WEBHOOK_STATUSES = (401, 403, 404)
+
+# Errors raised when a pooled keep-alive socket was closed by the server
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class ConnectionPool:
+    """Bounded pool of keep-alive connections to a single scheme/host/port."""
+
+    def __init__(self, scheme, host, port, size, connect_timeout, read_timeout):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.created = 0
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, reusable=True):
+        if reusable:
+            self._idle.put(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    def replace(self, conn):
+        """Swap a dead connection for a fresh one without giving up the slot."""
+        conn.close()
+        return self._connect()
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        conn = cls(self.host, self.port, timeout=self.connect_timeout)
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        self.created += 1
+        return conn
+
+
+class WebhookClient:
+    """JSON POST client that reuses connections per webhook host.
+
+    Meant to live at module level so warm Lambda containers keep their TCP
+    and TLS sessions between invocations. Non-2xx responses are raised as
+    ``urllib.error.HTTPError`` after retries are exhausted.
+
+    POSTs are not idempotent, so socket errors are only retried while
+    connecting, before any of the request was sent. A retry is also skipped
+    when its worst case (backoff plus connect and read timeouts) would end
+    after ``total_timeout`` seconds from the first attempt.
+
+    A ``Retry-After`` is waited out in full. When it does not fit in the
+    remaining ``total_timeout`` (or in ``backoff_cap`` without one) the
+    response is raised instead, carrying the header so the caller can queue
+    the message for that long.
+    """
+
+    def __init__(self, pool_size=8, connect_timeout=3.0, read_timeout=5.0,
+                 max_retries=2, backoff_base=0.2, backoff_cap=2.0, total_timeout=None):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.total_timeout = total_timeout
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def post_json(self, url, payload):
+        parts = urlsplit(url)
+        pool = self._pool_for(parts)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        body = json.dumps(payload).encode("utf-8")
+
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                conn = pool.acquire()
+            except OSError:
+                # Nothing was sent, so retrying cannot post the message twice
+                delay = self._backoff(attempt)
+                if not self._may_retry(attempt, started, delay):
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            # Errors once the request is on the wire (e.g. a read timeout) are not retried
+            status, reason, headers = self._send(pool, conn, path, body)
+            if status < 400:
+                return status
+            if status in RETRYABLE_STATUSES:
+                delay = self._backoff(attempt, headers.get("Retry-After"))
+                if self._may_retry(attempt, started, delay):
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+            raise urllib.error.HTTPError(url, status, reason, headers, None)
+
+    def _may_retry(self, attempt, started, delay):
+        if attempt >= self.max_retries:
+            return False
+        if self.total_timeout is None:
+            return delay <= self.backoff_cap
+        worst_case = time.monotonic() - started + delay + self.connect_timeout + self.read_timeout
+        return worst_case <= self.total_timeout
+
+    def _pool_for(self, parts):
+        scheme = parts.scheme or "https"
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(scheme, parts.hostname, port, self.pool_size,
+                                      self.connect_timeout, self.read_timeout)
+                self._pools[key] = pool
+            return pool
+
+    def _send(self, pool, conn, path, body):
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        try:
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                response = conn.getresponse()
+            except STALE_CONNECTION_ERRORS:
+                # Idle keep-alive socket was closed by the server; retry once on a new one
+                conn = pool.replace(conn)
+                conn.request("POST", path, body=body, headers=headers)
+                response = conn.getresponse()
+            response.read()
+        except Exception:
+            pool.release(conn, reusable=False)
+            raise
+        pool.release(conn, reusable=not response.will_close)
+        return response.status, response.reason, response.headers
+
+    def _backoff(self, attempt, retry_after=None):
+        retry_after = parse_retry_after(retry_after)
+        if retry_after is not None:
+            return retry_after
+        # Full jitter keeps concurrent workers from retrying in lockstep
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
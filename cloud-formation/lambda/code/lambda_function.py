@@ -1,89 +1,374 @@
+import time
+
+_INIT_STARTED = time.perf_counter()
+
 import json
-import urllib.request
 import urllib.error
-import boto3
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+from dedup import Deduplicator, DynamoDBStore
+from digest import GROUP_KEYS, group_alarms, render_digest
+from history import load_history, transition
+from http_pool import STALE_WEBHOOK_STATUSES, WebhookClient
+from metrics import MetricsEmitter, parse_state_change_time
+from retry_queue import load_retry_queue, parse_retry_after
+from rollup import load_resolver, rollup_expression
+from sinks import load_fanout
+from ssm_cache import ParameterCache
+from structured_log import logger
+from templates import alarm_fields, load_registry
+from thresholds import load_thresholds
+
+# Upper bound on concurrent Rocket.Chat posts per invocation
+MAX_CONCURRENCY = int(os.environ.get("MAX_CONCURRENCY", "8"))
+
+# "off" posts one message per alarm; "instance" or "family" posts one digest per group
+DIGEST_MODE = os.environ.get("DIGEST_MODE", "off").lower()
+
+# Module-level so parameters survive across warm invocations
+parameters = ParameterCache(ttl=int(os.environ.get("SSM_CACHE_TTL_SECONDS", "300")))
+webhook_client = WebhookClient(
+    pool_size=int(os.environ.get("HTTP_POOL_SIZE", str(MAX_CONCURRENCY))),
+    connect_timeout=float(os.environ.get("HTTP_CONNECT_TIMEOUT", "3")),
+    read_timeout=float(os.environ.get("HTTP_READ_TIMEOUT", "5")),
+    max_retries=int(os.environ.get("HTTP_MAX_RETRIES", "2")),
+    total_timeout=float(os.environ.get("HTTP_TOTAL_TIMEOUT", "20")),
+)
+deduplicator = Deduplicator(
+    remote=DynamoDBStore(os.environ["DEDUP_TABLE_NAME"]) if os.environ.get("DEDUP_TABLE_NAME") else None,
+    ttl_seconds=int(os.environ.get("DEDUP_TTL_SECONDS", "3600")),
+    suppression_seconds=int(os.environ.get("DEDUP_SUPPRESSION_SECONDS", "120")),
+)
+
+metrics = MetricsEmitter()
+templates = load_registry(parameters)
+# None unless a routing table is configured; then alarms fan out to its sinks
+fanout = load_fanout(parameters)
+# None unless RETRY_QUEUE_URL is set; then failed alarms are queued instead of dropped
+retry_queue = load_retry_queue()
+resolver = load_resolver()
+# None unless THRESHOLDS_PATH is set; then messages show the store's threshold and headroom
+thresholds = load_thresholds()
+# None unless HISTORY_TABLE_NAME (or HISTORY_DB_PATH) is set; then every transition is recorded
+history = load_history()
+
+# Module import cost, reported once by the first (cold) invocation
+INIT_DURATION_MS = round((time.perf_counter() - _INIT_STARTED) * 1000, 2)
+_cold_start = True
+
+
+def unwrap_sns(record):
+    """Return the SNS notification from a direct SNS record or an SQS-buffered one."""
+    if 'Sns' in record:
+        return record['Sns']
+    # SNS -> SQS subscriptions (digest mode) carry the notification JSON in the body
+    return json.loads(record['body'])
+
+
+def decode_record(record):
+    """Unwrap the SNS MessageId and CloudWatch alarm payload carried in a record."""
+    notification = unwrap_sns(record)
+
+    # Unwrap double-encoded SNS message if needed
+    sns_message = json.loads(notification['Message'])
+    if isinstance(sns_message, str):
+        sns_message = json.loads(sns_message)
+
+    return notification.get('MessageId'), sns_message
+
+
+def render_message(fields):
+    """Compose the Rocket.Chat text for a decoded alarm with its type's template."""
+    return templates.render(fields)
+
+
+def post_message(url, message):
+    """POST a single message to the Rocket.Chat webhook and return the HTTP status."""
+    return webhook_client.post_json(url, {"text": message})
+
+
+def published_at(record):
+    """Epoch seconds SNS published the record (SQS send time for SQS-buffered records)."""
+    if 'Sns' in record:
+        return parse_state_change_time(record['Sns'].get('Timestamp'))
+    sent = record.get('attributes', {}).get('SentTimestamp')
+    return int(sent) / 1000 if sent else None
+
+
+def _record_id(record, index):
+    # SQS partial batch responses must echo the SQS messageId
+    if 'messageId' in record:
+        return record['messageId']
+    return record.get('Sns', {}).get('MessageId') or str(index)
+
+
+def _deliver(url, delivery, parameter_name):
+    started = time.perf_counter()
+    post_started_at = time.time()
+    try:
+        try:
+            status = post_message(url, delivery["message"])
+        except urllib.error.HTTPError as e:
+            if e.code not in STALE_WEBHOOK_STATUSES:
+                raise
+            # The webhook may have been rotated: re-read it (one SSM call across workers) and retry once
+            logger.warning("webhook rejected, invalidating cached url", status=e.code, parameter=parameter_name)
+            fresh_url = parameters.refetch(parameter_name, url)
+            if fresh_url == url:
+                raise
+            status = post_message(fresh_url, delivery["message"])
+    except Exception as e:
+        logger.warning("post failed", ids=delivery["ids"], error=str(e))
+        failed = {"status": "failed", "error": str(e)}
+        # Rocket.Chat rate limiting: the retry queue waits at least this long
+        if isinstance(e, urllib.error.HTTPError) and e.code == 429:
+            failed["retryAfter"] = parse_retry_after(e.headers.get("Retry-After") if e.headers else None)
+        return [dict(failed, id=record_id) for record_id in delivery["ids"]]
+    latency_ms = (time.perf_counter() - started) * 1000
+    posted_at = time.time()
+    return [
+        {"id": record_id, "status": "posted", "statusCode": status, "latencyMs": latency_ms,
+         "postStartedAt": post_started_at, "postedAt": posted_at}
+        for record_id in delivery["ids"]
+    ]
+
+
+def build_deliveries(items, mode):
+    """Turn decoded items into the messages to post, one per alarm or one per digest group."""
+    if mode not in GROUP_KEYS:
+        return [{"ids": [item["id"]], "message": render_message(item["fields"]), "fields": item["fields"],
+                 "sinks": item.get("sinks")}
+                for item in items]
+
+    # Digests are routed by their first alarm
+    return [
+        {"ids": [item["id"] for item in group], "message": render_digest(mode, key, group),
+         "fields": group[0]["fields"], "sinks": _owed_sinks(group)}
+        for key, group in group_alarms(items, mode).items()
+    ]
+
+
+def _owed_sinks(items):
+    """Sinks a retried group still owes, or None when any of its alarms is routed normally."""
+    if any(item.get("sinks") is None for item in items):
+        return None
+    return sorted({name for item in items for name in item["sinks"]})
+
+
+def _log_cold_start():
+    global _cold_start
+    if _cold_start:
+        _cold_start = False
+        logger.info("cold start", coldStart=True, initDurationMs=INIT_DURATION_MS)
 
-ssm = boto3.client('ssm')
 
 def lambda_handler(event, context):
-    print("==== RAW EVENT ====")
-    print(json.dumps(event, indent=2))
+    started = time.perf_counter()
+    logger.start_invocation(context)
+    _log_cold_start()
+
+    response, items, results = _process(event)
+
+    metrics.emit_invocation(items, results, (time.perf_counter() - started) * 1000,
+                            ssm_ms=logger.timings.get("ssm"))
+    return response
+
+
+def _process(event):
+    """Decode, dedup, render and deliver the records; return (response, items, results)."""
+
+    # Raw events are only dumped when explicitly debugging; failed records are logged below
+    if logger.enabled("DEBUG"):
+        logger.debug("raw event", event=event)
 
     parameter_name = os.environ.get("WEBHOOK_PARAM_NAME", "/rocketchat/webhook_url")
+    records = event.get('Records', [])
+    received_at = time.time()
+
+    # === Decode and dedup every record before any SSM or HTTP work ===
+    results = []
+    items = []
+    for index, record in enumerate(records):
+        record_id = _record_id(record, index)
+        try:
+            with logger.stage("decode"):
+                message_id, sns_message = decode_record(record)
+                fields = alarm_fields(sns_message)
+                # Retries of a partial fan-out only go to the sinks that failed
+                sinks = unwrap_sns(record).get("Sinks")
+        except Exception as e:
+            logger.warning("record decode failed", id=record_id, error=str(e), record=record)
+            results.append({"id": record_id, "status": "failed", "error": str(e)})
+            continue
+
+        with logger.stage("dedup"):
+            dedup_keys = deduplicator.claim(message_id, fields)
+        if dedup_keys is None:
+            logger.debug("duplicate skipped", id=record_id, alarm=fields['alarm_name'], state=fields['new_state'])
+            results.append({"id": record_id, "status": "deduped", "family": fields["metric"]})
+            continue
+        items.append({"id": record_id, "alarm": sns_message, "fields": fields,
+                      "dedup_keys": dedup_keys, "record": record, "sinks": sinks})
+
+    if not items:
+        return _summarize(results, 0), items, results
+
+    # Rollup alarms only name the query; look up which volumes breached
+    rollups = [item for item in items if rollup_expression(item["alarm"])]
+    if rollups:
+        with logger.stage("resolve"):
+            for item in rollups:
+                resolver.resolve(item["alarm"], item["fields"])
+
+    if thresholds is not None:
+        with logger.stage("thresholds"):
+            thresholds.refresh()
+            for item in items:
+                thresholds.annotate(item["alarm"], item["fields"])
 
     try:
-        response = ssm.get_parameter(Name=parameter_name, WithDecryption=True)
-        url = response['Parameter']['Value']
+        with logger.stage("ssm"):
+            if fanout is None:
+                url = parameters.get(parameter_name)
+            else:
+                # Sinks read their own URLs through the same cache
+                url = None
+                fanout.refresh()
     except Exception as e:
-        print(f"SSM fetch error: {str(e)}")
-        return {
-            "statusCode": 500,
-            "body": f"SSM parameter fetch error: {str(e)}"
-        }
+        logger.error("ssm fetch failed", parameter=parameter_name, error=str(e))
+        for item in items:
+            deduplicator.release(item["dedup_keys"])
+            results.append({"id": item["id"], "status": "failed", "error": str(e)})
+        _queue_failed(items, results)
+        _record_history(items)
+        response = _summarize(results, 0)
+        response.update(statusCode=500, body=f"SSM parameter fetch error: {str(e)}")
+        return response, items, results
+
+    with logger.stage("render"):
+        templates.refresh()
+        deliveries = build_deliveries(items, DIGEST_MODE)
+
+    # === Fan out the posts with bounded concurrency ===
+    with logger.stage("post"):
+        if fanout is not None:
+            results.extend(fanout.deliver(deliveries))
+        else:
+            _post_all(url, deliveries, parameter_name, results)
 
-    headers = {"Content-Type": "application/json"}
+    # Failed alarms must stay deliverable when SNS/SQS retries them
+    failed_ids = {r["id"] for r in results if r["status"] == "failed"}
+    for item in items:
+        if item["id"] in failed_ids:
+            deduplicator.release(item["dedup_keys"])
+            logger.warning("record delivery failed", id=item["id"], record=item["record"])
+    _queue_failed(items, results)
+    _record_history(items)
 
-    for record in event.get('Records', []):
+    _log_deliveries(items, results, received_at)
+
+    return _summarize(results, len(deliveries)), items, results
+
+
+def _record_history(items):
+    """Append the transitions to the history store once the posts are done.
+
+    Recorded whether or not the post succeeded; redeliveries overwrite the same entry.
+    """
+    if history is None:
+        return
+    with logger.stage("history"):
         try:
-            raw_message = record['Sns']['Message']
-
-            # Unwrap double-encoded SNS message if needed
-            try:
-                sns_message = json.loads(raw_message)
-                if isinstance(sns_message, str):
-                    sns_message = json.loads(sns_message)
-            except Exception as decode_err:
-                print(f"Error decoding SNS message: {decode_err}")
-                continue
-
-            dimensions = sns_message.get('Trigger', {}).get('Dimensions', [])
-
-            print("==== Received Dimensions ====")
-            print(json.dumps(dimensions, indent=2))
-
-            # Use lowercase keys as-is
-            path = next((d['value'] for d in dimensions if d.get('name', '').lower() == 'path'), 'unknown')
-            instance_id = next((d['value'] for d in dimensions if d.get('name', '').lower() == 'instanceid'), 'unknown')
-            fstype = next((d['value'] for d in dimensions if d.get('name', '').lower() == 'fstype'), 'unknown')
-
-            # Extract other fields
-            alarm_name = sns_message.get('AlarmName', 'UnknownAlarm')
-            new_state = sns_message.get('NewStateValue', 'UNKNOWN')
-            reason = sns_message.get('NewStateReason', 'No reason provided.')
-
-            # Compose message with full context
-            message = (
-                f"*Disk Alarm Triggered*\n"
-                f"`{alarm_name}` is now in state: *{new_state}*\n"
-                f"🔹 Volume: `{path}`\n"
-                f"🔹 Instance ID: `{instance_id}`\n"
-                f"🔹 Filesystem: `{fstype}`\n"
-                f"🔹 Reason: {reason}"
-            )
-
-            payload = {
-                "text": message
-            }
-
-            req = urllib.request.Request(
-                url,
-                data=json.dumps(payload).encode("utf-8"),
-                headers=headers,
-                method="POST"
-            )
-
-            with urllib.request.urlopen(req, timeout=10) as response:
-                return {
-                    "statusCode": response.getcode(),
-                    "body": "Rocket.Chat notified: Disk alarm"
-                }
+            history.append([transition(item) for item in items])
+        except Exception as e:
+            logger.warning("history append failed", records=len(items), error=str(e))
+
+
+def _post_all(url, deliveries, parameter_name, results):
+    """Post every delivery to the single Rocket.Chat webhook with bounded concurrency."""
+    workers = max(1, min(MAX_CONCURRENCY, len(deliveries)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for delivered in pool.map(lambda d: _deliver(url, d, parameter_name), deliveries):
+            results.extend(delivered)
+
 
+def _queue_failed(items, results):
+    """Hand failed alarms to the retry queue so SNS/SQS redelivery is not the only retry."""
+    if retry_queue is None:
+        return
+    by_id = {item["id"]: item for item in items}
+    for result in results:
+        item = by_id.get(result["id"])
+        if result["status"] != "failed" or item is None:
+            continue
+        try:
+            result["status"] = retry_queue.hand_off(unwrap_sns(item["record"]), error=result.get("error"),
+                                                    retry_after=result.get("retryAfter"),
+                                                    sinks=result.get("retrySinks"))
         except Exception as e:
-            print(f"Error processing record: {str(e)}")
+            # Left as failed so the caller's own redelivery still applies
+            logger.error("retry enqueue failed", id=result["id"], error=str(e))
+
+
+def _log_deliveries(items, results, received_at):
+    """One line per posted alarm with the timestamps the latency probe correlates."""
+    if not logger.enabled("INFO"):
+        return
+    posted = {r["id"]: r for r in results if r["status"] == "posted"}
+    for item in items:
+        result = posted.get(item["id"])
+        if result is None:
             continue
+        logger.info("alarm delivered",
+                    alarm=item["fields"]["alarm_name"],
+                    state=item["fields"]["new_state"],
+                    stateChangeTime=parse_state_change_time(item["fields"]["state_change_time"]),
+                    publishedAt=published_at(item["record"]),
+                    receivedAt=round(received_at, 3),
+                    postStartedAt=round(result["postStartedAt"], 3),
+                    postedAt=round(result["postedAt"], 3))
+
+
+def _summarize(results, deliveries):
+    posted = sum(1 for r in results if r["status"] == "posted")
+    deduped = sum(1 for r in results if r["status"] == "deduped")
+    queued = sum(1 for r in results if r["status"] == "queued")
+    dead_lettered = sum(1 for r in results if r["status"] == "dead-lettered")
+    failures = [{"itemIdentifier": r["id"]} for r in results if r["status"] == "failed"]
+
+    if not results:
+        status_code, body = 200, "No valid SNS records processed or all failed."
+    elif failures:
+        status_code, body = 207 if posted or deduped else 502, f"Rocket.Chat notified: {posted}/{len(results)} disk alarms"
+    else:
+        status_code, body = 200, f"Rocket.Chat notified: {posted}/{len(results)} disk alarms ({deduped} duplicates skipped)"
+        if queued:
+            status_code, body = 202, f"{body}, {queued} queued for retry"
+        # Dead-lettered alarms will not be retried, so they are not reported as accepted
+        if dead_lettered:
+            status_code, body = 207 if posted or deduped else 502, f"{body}, {dead_lettered} dead-lettered"
+
+    summary = {
+        "records": len(results),
+        "posted": posted,
+        "deduped": deduped,
+        "queued": queued,
+        "deadLettered": dead_lettered,
+        "failed": len(failures),
+        "deliveries": deliveries,
+        "timingsMs": logger.timings,
+        "ssmCache": parameters.stats(),
+    }
+    if failures or dead_lettered:
+        logger.warning("invocation complete", **summary)
+    else:
+        logger.info("invocation complete", **summary)
 
     return {
-        "statusCode": 200,
-        "body": "No valid SNS records processed or all failed."
-    }
\ No newline at end of file
+        "statusCode": status_code,
+        "body": body,
+        "deliveries": deliveries,
+        "results": results,
+        "batchItemFailures": failures
+    }
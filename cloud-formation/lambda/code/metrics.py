@@ -0,0 +1,114 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+# EMF accepts at most 100 values per metric per record
+MAX_VALUES = 100
+
+COUNT_METRICS = (
+    ("RecordsProcessed", "processed"),
+    ("RecordsPosted", "posted"),
+    ("RecordsDeduped", "deduped"),
+    ("RecordsFailed", "failed"),
+    ("RecordsQueued", "queued"),
+    ("RecordsDeadLettered", "dead-lettered"),
+)
+
+
+def parse_state_change_time(value):
+    """Epoch seconds for a CloudWatch ``StateChangeTime`` (None if unparseable)."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z").timestamp()
+    except ValueError:
+        return None
+
+
+class MetricsEmitter:
+    """Writes CloudWatch Embedded Metric Format records to stdout.
+
+    EMF lines are turned into metrics by CloudWatch Logs on ingestion, so
+    the notifier gets latency and outcome metrics without PutMetricData
+    calls. They bypass log sampling on purpose.
+    """
+
+    def __init__(self, namespace=None, enabled=None, stream=None):
+        self.namespace = namespace or os.environ.get("METRICS_NAMESPACE", "RocketChatNotifier")
+        if enabled is None:
+            enabled = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+        self.enabled = enabled
+        self.stream = stream
+
+    def emit(self, metrics, dimensions=None, dimension_sets=None):
+        """Emit one EMF record.
+
+        ``metrics`` maps name -> (value or list of values, unit). Empty lists
+        are skipped. ``dimension_sets`` defaults to the keys of ``dimensions``.
+        """
+        if not self.enabled:
+            return None
+        dimensions = dimensions or {}
+        definitions = []
+        record = dict(dimensions)
+        for name, (value, unit) in metrics.items():
+            if isinstance(value, list):
+                if not value:
+                    continue
+                value = [round(v, 3) for v in value[:MAX_VALUES]]
+            definitions.append({"Name": name, "Unit": unit})
+            record[name] = value
+        if not definitions:
+            return None
+
+        if dimension_sets is None:
+            dimension_sets = [sorted(dimensions)]
+        record["_aws"] = {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": self.namespace,
+                "Dimensions": dimension_sets,
+                "Metrics": definitions,
+            }],
+        }
+        print(json.dumps(record, separators=(",", ":")), file=self.stream or sys.stdout)
+        return record
+
+    def emit_invocation(self, items, results, handler_ms, ssm_ms=None):
+        """Emit per-alarm-family outcome/latency records plus one function-level record."""
+        fields_by_id = {item["id"]: item["fields"] for item in items}
+        families = {}
+
+        for result in results:
+            fields = fields_by_id.get(result["id"])
+            # Deduped records carry their family; records that never decoded have none
+            name = result.get("family") or (fields["metric"] if fields else "unknown")
+            family = families.setdefault(name, _empty_family())
+            family["processed"] += 1
+            if result["status"] in family:
+                family[result["status"]] += 1
+            if result["status"] != "posted":
+                continue
+            family["webhook"].append(result["latencyMs"])
+            changed_at = parse_state_change_time(fields.get("state_change_time"))
+            if changed_at is not None:
+                family["delay"].append(max(0.0, (result["postedAt"] - changed_at) * 1000))
+
+        for name, family in families.items():
+            metrics = {metric: (family[key], "Count") for metric, key in COUNT_METRICS}
+            metrics["WebhookLatency"] = (family["webhook"], "Milliseconds")
+            metrics["AlarmToChatDelay"] = (family["delay"], "Milliseconds")
+            # Publish per family and rolled up across families from the same record
+            self.emit(metrics, {"AlarmFamily": name}, dimension_sets=[["AlarmFamily"], []])
+
+        function_metrics = {"HandlerLatency": (round(handler_ms, 3), "Milliseconds")}
+        if ssm_ms is not None:
+            function_metrics["SsmLatency"] = (round(ssm_ms, 3), "Milliseconds")
+        self.emit(function_metrics, dimension_sets=[[]])
+
+
+def _empty_family():
+    return {"processed": 0, "posted": 0, "deduped": 0, "failed": 0, "queued": 0, "dead-lettered": 0,
+            "webhook": [], "delay": []}
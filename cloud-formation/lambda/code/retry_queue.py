@@ -0,0 +1,146 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from structured_log import logger
+
+# SQS caps DelaySeconds at 15 minutes
+MAX_DELAY_SECONDS = 900
+
+
+def parse_retry_after(value):
+    """Seconds from a ``Retry-After`` header (delta-seconds or HTTP date), or None."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(attempt, base_delay, retry_after=None, rng=random):
+    """Exponential delay with equal jitter for ``attempt`` (1-based), never shorter than ``retry_after``."""
+    delay = min(MAX_DELAY_SECONDS, base_delay * 2 ** (attempt - 1))
+    delay = delay / 2 + rng.uniform(0, delay / 2)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return int(min(MAX_DELAY_SECONDS, math.ceil(delay)))
+
+
+class RetryQueue:
+    """Hands failed alarm deliveries to an SQS retry queue instead of dropping them.
+
+    Messages keep the SNS notification shape (``MessageId``/``Message``) plus
+    ``RetryAttempt`` (and ``Sinks``, the fan-out sinks still owed), so the drain handler decodes them exactly like
+    SQS-buffered digest records. After ``max_attempts`` the notification is
+    sent to the dead-letter queue. A 429 ``Retry-After`` seen by the drain
+    puts the container in backoff until it has passed.
+    """
+
+    def __init__(self, queue_url, dlq_url=None, max_attempts=8, base_delay=30, client_factory=None):
+        self.queue_url = queue_url
+        self.dlq_url = dlq_url
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self._client_factory = client_factory or _default_client
+        self._client = None
+        self._backoff_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = self._client_factory()
+            return self._client
+
+    def hand_off(self, notification, error=None, retry_after=None, sinks=None):
+        """Queue the next attempt for ``notification``; returns "queued" or "dead-lettered"."""
+        attempt = int(notification.get("RetryAttempt", 0)) + 1
+        body = dict(notification, RetryAttempt=attempt, LastError=error)
+        if sinks:
+            body["Sinks"] = sinks
+        if attempt > self.max_attempts:
+            if not self.dlq_url:
+                raise RuntimeError(f"retry budget exhausted after {self.max_attempts} attempts")
+            self.client.send_message(QueueUrl=self.dlq_url, MessageBody=json.dumps(body))
+            logger.error("alarm dead-lettered", messageId=notification.get("MessageId"), attempts=attempt - 1,
+                         error=error)
+            return "dead-lettered"
+
+        delay = retry_delay(attempt, self.base_delay, retry_after)
+        self.client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(body), DelaySeconds=delay)
+        logger.info("alarm queued for retry", messageId=notification.get("MessageId"), attempt=attempt,
+                    delaySeconds=delay)
+        return "queued"
+
+    def defer(self, notification, seconds):
+        """Put ``notification`` back without spending an attempt (backoff, not failure)."""
+        self.client.send_message(
+            QueueUrl=self.queue_url,
+            MessageBody=json.dumps(notification),
+            DelaySeconds=int(min(MAX_DELAY_SECONDS, math.ceil(seconds))),
+        )
+
+    def back_off(self, seconds):
+        with self._lock:
+            self._backoff_until = max(self._backoff_until, time.time() + seconds)
+
+    def backoff_remaining(self):
+        return max(0.0, self._backoff_until - time.time())
+
+
+def _default_client():
+    import boto3
+    return boto3.client('sqs')
+
+
+def load_retry_queue():
+    """The container's retry queue from RETRY_QUEUE_URL, or None when retries are off."""
+    queue_url = os.environ.get("RETRY_QUEUE_URL")
+    if not queue_url:
+        return None
+    return RetryQueue(
+        queue_url,
+        dlq_url=os.environ.get("RETRY_DLQ_URL"),
+        max_attempts=int(os.environ.get("RETRY_MAX_ATTEMPTS", "8")),
+        base_delay=int(os.environ.get("RETRY_BASE_DELAY_SECONDS", "30")),
+    )
+
+
+def lambda_handler(event, context):
+    """Drain the retry queue through the notifier pipeline.
+
+    Reserved concurrency on this function caps the load on Rocket.Chat. While
+    a ``Retry-After`` from Rocket.Chat is pending, whole batches are deferred
+    without posting.
+    """
+    import lambda_function
+
+    queue = lambda_function.retry_queue
+    wait = queue.backoff_remaining()
+    if wait > 0:
+        logger.start_invocation(context)
+        failures = []
+        for index, record in enumerate(event.get('Records', [])):
+            try:
+                queue.defer(lambda_function.unwrap_sns(record), wait)
+            except Exception as e:
+                logger.warning("retry defer failed", id=record.get('messageId'), error=str(e))
+                failures.append({"itemIdentifier": lambda_function._record_id(record, index)})
+        logger.info("retry batch deferred", records=len(event.get('Records', [])), backoffSeconds=round(wait, 1))
+        return {"statusCode": 429, "batchItemFailures": failures}
+
+    response = lambda_function.lambda_handler(event, context)
+    retry_after = max((r.get("retryAfter") or 0 for r in response.get("results", [])), default=0)
+    if retry_after:
+        queue.back_off(retry_after)
+    return response
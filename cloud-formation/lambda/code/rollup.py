@@ -0,0 +1,142 @@
+import os
+import re
+from datetime import datetime, timezone
+
+from structured_log import logger
+
+# Metric Insights rollups from CloudWatchAlarmStack's "instance"/"fleet" alarm modes:
+# SELECT MAX(<metric>) FROM <source> [WHERE <filter>]
+ROLLUP_QUERY = re.compile(
+    r"SELECT\s+MAX\((?P<metric>\w+)\)\s+FROM\s+(?P<source>.+?)"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?\s*(?:\s(?:GROUP|ORDER)\s+BY\s.*|\sLIMIT\s.*)?$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+# Metric source of the alarm stack's rollup queries (see stacks/fleet.py)
+DISK_SCHEMA = 'SCHEMA("CWAgent", InstanceId, fstype, path)'
+
+# Dynamic label so each grouped series names its volume
+GROUP_LABEL = "${PROP('Dim.InstanceId')}|${PROP('Dim.path')}|${PROP('Dim.fstype')}"
+
+
+def rollup_expression(sns_message):
+    """The Metric Insights query behind a rollup alarm, or None for a per-volume alarm.
+
+    Rollups are either a Metric Insights alarm, or a Maximum alarm on the
+    agent's aggregated disk_used_percent (dimensions without ``path``), which
+    is turned into the equivalent query.
+    """
+    trigger = sns_message.get('Trigger', {})
+    for query in trigger.get('Metrics', []):
+        expression = (query.get('Expression') or '').strip()
+        if expression and ROLLUP_QUERY.match(expression):
+            return expression
+
+    if trigger.get('Namespace') != 'CWAgent' or trigger.get('MetricName') != 'disk_used_percent':
+        return None
+    dimensions = [
+        (d.get('name') or d.get('Name'), d.get('value', d.get('Value')))
+        for d in trigger.get('Dimensions', [])
+    ]
+    if any(name.lower() == 'path' for name, _ in dimensions):
+        return None
+    query = f"SELECT MAX(disk_used_percent) FROM {DISK_SCHEMA}"
+    if dimensions:
+        query += " WHERE " + " AND ".join(f"{name} = '{value}'" for name, value in dimensions)
+    return query
+
+
+def breakdown_query(expression, limit):
+    """Rewrite a rollup query to return one series per volume, worst first."""
+    match = ROLLUP_QUERY.match(expression)
+    query = f"SELECT MAX({match['metric']}) FROM {match['source']}"
+    if match['where']:
+        query += f" WHERE {match['where']}"
+    return f"{query} GROUP BY InstanceId, path, fstype ORDER BY MAX() DESC LIMIT {limit}"
+
+
+def _default_client():
+    import boto3
+    return boto3.client('cloudwatch')
+
+
+class BreachResolver:
+    """Finds which volumes put a rollup alarm into ALARM.
+
+    Rollup alarms carry a query or only instance-level dimensions, so the
+    notification does not say which volume breached. The resolver re-runs the query
+    grouped by InstanceId/path/fstype through GetMetricData and keeps the
+    latest datapoint of each volume.
+    """
+
+    def __init__(self, lookback_seconds=300, limit=10, client_factory=None):
+        self.lookback_seconds = lookback_seconds
+        self.limit = limit
+        self._client_factory = client_factory or _default_client
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    def volumes(self, expression, now=None):
+        """Latest value per volume as dicts with instance_id/path/fstype/value, worst first."""
+        end = datetime.fromtimestamp(now, timezone.utc) if now else datetime.now(timezone.utc)
+        start = datetime.fromtimestamp(end.timestamp() - self.lookback_seconds, timezone.utc)
+        response = self._get_client().get_metric_data(
+            MetricDataQueries=[{
+                "Id": "breakdown",
+                "Expression": breakdown_query(expression, self.limit),
+                "Label": GROUP_LABEL,
+                "Period": 60,
+            }],
+            StartTime=start,
+            EndTime=end,
+            ScanBy="TimestampDescending",
+        )
+
+        volumes = []
+        for series in response.get("MetricDataResults", []):
+            if not series.get("Values"):
+                continue
+            instance_id, path, fstype = (series.get("Label", "").split("|") + ["unknown"] * 3)[:3]
+            volumes.append({
+                "instance_id": instance_id,
+                "path": path,
+                "fstype": fstype,
+                # TimestampDescending puts the latest datapoint first
+                "value": series["Values"][0],
+            })
+        return sorted(volumes, key=lambda v: v["value"], reverse=True)
+
+    def resolve(self, sns_message, fields, now=None):
+        """Point ``fields`` at the worst breaching volume and list every breach.
+
+        Leaves ``fields`` as they were (apart from ``variant``) if the lookup fails.
+        """
+        expression = rollup_expression(sns_message)
+        if expression is None:
+            return fields
+        fields.update(namespace="CWAgent", metric=ROLLUP_QUERY.match(expression)["metric"], variant="rollup")
+        try:
+            volumes = self.volumes(expression, now=now)
+        except Exception as e:
+            logger.warning("rollup breach lookup failed", alarm=fields["alarm_name"], error=str(e))
+            fields["breaches"] = "unavailable"
+            return fields
+
+        threshold = fields.get("threshold")
+        breaching = [v for v in volumes if not isinstance(threshold, (int, float)) or v["value"] > threshold]
+        if breaching:
+            worst = breaching[0]
+            fields.update(instance_id=worst["instance_id"], path=worst["path"], fstype=worst["fstype"])
+        fields["breach_count"] = len(breaching)
+        fields["breaches"] = "\n".join(
+            f"• `{v['instance_id']}` `{v['path']}` ({v['fstype']}): {v['value']:.1f}%" for v in breaching
+        ) or "none above threshold"
+        return fields
+
+
+def load_resolver():
+    return BreachResolver(lookback_seconds=int(os.environ.get("ROLLUP_LOOKBACK_SECONDS", "300")))
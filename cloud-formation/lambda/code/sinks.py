@@ -0,0 +1,411 @@
+import fnmatch
+import json
+import os
+import threading
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from http_pool import STALE_WEBHOOK_STATUSES, WebhookClient
+from retry_queue import parse_retry_after
+from structured_log import logger
+
+# Routing table shape (JSON, from ROUTES_FILE and/or the ROUTES_PARAM_NAME SSM parameter):
+# {
+#   "sinks": {"<name>": {"type": "rocketchat" | "slack" | "sns" | "file", ...options}},
+#   "routes": [{"match": {"<key>": "<glob>" | ["<glob>", ...]}, "sinks": ["<name>"], "stop": false}],
+#   "default": ["<name>"]
+# }
+# Match keys are alarm_name, state, severity, namespace, metric or dimension:<name>
+# (severity comes from alarm_fields in templates.py). Every sink option also
+# accepts "required": false for sinks whose failure should not fail the alarm.
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker.
+
+    Opens after ``failure_threshold`` failures in a row and fails calls fast
+    for ``reset_seconds``; then lets one trial call through (half-open),
+    closing again on success. Lives at module level through the sink, so the
+    state carries across warm invocations.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record(self, success):
+        with self._lock:
+            self._trial = False
+            if success:
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+
+
+class Sink:
+    """A delivery target with its own worker pool, timeout, retry budget and breaker.
+
+    Each sink runs on its own threads, so a slow or failing sink only ever
+    delays its own deliveries. An alarm is only delivered once every
+    ``required`` sink it routes to has accepted it.
+    """
+
+    def __init__(self, name, timeout=5.0, retries=2, workers=4, failure_threshold=5, reset_seconds=30.0,
+                 required=True):
+        self.name = name
+        self.required = bool(required)
+        self.timeout = float(timeout)
+        self.retries = int(retries)
+        self.workers = int(workers)
+        self.breaker = CircuitBreaker(int(failure_threshold), float(reset_seconds))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"sink-{name}")
+
+    @property
+    def deadline(self):
+        """Seconds a delivery may take, retries included, before it is given up on."""
+        return self.timeout * (self.retries + 1) + 1.0
+
+    def send(self, message, fields):
+        raise NotImplementedError
+
+    def submit(self, message, fields):
+        """Queue a delivery; the future yields (status, completed epoch)."""
+        return self._executor.submit(self._call, message, fields)
+
+    def _call(self, message, fields):
+        if not self.breaker.allow():
+            raise CircuitOpen(f"circuit open for sink {self.name}")
+        try:
+            status = self.send(message, fields)
+        except Exception:
+            self.breaker.record(False)
+            raise
+        self.breaker.record(True)
+        return status, time.time()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class WebhookSink(Sink):
+    """Rocket.Chat incoming webhook; the URL is read from SSM through the shared cache."""
+
+    def __init__(self, name, parameters, url_param=None, **options):
+        super().__init__(name, **options)
+        self.parameters = parameters
+        self.url_param = url_param or os.environ.get("WEBHOOK_PARAM_NAME", "/rocketchat/webhook_url")
+        self.client = WebhookClient(
+            pool_size=self.workers,
+            connect_timeout=min(3.0, self.timeout),
+            read_timeout=self.timeout,
+            max_retries=self.retries,
+            # Finish inside the fan-out's deadline for this sink
+            total_timeout=self.timeout * (self.retries + 1),
+        )
+
+    def payload(self, message, fields):
+        return {"text": message}
+
+    def send(self, message, fields):
+        url = self.parameters.get(self.url_param)
+        try:
+            return self.client.post_json(url, self.payload(message, fields))
+        except urllib.error.HTTPError as e:
+            if e.code not in STALE_WEBHOOK_STATUSES:
+                raise
+            # The webhook may have been rotated: re-read it (one SSM call across workers) and retry once
+            fresh_url = self.parameters.refetch(self.url_param, url)
+            if fresh_url == url:
+                raise
+            return self.client.post_json(fresh_url, self.payload(message, fields))
+
+
+class SlackSink(WebhookSink):
+    """Slack-compatible incoming webhook (Slack, Mattermost, Teams workflows)."""
+
+    def payload(self, message, fields):
+        return {"text": message, "mrkdwn": True}
+
+
+class SnsSink(Sink):
+    """Publishes to an SNS topic, e.g. one with e-mail subscriptions."""
+
+    def __init__(self, name, topic_arn, client_factory=None, **options):
+        super().__init__(name, **options)
+        self.topic_arn = topic_arn
+        self._client_factory = client_factory or _default_sns_client
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = self._client_factory(self.timeout, self.retries)
+            return self._client
+
+    def send(self, message, fields):
+        # SNS subjects are limited to 100 printable characters
+        subject = f"{fields.get('alarm_name', 'Alarm')} is {fields.get('new_state', 'UNKNOWN')}"[:100]
+        self.client.publish(TopicArn=self.topic_arn, Subject=subject, Message=message)
+        return 200
+
+
+class FileSink(Sink):
+    """Appends one JSON line per message to a local file (audit trail, local runs)."""
+
+    def __init__(self, name, path, **options):
+        options.setdefault("workers", 1)
+        super().__init__(name, **options)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, message, fields):
+        line = json.dumps({
+            "ts": round(time.time(), 3),
+            "alarm": fields.get("alarm_name"),
+            "state": fields.get("new_state"),
+            "message": message,
+        })
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+        return 200
+
+
+SINK_TYPES = {"rocketchat": WebhookSink, "slack": SlackSink, "sns": SnsSink, "file": FileSink}
+
+
+def _default_sns_client(timeout, retries):
+    import boto3
+    from botocore.config import Config
+    return boto3.client('sns', config=Config(
+        connect_timeout=min(3.0, timeout), read_timeout=timeout, retries={"max_attempts": retries + 1}
+    ))
+
+
+def build_sink(name, spec, parameters):
+    spec = dict(spec)
+    sink_type = spec.pop("type", name)
+    if sink_type not in SINK_TYPES:
+        raise ValueError(f"sink {name!r} has unknown type {sink_type!r} (expected one of {sorted(SINK_TYPES)})")
+    if sink_type in ("rocketchat", "slack"):
+        spec["parameters"] = parameters
+    return SINK_TYPES[sink_type](name, **spec)
+
+
+class Router:
+    """Picks sink names for an alarm from the routing rules.
+
+    Every matching route contributes its sinks (in table order) until a
+    matching route with ``"stop": true``; alarms no route matches go to
+    ``default``.
+    """
+
+    def __init__(self, routes=None, default=None):
+        self.routes = routes or []
+        self.default = default or []
+
+    @staticmethod
+    def value(key, fields):
+        if key.startswith("dimension:"):
+            return fields.get("dimensions", {}).get(key.split(":", 1)[1].lower())
+        if key == "state":
+            return fields.get("new_state")
+        return fields.get(key)
+
+    def matches(self, match, fields):
+        for key, patterns in match.items():
+            value = self.value(key, fields)
+            if value is None:
+                return False
+            patterns = patterns if isinstance(patterns, list) else [patterns]
+            if not any(fnmatch.fnmatchcase(str(value), str(pattern)) for pattern in patterns):
+                return False
+        return True
+
+    def sinks_for(self, fields):
+        names = []
+        for route in self.routes:
+            if not self.matches(route.get("match", {}), fields):
+                continue
+            names.extend(name for name in route.get("sinks", []) if name not in names)
+            if route.get("stop"):
+                break
+        return names or list(self.default)
+
+
+class FanOut:
+    """Delivers each rendered message to every sink its alarm routes to, concurrently.
+
+    The sinks and routes come from a built-in Rocket.Chat default, overlaid
+    by ``ROUTES_FILE`` and then the ``ROUTES_PARAM_NAME`` SSM parameter
+    (re-read through the shared ParameterCache like the templates). Sinks
+    are only rebuilt when their definition changes, so connection pools and
+    breaker state survive refreshes.
+    """
+
+    def __init__(self, parameters, file_path=None, parameter_name=None):
+        self.parameters = parameters
+        self.parameter_name = parameter_name
+        self._base = {"sinks": {"rocketchat": {"type": "rocketchat"}}, "routes": [], "default": ["rocketchat"]}
+        if file_path:
+            with open(file_path) as f:
+                self._base.update(json.load(f))
+        self._raw_parameter = None
+        self.sinks = {}
+        self._specs = {}
+        self._apply(self._base)
+
+    def refresh(self):
+        """Pick up SSM-sourced routing changes; cheap when the cached value is unchanged."""
+        if not self.parameter_name:
+            return
+        try:
+            raw = self.parameters.get(self.parameter_name)
+        except Exception as e:
+            logger.warning("routing parameter fetch failed", parameter=self.parameter_name, error=str(e))
+            return
+        if raw == self._raw_parameter:
+            return
+        try:
+            self._apply(dict(self._base, **json.loads(raw)))
+        except (ValueError, TypeError) as e:
+            logger.warning("routing parameter is invalid", parameter=self.parameter_name, error=str(e))
+            return
+        self._raw_parameter = raw
+
+    def _apply(self, config):
+        specs = config.get("sinks", {})
+        router = Router(config.get("routes"), config.get("default"))
+        unknown = {name for route in router.routes for name in route.get("sinks", [])} | set(router.default)
+        unknown -= set(specs)
+        if unknown:
+            raise ValueError(f"routes name undefined sinks: {sorted(unknown)}")
+
+        sinks = {}
+        for name, spec in specs.items():
+            if self._specs.get(name) == spec:
+                sinks[name] = self.sinks[name]
+            else:
+                sinks[name] = build_sink(name, spec, self.parameters)
+        for name, sink in self.sinks.items():
+            if sinks.get(name) is not sink:
+                sink.close()
+        self.sinks, self._specs, self.router = sinks, dict(specs), router
+
+    def deliver(self, deliveries):
+        """Post ``deliveries`` (dicts with ids/message/fields) and return per-record results.
+
+        A record counts as posted when every required sink it routes to (or,
+        with none required, any sink) accepted it. Otherwise it fails with
+        the sinks still owed under ``retrySinks``; a delivery carrying
+        ``sinks`` (a retry) goes only to those. Per-sink outcomes are kept
+        under ``sinks``.
+        """
+        started_at = time.time()
+        started = time.monotonic()
+        pending = []
+        for delivery in deliveries:
+            names = self.router.sinks_for(delivery["fields"])
+            if delivery.get("sinks") is not None:
+                names = [name for name in delivery["sinks"] if name in self.sinks]
+            futures = {name: self.sinks[name].submit(delivery["message"], delivery["fields"]) for name in names}
+            pending.append((delivery, futures))
+
+        results = []
+        for delivery, futures in pending:
+            outcomes = {}
+            accepted = {}
+            retry_after = {}
+            for name, future in futures.items():
+                sink = self.sinks[name]
+                # Deadlines run from the fan-out start, so waiting on one sink never eats into another's
+                remaining = max(0.0, sink.deadline - (time.monotonic() - started))
+                # wait() rather than result(timeout=): the sink's own socket timeouts are TimeoutErrors too
+                if not wait([future], timeout=remaining).done:
+                    # A call that never started counts here; a running one records its own outcome
+                    if future.cancel():
+                        sink.breaker.record(False)
+                    outcomes[name] = "timeout"
+                    continue
+                try:
+                    accepted[name] = future.result()
+                    outcomes[name] = "ok"
+                except CircuitOpen:
+                    outcomes[name] = "open"
+                except Exception as e:
+                    outcomes[name] = "failed"
+                    logger.warning("sink delivery failed", sink=name, ids=delivery["ids"], error=str(e))
+                    # A throttled sink: the retry queue waits at least this long
+                    if isinstance(e, urllib.error.HTTPError) and e.code == 429:
+                        retry_after[name] = parse_retry_after(e.headers.get("Retry-After") if e.headers else None)
+            results.extend(self._results(delivery, outcomes, accepted, started_at, retry_after))
+        return results
+
+    def _results(self, delivery, outcomes, accepted, started_at, retry_after):
+        required = [name for name in outcomes if self.sinks[name].required]
+        missed = [name for name in required if name not in accepted]
+        if missed or not accepted:
+            owed = missed or list(outcomes)
+            error = ", ".join(f"{name}: {outcomes[name]}" for name in owed) or "no sinks routed"
+            waits = [retry_after[name] for name in owed if retry_after.get(name) is not None]
+            return [{"id": record_id, "status": "failed", "error": error, "sinks": outcomes,
+                     "retrySinks": owed or None, "retryAfter": max(waits, default=None)}
+                    for record_id in delivery["ids"]]
+        # Delivered when the last required sink accepted (the first sink when none is required)
+        if required:
+            status, posted_at = max((accepted[name] for name in required), key=lambda a: a[1])
+        else:
+            status, posted_at = min(accepted.values(), key=lambda a: a[1])
+        return [
+            {"id": record_id, "status": "posted", "statusCode": status,
+             "latencyMs": (posted_at - started_at) * 1000,
+             "postStartedAt": started_at, "postedAt": posted_at, "sinks": outcomes}
+            for record_id in delivery["ids"]
+        ]
+
+
+def load_fanout(parameters):
+    """Build the container's fan-out from ROUTES_FILE / ROUTES_PARAM_NAME, or None if neither is set."""
+    file_path = os.environ.get("ROUTES_FILE")
+    parameter_name = os.environ.get("ROUTES_PARAM_NAME")
+    if not file_path and not parameter_name:
+        return None
+    if file_path and not os.path.isabs(file_path):
+        file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), file_path)
+    return FanOut(parameters, file_path=file_path, parameter_name=parameter_name)
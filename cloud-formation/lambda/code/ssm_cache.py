@@ -0,0 +1,166 @@
+import http.client
+import json
+import os
+import threading
+import time
+from urllib.parse import urlencode
+
+from structured_log import logger
+
+
+class ParameterCache:
+    """Warm-container cache for SSM parameters.
+
+    Values are served from memory until they are ``ttl`` seconds old. Once a
+    value passes ``refresh_after`` of its TTL it is still returned, but a
+    background refresh is started so the next caller sees the new value
+    without paying for the SSM round-trip. ``invalidate`` drops an entry so
+    the next ``get`` goes straight to SSM; when the client is the Parameters
+    extension, that read skips the extension's own cache too.
+
+    ``refetch`` is the single-flight form for a value a caller saw rejected
+    (e.g. a rotated webhook): concurrent callers share one SSM read, and a
+    value someone else already refreshed is never dropped.
+    """
+
+    def __init__(self, ttl=300, refresh_after=0.8, client_factory=None, direct_client_factory=None):
+        self.ttl = ttl
+        self.refresh_after = refresh_after
+        self._client_factory = client_factory or _default_client
+        self._client = None
+        self._direct_client_factory = direct_client_factory or _ssm_client
+        self._direct_client = None
+        self._invalidated = set()
+        self._entries = {}
+        self._refreshing = set()
+        self._refetched = {}
+        self._name_locks = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    def get(self, name, decrypt=True):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                value, fetched_at = entry
+                age = now - fetched_at
+                if age < self.ttl:
+                    self.hits += 1
+                    if age >= self.ttl * self.refresh_after and name not in self._refreshing:
+                        self._refreshing.add(name)
+                        threading.Thread(
+                            target=self._refresh, args=(name, decrypt), daemon=True
+                        ).start()
+                    return value
+            self.misses += 1
+
+        return self._fetch(name, decrypt)
+
+    def invalidate(self, name):
+        with self._lock:
+            self._entries.pop(name, None)
+            self._invalidated.add(name)
+
+    def refetch(self, name, rejected, decrypt=True):
+        """The value of ``name`` after ``rejected`` failed, read from SSM at most once per rejection.
+
+        Callers queue on a per-name lock. The first re-reads SSM; the rest
+        get its result from the cache. A value a refetch already confirmed
+        is not read again until its TTL runs out.
+        """
+        with self._lock:
+            name_lock = self._name_locks.setdefault(name, threading.Lock())
+        with name_lock:
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is not None and (entry[0] != rejected or self._refetched.get(name) == entry[1]):
+                    self.hits += 1
+                    return entry[0]
+                self._entries.pop(name, None)
+                self._invalidated.add(name)
+                self.misses += 1
+            value = self._fetch(name, decrypt)
+            with self._lock:
+                self._refetched[name] = self._entries[name][1]
+            return value
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "refreshes": self.refreshes}
+
+    def _fetch(self, name, decrypt):
+        client = self.client
+        with self._lock:
+            bypass = name in self._invalidated and getattr(client, "caches_values", False)
+        if bypass:
+            # The extension would hand back its cached copy of the value just rejected
+            if self._direct_client is None:
+                self._direct_client = self._direct_client_factory()
+            client = self._direct_client
+        response = client.get_parameter(Name=name, WithDecryption=decrypt)
+        value = response['Parameter']['Value']
+        with self._lock:
+            self._entries[name] = (value, time.monotonic())
+            self._invalidated.discard(name)
+        return value
+
+    def _refresh(self, name, decrypt):
+        try:
+            self._fetch(name, decrypt)
+            with self._lock:
+                self.refreshes += 1
+        except Exception as e:
+            logger.warning("ssm background refresh failed", parameter=name, error=str(e))
+        finally:
+            with self._lock:
+                self._refreshing.discard(name)
+
+
+class ExtensionClient:
+    """``get_parameter`` served by the AWS Parameters and Secrets Lambda Extension.
+
+    The extension keeps its own cache on ``localhost`` and signs the SSM
+    calls itself, so the function never has to import boto3.
+    """
+
+    # Values may be up to the extension's TTL old; ParameterCache reads
+    # invalidated parameters from SSM directly instead
+    caches_values = True
+
+    def __init__(self, port=None, timeout=2.0):
+        self.port = port or os.environ.get("PARAMETERS_SECRETS_EXTENSION_HTTP_PORT", "2773")
+        self.timeout = timeout
+
+    def get_parameter(self, Name, WithDecryption=False):
+        query = urlencode({"name": Name, "withDecryption": str(WithDecryption).lower()})
+        conn = http.client.HTTPConnection("localhost", int(self.port), timeout=self.timeout)
+        try:
+            conn.request("GET", f"/systemsmanager/parameters/get?{query}",
+                         headers={"X-Aws-Parameters-Secrets-Token": os.environ.get("AWS_SESSION_TOKEN", "")})
+            response = conn.getresponse()
+            body = response.read()
+        finally:
+            conn.close()
+        if response.status != 200:
+            raise RuntimeError(f"Parameters extension returned {response.status} for {Name}: {body[:200]!r}")
+        return json.loads(body)
+
+
+def _default_client():
+    if os.environ.get("USE_PARAMETERS_EXTENSION", "false").lower() == "true":
+        return ExtensionClient()
+    return _ssm_client()
+
+
+def _ssm_client():
+    # Deferred so containers served by the Parameters extension never import boto3
+    import boto3
+    return boto3.client('ssm')
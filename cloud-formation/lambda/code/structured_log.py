@@ -0,0 +1,76 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+
+class StructuredLogger:
+    """Single-line JSON logger with per-invocation sampling and stage timings.
+
+    ``LOG_LEVEL`` sets the minimum level. ``LOG_SAMPLE_RATE`` is the fraction
+    of invocations whose DEBUG/INFO lines are written; WARNING and ERROR are
+    always written so failures are never sampled away.
+    """
+
+    def __init__(self, level=None, sample_rate=None, stream=None):
+        self.level = LEVELS.get((level or os.environ.get("LOG_LEVEL", "INFO")).upper(), LEVELS["INFO"])
+        self.sample_rate = float(os.environ.get("LOG_SAMPLE_RATE", "1.0") if sample_rate is None else sample_rate)
+        self.stream = stream
+        self.request_id = None
+        self.sampled = True
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def start_invocation(self, context=None):
+        """Reset per-invocation state: request id, sampling decision and timings."""
+        self.request_id = getattr(context, "aws_request_id", None)
+        self.sampled = self.sample_rate >= 1.0 or random.random() < self.sample_rate
+        self.timings = {}
+
+    def enabled(self, level):
+        value = LEVELS[level]
+        if value < self.level:
+            return False
+        return value >= LEVELS["WARNING"] or self.sampled
+
+    def log(self, level, msg, **fields):
+        if not self.enabled(level):
+            return
+        entry = {"ts": round(time.time(), 3), "level": level, "msg": msg}
+        if self.request_id:
+            entry["requestId"] = self.request_id
+        entry.update(fields)
+        line = json.dumps(entry, separators=(",", ":"), default=str)
+        with self._lock:
+            print(line, file=self.stream or sys.stdout)
+
+    def debug(self, msg, **fields):
+        self.log("DEBUG", msg, **fields)
+
+    def info(self, msg, **fields):
+        self.log("INFO", msg, **fields)
+
+    def warning(self, msg, **fields):
+        self.log("WARNING", msg, **fields)
+
+    def error(self, msg, **fields):
+        self.log("ERROR", msg, **fields)
+
+    @contextmanager
+    def stage(self, name):
+        """Accumulate wall-clock milliseconds spent in ``name`` for this invocation."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.timings[name] = round(self.timings.get(name, 0.0) + elapsed, 3)
+
+
+logger = StructuredLogger()
@@ -0,0 +1,228 @@
+import json
+import os
+import re
+import string
+import threading
+
+from structured_log import logger
+from thresholds import format_headroom, reason_value
+
+# Keys are "Namespace:MetricName:variant", "Namespace:MetricName", "Namespace:*" or "*"
+# (most specific wins). Variants are "rollup" for Metric Insights rollup alarms and
+# "forecast" for fill-rate warnings from forecast.py.
+DEFAULT_TEMPLATES = {
+    "CWAgent:disk_used_percent": (
+        "*Disk Alarm Triggered*\n"
+        "`{alarm_name}` is now in state: *{new_state}*\n"
+        "🔹 Volume: `{path}`\n"
+        "🔹 Instance ID: `{instance_id}`\n"
+        "🔹 Filesystem: `{fstype}`\n"
+        "🔹 Threshold: {effective_threshold} (headroom {headroom})\n"
+        "🔹 Reason: {reason}"
+    ),
+    "CWAgent:disk_used_percent:rollup": (
+        "*Disk Alarm Triggered*\n"
+        "`{alarm_name}` is now in state: *{new_state}*\n"
+        "🔹 Breaching volumes ({breach_count}):\n{breaches}\n"
+        "🔹 Reason: {reason}"
+    ),
+    "CWAgent:disk_used_percent:forecast": (
+        "*Disk Fill Forecast*\n"
+        "🔹 Volume: `{path}` on `{instance_id}` ({fstype})\n"
+        "🔹 Used: {used_percent}% and rising {rate_per_hour}%/h\n"
+        "🔹 Projected full in *{hours_to_full}h* (warning horizon {horizon_hours}h)\n"
+        "🔹 Reason: {reason}"
+    ),
+    "CWAgent:mem_used_percent": (
+        "*Memory Alarm Triggered*\n"
+        "`{alarm_name}` is now in state: *{new_state}*\n"
+        "🔹 Instance ID: `{instance_id}`\n"
+        "🔹 Threshold: {threshold}%\n"
+        "🔹 Reason: {reason}"
+    ),
+    "AWS/EC2:CPUUtilization": (
+        "*CPU Alarm Triggered*\n"
+        "`{alarm_name}` is now in state: *{new_state}*\n"
+        "🔹 Instance ID: `{instance_id}`\n"
+        "🔹 Threshold: {threshold}%\n"
+        "🔹 Reason: {reason}"
+    ),
+    "*": (
+        "*CloudWatch Alarm Triggered*\n"
+        "`{alarm_name}` is now in state: *{new_state}*\n"
+        "🔹 Metric: `{namespace}/{metric}`\n"
+        "🔹 Instance ID: `{instance_id}`\n"
+        "🔹 Reason: {reason}"
+    ),
+}
+
+
+# "severity=critical" / "Severity: critical" anywhere in the alarm description
+SEVERITY_PATTERN = re.compile(r"severity\s*[:=]\s*(\w+)", re.IGNORECASE)
+
+
+def alarm_severity(sns_message):
+    """Severity from the alarm description, else ``warning`` for ALARM and ``info`` otherwise."""
+    match = SEVERITY_PATTERN.search(sns_message.get('AlarmDescription') or '')
+    if match:
+        return match.group(1).lower()
+    return "warning" if sns_message.get('NewStateValue') == "ALARM" else "info"
+
+
+def index_dimensions(dimensions):
+    """Map lower-cased dimension names to values in a single pass."""
+    index = {}
+    for dimension in dimensions:
+        name = dimension.get('name') or dimension.get('Name') or ''
+        index[name.lower()] = dimension.get('value', dimension.get('Value'))
+    return index
+
+
+def trigger_metric(trigger):
+    """The alarmed metric (Namespace/MetricName/Dimensions) of an alarm's Trigger.
+
+    Metric-math alarms such as anomaly bands carry it in ``Trigger.Metrics``
+    as the ``MetricStat`` query rather than at the top level.
+    """
+    if 'MetricName' in trigger or 'Metrics' not in trigger:
+        return trigger
+    for query in trigger['Metrics']:
+        if 'MetricStat' in query:
+            return query['MetricStat'].get('Metric', {})
+    return trigger
+
+
+def alarm_fields(sns_message):
+    """Flatten the parts of a CloudWatch alarm payload the messages use."""
+    trigger = sns_message.get('Trigger', {})
+    metric = trigger_metric(trigger)
+    dims = index_dimensions(metric.get('Dimensions', []))
+    threshold = trigger.get('Threshold')
+    used = reason_value(sns_message.get('NewStateReason'))
+
+    return {
+        "path": dims.get("path", "unknown"),
+        "instance_id": dims.get("instanceid", "unknown"),
+        "fstype": dims.get("fstype", "unknown"),
+        "namespace": metric.get('Namespace', 'unknown'),
+        "metric": metric.get('MetricName', 'unknown'),
+        "threshold": trigger.get('Threshold', 'unknown'),
+        # The alarm's own threshold; a threshold store (thresholds.py) may override these
+        "effective_threshold": f"{threshold:g}%" if isinstance(threshold, (int, float)) else "unknown",
+        "threshold_source": "alarm",
+        "used_percent": used,
+        "headroom": format_headroom(threshold, used),
+        "alarm_name": sns_message.get('AlarmName', 'UnknownAlarm'),
+        "new_state": sns_message.get('NewStateValue', 'UNKNOWN'),
+        "reason": sns_message.get('NewStateReason', 'No reason provided.'),
+        "state_change_time": sns_message.get('StateChangeTime', ''),
+        "severity": alarm_severity(sns_message),
+        "dimensions": dims,
+    }
+
+
+class CompiledTemplate:
+    """A ``str.format``-style template parsed once into literal/field segments.
+
+    Fields name keys of ``alarm_fields``; ``{dim_<name>}`` reads any alarm
+    dimension by its lower-cased name. Missing values render as ``unknown``.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.segments = [
+            (literal, field) for literal, field, _, _ in string.Formatter().parse(source)
+        ]
+
+    def render(self, fields):
+        dims = fields.get("dimensions", {})
+        parts = []
+        for literal, field in self.segments:
+            parts.append(literal)
+            if field is None:
+                continue
+            value = fields.get(field)
+            if value is None and field.startswith("dim_"):
+                value = dims.get(field[4:])
+            parts.append("unknown" if value is None else str(value))
+        return "".join(parts)
+
+
+class TemplateRegistry:
+    """Per-container set of compiled renderers selected by Namespace/MetricName.
+
+    Templates come from the built-in defaults, overlaid by a local JSON file
+    and then by a JSON SSM parameter read through the shared ParameterCache,
+    so SSM-sourced templates follow the same TTL and refresh behaviour as the
+    webhook URL. Templates are only recompiled when their source changes.
+    """
+
+    def __init__(self, defaults=None, file_path=None, parameter_name=None, parameters=None):
+        self.parameter_name = parameter_name
+        self.parameters = parameters
+        self._base = dict(DEFAULT_TEMPLATES if defaults is None else defaults)
+        if file_path:
+            with open(file_path) as f:
+                self._base.update(json.load(f))
+        self._raw_parameter = None
+        self._lock = threading.Lock()
+        self._compile(self._base)
+
+    def refresh(self):
+        """Pick up SSM-sourced overrides; cheap when the cached value is unchanged."""
+        if not self.parameter_name or self.parameters is None:
+            return
+        try:
+            raw = self.parameters.get(self.parameter_name)
+        except Exception as e:
+            logger.warning("template parameter fetch failed", parameter=self.parameter_name, error=str(e))
+            return
+        if raw == self._raw_parameter:
+            return
+        try:
+            overrides = json.loads(raw)
+        except ValueError as e:
+            logger.warning("template parameter is not valid JSON", parameter=self.parameter_name, error=str(e))
+            return
+        self._compile(dict(self._base, **overrides))
+        self._raw_parameter = raw
+
+    def renderer_for(self, namespace, metric, variant=None):
+        key = (namespace, metric, variant)
+        renderer = self._resolved.get(key)
+        if renderer is None:
+            renderer = (
+                (variant and self._compiled.get(f"{namespace}:{metric}:{variant}"))
+                or self._compiled.get(f"{namespace}:{metric}")
+                or self._compiled.get(f"{namespace}:*")
+                or self._compiled["*"]
+            )
+            self._resolved[key] = renderer
+        return renderer
+
+    def render(self, fields):
+        return self.renderer_for(fields["namespace"], fields["metric"], fields.get("variant")).render(fields)
+
+    def _compile(self, sources):
+        if "*" not in sources:
+            sources["*"] = DEFAULT_TEMPLATES["*"]
+        previous = getattr(self, "_compiled", {})
+        compiled = {
+            key: previous[key] if key in previous and previous[key].source == source else CompiledTemplate(source)
+            for key, source in sources.items()
+        }
+        with self._lock:
+            self._compiled = compiled
+            self._resolved = {}
+
+
+def load_registry(parameters):
+    """Build the container's registry from TEMPLATES_FILE / TEMPLATES_PARAM_NAME."""
+    file_path = os.environ.get("TEMPLATES_FILE")
+    if file_path and not os.path.isabs(file_path):
+        file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), file_path)
+    return TemplateRegistry(
+        file_path=file_path,
+        parameter_name=os.environ.get("TEMPLATES_PARAM_NAME"),
+        parameters=parameters,
+    )
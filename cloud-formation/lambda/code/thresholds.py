@@ -0,0 +1,143 @@
+import os
+import re
+import threading
+import time
+
+from structured_log import logger
+
+# "[90.3]" in "Threshold Crossed: 1 datapoint [90.3] was greater than ..."
+REASON_VALUE = re.compile(r"\[(-?\d+(?:\.\d+)?)")
+
+# "instance=<name> volume=<name>" written into alarm descriptions by CloudWatchAlarmStack
+DESCRIPTION_KEY = re.compile(r"\b(instance|volume)=(\S+)")
+
+
+def reason_value(reason):
+    """The first datapoint quoted in an alarm's state reason, or None."""
+    match = REASON_VALUE.search(reason or "")
+    return float(match.group(1)) if match else None
+
+
+def parse_threshold(value):
+    """("percent", 90.0) or ("anomaly", band width); same format as the CDK app's store."""
+    text = str(value).strip().lower()
+    if text.startswith("anomaly"):
+        _, _, width = text.partition(":")
+        return "anomaly", float(width) if width else 2.0
+    return "percent", float(text)
+
+
+class ThresholdIndex:
+    """Cached view of the per-volume threshold hierarchy under an SSM path.
+
+    One paginated ``GetParametersByPath`` fills the index, which is reused
+    until it is ``ttl`` seconds old; a failed refresh keeps the previous
+    index. Resolution follows ``code/stacks/thresholds.py``: instance volume,
+    instance path prefix, instance default, path prefix, then ``default``.
+    """
+
+    def __init__(self, path, ttl=300, client_factory=None, clock=time.monotonic):
+        self.path = path.rstrip("/")
+        self.ttl = ttl
+        self._client_factory = client_factory or _default_client
+        self._client = None
+        self._clock = clock
+        self._entries = {}
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            if self._fetched_at is not None and self._clock() - self._fetched_at < self.ttl:
+                return
+            try:
+                if self._client is None:
+                    self._client = self._client_factory()
+                self._entries = self._fetch()
+            except Exception as e:
+                logger.warning("threshold index refresh failed", path=self.path, error=str(e))
+            # Failures also wait out the TTL rather than hitting SSM on every record
+            self._fetched_at = self._clock()
+
+    def _fetch(self):
+        prefix = self.path + "/"
+        entries = {}
+        for page in self._client.get_paginator("get_parameters_by_path").paginate(Path=self.path, Recursive=True):
+            for parameter in page["Parameters"]:
+                key = parameter["Name"][len(prefix):]
+                try:
+                    entries[key] = parse_threshold(parameter["Value"])
+                except ValueError:
+                    logger.warning("invalid threshold skipped", parameter=parameter["Name"], value=parameter["Value"])
+        return entries
+
+    def resolve(self, instance_keys, volume=None, mount_path=None):
+        """(kind, value, key) of the most specific entry, or None."""
+        entries = self._entries
+        for instance in instance_keys:
+            if not instance or instance == "unknown":
+                continue
+            scope = f"instance/{instance}/"
+            if volume and scope + f"volume/{volume}" in entries:
+                return entries[scope + f"volume/{volume}"] + (scope + f"volume/{volume}",)
+            match = _longest_path(entries, scope, mount_path)
+            if match:
+                return match
+            if scope + "default" in entries:
+                return entries[scope + "default"] + (scope + "default",)
+        match = _longest_path(entries, "", mount_path)
+        if match:
+            return match
+        if "default" in entries:
+            return entries["default"] + ("default",)
+        return None
+
+    def annotate(self, sns_message, fields):
+        """Overwrite the alarm's threshold fields with the store's effective threshold."""
+        described = dict(DESCRIPTION_KEY.findall(sns_message.get("AlarmDescription") or ""))
+        resolved = self.resolve([described.get("instance"), fields["instance_id"]],
+                                described.get("volume"), fields["path"])
+        if resolved is None:
+            return fields
+        kind, value, key = resolved
+        fields["threshold_source"] = f"{self.path}/{key}"
+        if kind == "anomaly":
+            fields["effective_threshold"] = f"anomaly band ±{value:g}σ"
+            fields["headroom"] = "n/a"
+        else:
+            fields["effective_threshold"] = f"{value:g}%"
+            fields["headroom"] = format_headroom(value, fields.get("used_percent"))
+        return fields
+
+
+def format_headroom(threshold, used):
+    if not isinstance(threshold, (int, float)) or used is None:
+        return "unknown"
+    return f"{threshold - used:+.1f} pts"
+
+
+def _longest_path(entries, scope, mount_path):
+    if not mount_path:
+        return None
+    best = None
+    for key in entries:
+        if not key.startswith(scope + "path/"):
+            continue
+        prefix = "/" + key[len(scope) + len("path/"):].rstrip("/")
+        if (mount_path == prefix or mount_path.startswith(prefix + "/")) and (best is None or len(key) > len(best)):
+            best = key
+    return entries[best] + (best,) if best else None
+
+
+def _default_client():
+    # The Parameters and Secrets extension only serves single parameters
+    import boto3
+    return boto3.client('ssm')
+
+
+def load_thresholds():
+    """The container's threshold index from THRESHOLDS_PATH, or None when not configured."""
+    path = os.environ.get("THRESHOLDS_PATH")
+    if not path:
+        return None
+    return ThresholdIndex(path, ttl=int(os.environ.get("SSM_CACHE_TTL_SECONDS", "300")))
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""Disk-fill load generator for the disk monitor alarms.
+
+Fills one or more mount paths to a target usage by preallocating blocks
+with ``posix_fallocate`` (no zeros are written), sizing the fill from a
+single ``statvfs`` per mount. Mounts are filled concurrently, optionally at
+a fixed ramp rate and with a staggered start, to reproduce fill-rate
+forecasts and multi-volume alarm storms. Fill files are named
+``fillfile_*`` so ``disk_fill_tool.sh --clear`` removes them too.
+
+    disk_fill_tool.py 90 /mnt/vol1
+    disk_fill_tool.py --target 85 /mnt/vol1 /mnt/vol2:95 /mnt/vol3 --rate-mb 20 --stagger 30
+    disk_fill_tool.py --target 90 /mnt/vol1 /mnt/vol2 --hold 600 --clear-after
+    disk_fill_tool.py --clear /mnt/vol1 /mnt/vol2
+"""
+import argparse
+import errno
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+FILL_PREFIX = "fillfile_"
+MB = 1024 * 1024
+
+# Zero-write fallback for filesystems without fallocate support
+WRITE_BLOCK = 4 * MB
+
+
+def usage(path, statvfs=os.statvfs):
+    """(used bytes, usable bytes, used percent) the way df and the CloudWatch agent count them.
+
+    Usable excludes root-reserved blocks, so the percent matches ``used_percent``.
+    """
+    st = statvfs(path)
+    used = (st.f_blocks - st.f_bfree) * st.f_frsize
+    usable = used + st.f_bavail * st.f_frsize
+    return used, usable, (100.0 * used / usable if usable else 0.0)
+
+
+def bytes_to_target(path, target_percent, statvfs=os.statvfs):
+    """Bytes to allocate on ``path`` to reach ``target_percent`` (0 if already there)."""
+    used, usable, _ = usage(path, statvfs)
+    # Allocating moves bytes from available to used, so usable stays constant
+    return max(0, int(usable * target_percent / 100.0) - used)
+
+
+def _allocate(fd, offset, length):
+    try:
+        os.posix_fallocate(fd, offset, length)
+    except OSError as e:
+        if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL):
+            raise
+        os.lseek(fd, offset, os.SEEK_SET)
+        block = b"\0" * WRITE_BLOCK
+        remaining = length
+        while remaining:
+            remaining -= os.write(fd, block[:min(remaining, WRITE_BLOCK)])
+        os.fsync(fd)
+
+
+def fill(path, target_percent, rate_mb=0.0, chunk_mb=64, delay=0.0,
+         statvfs=os.statvfs, sleep=time.sleep, clock=time.monotonic, stop=None):
+    """Grow one fill file on ``path`` until it reaches ``target_percent``.
+
+    ``rate_mb`` caps the fill rate in MB/s (0 fills as fast as the disk allows);
+    the fill proceeds in ``chunk_mb`` steps so the rate is smooth at the
+    agent's collection interval. Returns a result dict for the report.
+    """
+    if delay:
+        sleep(delay)
+    _, _, start_percent = usage(path, statvfs)
+    needed = bytes_to_target(path, target_percent, statvfs)
+    fill_file = os.path.join(path, f"{FILL_PREFIX}{os.getpid()}_{int(time.time() * 1000)}")
+    chunk = max(1, int(chunk_mb * MB))
+    written = 0
+    started = clock()
+
+    if needed:
+        fd = os.open(fill_file, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            while written < needed and not (stop and stop.is_set()):
+                step = min(chunk, needed - written)
+                _allocate(fd, written, step)
+                written += step
+                if rate_mb:
+                    # Sleep off whatever the allocation finished ahead of schedule
+                    ahead = written / (rate_mb * MB) - (clock() - started)
+                    if ahead > 0:
+                        sleep(ahead)
+        finally:
+            os.close(fd)
+
+    _, _, end_percent = usage(path, statvfs)
+    return {
+        "path": path,
+        "file": fill_file if written else None,
+        "target_percent": target_percent,
+        "start_percent": round(start_percent, 2),
+        "end_percent": round(end_percent, 2),
+        "bytes": written,
+        "seconds": round(clock() - started, 3),
+    }
+
+
+def fill_many(targets, rate_mb=0.0, chunk_mb=64, stagger=0.0, **kwargs):
+    """Fill ``[(path, target_percent), ...]`` concurrently, the nth mount starting ``n * stagger`` seconds in."""
+    if not targets:
+        return []
+    stop = kwargs.pop("stop", None) or threading.Event()
+    with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+        futures = [
+            pool.submit(fill, path, percent, rate_mb=rate_mb, chunk_mb=chunk_mb,
+                        delay=index * stagger, stop=stop, **kwargs)
+            for index, (path, percent) in enumerate(targets)
+        ]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            # One mount failing (or Ctrl-C) stops the others at their next chunk
+            stop.set()
+            raise
+
+
+def clear(paths):
+    """Remove every fill file from ``paths``; returns the number of bytes freed."""
+    freed = 0
+    for path in paths:
+        for fill_file in glob.glob(os.path.join(path, f"{FILL_PREFIX}*")):
+            try:
+                freed += os.stat(fill_file).st_blocks * 512
+                os.remove(fill_file)
+            except FileNotFoundError:
+                pass
+    return freed
+
+
+def parse_target(spec, default_percent):
+    """``/mnt/vol1`` or ``/mnt/vol1:95`` -> (path, percent)."""
+    path, sep, percent = spec.rpartition(":")
+    if not sep or not percent.replace(".", "", 1).isdigit():
+        return spec, default_percent
+    return path, float(percent)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("mounts", nargs="*", help="Mount paths, optionally PATH:PERCENT; a leading number is the target")
+    parser.add_argument("--target", type=float, default=85.0, help="Target used percent (default: 85)")
+    parser.add_argument("--rate-mb", type=float, default=0.0, help="Fill rate per mount in MB/s (default: unlimited)")
+    parser.add_argument("--chunk-mb", type=float, default=64.0, help="Allocation step in MB (default: 64)")
+    parser.add_argument("--stagger", type=float, default=0.0, help="Seconds between each mount's start")
+    parser.add_argument("--hold", type=float, default=0.0, help="Seconds to hold the fill before exiting")
+    parser.add_argument("--clear-after", action="store_true", help="Remove the fill files after --hold")
+    parser.add_argument("--clear", action="store_true", help="Only remove fill files from the mounts")
+    args = parser.parse_args(argv)
+
+    mounts = list(args.mounts)
+    # Positional form of disk_fill_tool.sh: TARGET_USAGE MOUNT_PATH
+    if mounts and mounts[0].replace(".", "", 1).isdigit():
+        args.target = float(mounts.pop(0))
+    mounts = mounts or ["/mnt/vol1"]
+
+    if args.clear:
+        freed = clear(mounts)
+        print(json.dumps({"cleared": mounts, "bytes": freed}))
+        return 0
+
+    targets = [parse_target(spec, args.target) for spec in mounts]
+    try:
+        results = fill_many(targets, rate_mb=args.rate_mb, chunk_mb=args.chunk_mb, stagger=args.stagger)
+    except KeyboardInterrupt:
+        return 130
+    for result in results:
+        print(json.dumps(result))
+
+    if args.hold:
+        time.sleep(args.hold)
+    if args.clear_after:
+        print(json.dumps({"cleared": [path for path, _ in targets], "bytes": clear(path for path, _ in targets)}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Lightweight disk metrics publisher, a drop-in for the CloudWatch agent's disk plugin.
+
+Every interval it reads ``statvfs`` for each configured mount in one pass
+and sends all datapoints in a single ``PutMetricData`` call (split only past
+the API's per-call limit). Metric names and the ``path``/``InstanceId``/
+``fstype`` dimensions match what the agent publishes under ``CWAgent``, so
+the existing alarms keep working. Its own CPU and RSS go out in the same
+call as ``procstat_cpu_usage``/``procstat_memory_rss``, the names the
+agent's procstat plugin uses, so both footprints can share one graph.
+
+    disk_metrics_collector.py --config /etc/disk-metrics-collector.json
+    disk_metrics_collector.py --mount /mnt/vol1:ext4 --mount /mnt/vol2:ext4 --interval 10
+    disk_metrics_collector.py --mount /mnt/vol1 --sink local --local-path metrics.jsonl --once
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+import urllib.request
+
+NAMESPACE = "CWAgent"
+PROCESS_NAME = "disk_metrics_collector"
+
+# PutMetricData accepts up to 1000 datums per call
+MAX_DATUMS_PER_CALL = 1000
+
+MEASUREMENTS = ("used_percent", "used", "free", "total", "inodes_used", "inodes_free", "inodes_total")
+UNITS = {"used_percent": "Percent", "used": "Bytes", "free": "Bytes", "total": "Bytes"}
+
+IMDS = "http://169.254.169.254/latest"
+
+
+def disk_values(st):
+    """Agent-equivalent disk measurements from one ``statvfs`` result.
+
+    ``used_percent`` is used / (used + available), so root-reserved blocks
+    do not count as free space, the same way df and the agent report it.
+    """
+    used = (st.f_blocks - st.f_bfree) * st.f_frsize
+    free = st.f_bavail * st.f_frsize
+    return {
+        "used_percent": 100.0 * used / (used + free) if used + free else 0.0,
+        "used": used,
+        "free": free,
+        "total": st.f_blocks * st.f_frsize,
+        "inodes_used": st.f_files - st.f_ffree,
+        "inodes_free": st.f_ffree,
+        "inodes_total": st.f_files,
+    }
+
+
+def instance_id(timeout=2.0):
+    """The EC2 instance id from IMDSv2."""
+    token_request = urllib.request.Request(f"{IMDS}/api/token", method="PUT",
+                                           headers={"X-aws-ec2-metadata-token-ttl-seconds": "21600"})
+    with urllib.request.urlopen(token_request, timeout=timeout) as response:
+        token = response.read().decode()
+    request = urllib.request.Request(f"{IMDS}/meta-data/instance-id", headers={"X-aws-ec2-metadata-token": token})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read().decode()
+
+
+def mount_fstypes(mounts_file="/proc/mounts"):
+    """Mount path -> filesystem type, for mounts given without one."""
+    types = {}
+    try:
+        with open(mounts_file) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3:
+                    types[parts[1]] = parts[2]
+    except OSError:
+        pass
+    return types
+
+
+class Collector:
+    """Builds one interval's datums for all mounts plus the collector's own footprint."""
+
+    def __init__(self, mounts, instance, measurements=("used_percent",), aggregation_dimensions=(),
+                 interval=60, statvfs=os.statvfs, clock=time.monotonic, rusage=None, rss=None):
+        self.mounts = mounts
+        self.instance = instance
+        self.measurements = [m for m in measurements if m in MEASUREMENTS]
+        self.aggregation_dimensions = [list(dims) for dims in aggregation_dimensions]
+        # Intervals under a minute publish high-resolution metrics, like the agent
+        self.storage_resolution = 1 if interval < 60 else 60
+        self.statvfs = statvfs
+        self.clock = clock
+        self.rusage = rusage or (lambda: resource.getrusage(resource.RUSAGE_SELF))
+        self.rss = rss or _rss_bytes
+        self._last = None
+
+    def collect(self, timestamp=None):
+        timestamp = timestamp or time.time()
+        datums = []
+        for path, fstype in self.mounts:
+            try:
+                values = disk_values(self.statvfs(path))
+            except OSError as e:
+                print(f"statvfs {path} failed: {e}", file=sys.stderr)
+                continue
+            dims = {"path": path, "InstanceId": self.instance, "fstype": fstype}
+            for measurement in self.measurements:
+                datums.append(self._datum(f"disk_{measurement}", values[measurement], dims, timestamp,
+                                          UNITS.get(measurement, "None")))
+                # Aggregates are the same datapoint under fewer dimensions; CloudWatch does the MAX
+                for names in self.aggregation_dimensions:
+                    datums.append(self._datum(f"disk_{measurement}", values[measurement],
+                                              {name: dims[name] for name in names}, timestamp,
+                                              UNITS.get(measurement, "None")))
+        datums.extend(self.self_datums(timestamp))
+        return datums
+
+    def self_datums(self, timestamp):
+        """CPU percent since the previous call and current RSS of this process."""
+        usage = self.rusage()
+        now = self.clock()
+        cpu_seconds = usage.ru_utime + usage.ru_stime
+        datums = []
+        dims = {"InstanceId": self.instance, "exe": PROCESS_NAME}
+        if self._last is not None:
+            elapsed = now - self._last[0]
+            if elapsed > 0:
+                cpu = 100.0 * (cpu_seconds - self._last[1]) / elapsed
+                datums.append(self._datum("procstat_cpu_usage", round(cpu, 3), dims, timestamp, "Percent"))
+        self._last = (now, cpu_seconds)
+        datums.append(self._datum("procstat_memory_rss", self.rss(), dims, timestamp, "Bytes"))
+        return datums
+
+    def _datum(self, name, value, dims, timestamp, unit):
+        return {
+            "MetricName": name,
+            "Dimensions": [{"Name": k, "Value": v} for k, v in dims.items()],
+            "Timestamp": timestamp,
+            "Value": value,
+            "Unit": unit,
+            "StorageResolution": self.storage_resolution,
+        }
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is the peak, in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def batches(datums, size=MAX_DATUMS_PER_CALL):
+    for start in range(0, len(datums), size):
+        yield datums[start:start + size]
+
+
+class CloudWatchSink:
+    def __init__(self, namespace=NAMESPACE, client=None):
+        self.namespace = namespace
+        if client is None:
+            import boto3
+            client = boto3.client("cloudwatch")
+        self.client = client
+        self.calls = 0
+
+    def publish(self, datums):
+        for batch in batches(datums):
+            self.client.put_metric_data(Namespace=self.namespace, MetricData=batch)
+            self.calls += 1
+
+
+class LocalSink:
+    """Writes each would-be PutMetricData request as a JSON line (file or stdout)."""
+
+    def __init__(self, namespace=NAMESPACE, path=None):
+        self.namespace = namespace
+        self.path = path
+        self.calls = 0
+        self.requests = []
+
+    def publish(self, datums):
+        for batch in batches(datums):
+            request = {"Namespace": self.namespace, "MetricData": batch}
+            self.requests.append(request)
+            self.calls += 1
+            line = json.dumps(request, default=str)
+            if self.path:
+                with open(self.path, "a") as f:
+                    f.write(line + "\n")
+            else:
+                print(line, flush=True)
+
+
+def run(collector, sink, interval, iterations=None, sleep=time.sleep, clock=time.time):
+    """Collect and publish on interval boundaries until ``iterations`` runs (forever if None)."""
+    count = 0
+    while iterations is None or count < iterations:
+        started = clock()
+        try:
+            sink.publish(collector.collect(started))
+        except Exception as e:
+            # Keep collecting through transient API errors; the next interval retries
+            print(f"publish failed: {e}", file=sys.stderr)
+        count += 1
+        if iterations is not None and count >= iterations:
+            break
+        sleep(max(0.0, interval - (clock() % interval)))
+    return count
+
+
+def load_config(path):
+    """Collector settings file (written by DiskMonitorStack from the collection profile)."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def parse_mount(spec, fstypes):
+    path, _, fstype = spec.partition(":")
+    return path, fstype or fstypes.get(path, "unknown")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", help="JSON settings (mounts, interval, measurements, aggregation_dimensions)")
+    parser.add_argument("--mount", action="append", default=[], metavar="PATH[:FSTYPE]")
+    parser.add_argument("--interval", type=int)
+    parser.add_argument("--namespace", default=NAMESPACE)
+    parser.add_argument("--instance-id", help="skip the IMDS lookup")
+    parser.add_argument("--sink", choices=("cloudwatch", "local"), default="cloudwatch")
+    parser.add_argument("--local-path", help="JSON lines file for --sink local (default: stdout)")
+    parser.add_argument("--once", action="store_true", help="publish one interval and exit")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config) if args.config else {}
+    fstypes = mount_fstypes()
+    mounts = [(m["path"], m.get("fstype") or fstypes.get(m["path"], "unknown")) for m in config.get("mounts", [])]
+    mounts += [parse_mount(spec, fstypes) for spec in args.mount]
+    if not mounts:
+        parser.error("no mounts configured (use --config or --mount)")
+    interval = args.interval or config.get("interval", 60)
+
+    collector = Collector(
+        mounts,
+        args.instance_id or instance_id(),
+        measurements=config.get("measurements", ["used_percent"]),
+        aggregation_dimensions=config.get("aggregation_dimensions", []),
+        interval=interval,
+    )
+    namespace = config.get("namespace", args.namespace)
+    sink = LocalSink(namespace, args.local_path) if args.sink == "local" else CloudWatchSink(namespace)
+    run(collector, sink, interval, iterations=1 if args.once else None)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
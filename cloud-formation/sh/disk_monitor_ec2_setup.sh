@@ -3,39 +3,79 @@
 # (c) 2025 Amazon Web Services, Inc. All Rights Reserved.
 # This AWS content is subject to the terms of C2E Task Order 5502/HM047623F0080
 
-# Update system and install dependencies
+# Update system and install dependencies. With METRICS_COLLECTOR_CONFIG set
+# (python collector profile), disk_metrics_collector.py replaces the agent.
 yum update -y
-yum install -y amazon-cloudwatch-agent nvme-cli
+if [ -n "$METRICS_COLLECTOR_CONFIG" ]; then
+  yum install -y nvme-cli python3 python3-boto3
+else
+  yum install -y amazon-cloudwatch-agent nvme-cli
+fi
 
-# Wait for attached volumes to appear
-for device in /dev/nvme1n1 /dev/nvme2n1 /dev/nvme3n1; do
+# Volumes to prepare, one "<volume-id>:<mount path>:<fstype>" argument each
+# (generated from fleet.json by DiskMonitorStack). Without arguments fall back
+# to the original three-volume layout.
+if [ "$#" -eq 0 ]; then
+  set -- "/dev/nvme1n1:/mnt/vol1:ext4" "/dev/nvme2n1:/mnt/vol2:ext4" "/dev/nvme3n1:/mnt/vol3:ext4"
+fi
+
+RESOURCES=""
+for spec in "$@"; do
+  IFS=: read -r source mount_path fstype <<< "$spec"
+
+  # EBS volumes show up as NVMe devices whose serial is the volume id without the dash
+  if [[ "$source" == vol-* ]]; then
+    device="/dev/disk/by-id/nvme-Amazon_Elastic_Block_Store_${source/-/}"
+  else
+    device="$source"
+  fi
+
+  # Wait for the attached volume to appear
   while [ ! -e "$device" ]; do
     echo "Waiting for $device to be attached..."
     sleep 3
   done
-done
-
-# Format the attached volumes with ext4 filesystem
-mkfs.ext4 /dev/nvme1n1
-mkfs.ext4 /dev/nvme2n1
-mkfs.ext4 /dev/nvme3n1
 
-# Create mount points
-mkdir -p /mnt/vol1 /mnt/vol2 /mnt/vol3
+  # Format, create the mount point and persist to /etc/fstab by UUID
+  mkfs -t "$fstype" "$device"
+  mkdir -p "$mount_path"
+  uuid=$(blkid -s UUID -o value "$device")
+  echo "UUID=$uuid $mount_path $fstype defaults,nofail 0 2" >> /etc/fstab
 
-# Get UUIDs and persist to /etc/fstab
-UUID1=$(blkid -s UUID -o value /dev/nvme1n1)
-UUID2=$(blkid -s UUID -o value /dev/nvme2n1)
-UUID3=$(blkid -s UUID -o value /dev/nvme3n1)
-
-echo "UUID=$UUID1 /mnt/vol1 ext4 defaults,nofail 0 2" >> /etc/fstab
-echo "UUID=$UUID2 /mnt/vol2 ext4 defaults,nofail 0 2" >> /etc/fstab
-echo "UUID=$UUID3 /mnt/vol3 ext4 defaults,nofail 0 2" >> /etc/fstab
+  RESOURCES="$RESOURCES${RESOURCES:+, }\"$mount_path\""
+done
 
 # Mount all volumes
 mount -a
 
-# Create CloudWatch Agent config
+# Python collector: run it as a service instead of configuring the agent
+if [ -n "$METRICS_COLLECTOR_CONFIG" ] && [ -f "$METRICS_COLLECTOR_CONFIG" ]; then
+  cp "$METRICS_COLLECTOR_CONFIG" /etc/disk-metrics-collector.json
+  tee /etc/systemd/system/disk-metrics-collector.service > /dev/null <<UNIT
+[Unit]
+Description=Disk metrics publisher (CWAgent disk_* metrics)
+After=network-online.target local-fs.target
+
+[Service]
+ExecStart=/usr/bin/python3 /usr/local/bin/disk_metrics_collector.py --config /etc/disk-metrics-collector.json
+Restart=always
+RestartSec=10
+Nice=10
+
+[Install]
+WantedBy=multi-user.target
+UNIT
+  systemctl daemon-reload
+  systemctl enable --now disk-metrics-collector
+  systemctl status disk-metrics-collector --no-pager > /tmp/agent_status.txt
+  exit 0
+fi
+
+# CloudWatch Agent config: use the one generated by DiskMonitorStack from the
+# instance's collection profile, or fall back to used_percent every 60 seconds
+if [ -n "$CWAGENT_CONFIG" ] && [ -f "$CWAGENT_CONFIG" ]; then
+  cp "$CWAGENT_CONFIG" /opt/aws/amazon-cloudwatch-agent/bin/config.json
+else
 tee /opt/aws/amazon-cloudwatch-agent/bin/config.json > /dev/null <<EOF
 {
   "metrics": {
@@ -43,10 +83,10 @@ tee /opt/aws/amazon-cloudwatch-agent/bin/config.json > /dev/null <<EOF
       "disk": {
         "measurement": ["used_percent"],
         "metrics_collection_interval": 60,
-        "resources": ["/mnt/vol1", "/mnt/vol2", "/mnt/vol3"],
+        "resources": [$RESOURCES],
         "drop_device": true,
         "drop_mount": false,
-        "drop_fstype": true
+        "drop_fstype": false
       }
     },
     "append_dimensions": {
@@ -55,6 +95,7 @@ tee /opt/aws/amazon-cloudwatch-agent/bin/config.json > /dev/null <<EOF
   }
 }
 EOF
+fi
 
 # Start the CloudWatch Agent
 /opt/aws/amazon-cloudwatch-agent/bin/amazon-cloudwatch-agent-ctl \
@@ -34,6 +34,18 @@ EC2_PUBLIC_IP=$(curl -s -H "X-aws-ec2-metadata-token: $TOKEN" \
 
 echo "Private IP detected: $EC2_PRIVATE_IP"
 
+# Capacity profile: number of Rocket.Chat app containers (RocketChatStack capacity_profile)
+ROCKETCHAT_APP_INSTANCES=${ROCKETCHAT_APP_INSTANCES:-1}
+
+# Size Mongo from the instance's memory (same formula as code/stacks/capacity.py):
+# WiredTiger cache = half of what is left after 1 GiB for the host and 768 MiB per app,
+# oplog = one MB per MiB of memory, both clamped to MongoDB's minimums
+MEM_MIB=$(awk '/MemTotal/ { print int($2 / 1024) }' /proc/meminfo)
+MONGO_CACHE_GB=$(awk -v mem="$MEM_MIB" -v apps="$ROCKETCHAT_APP_INSTANCES" \
+  'BEGIN { gb = (mem - 1024 - apps * 768) / 2 / 1024; if (gb < 0.25) gb = 0.25; printf "%.2f", gb }')
+MONGO_OPLOG_MB=$(( MEM_MIB > 990 ? MEM_MIB : 990 ))
+echo "Memory ${MEM_MIB} MiB, ${ROCKETCHAT_APP_INSTANCES} app instance(s): WiredTiger cache ${MONGO_CACHE_GB} GB, oplog ${MONGO_OPLOG_MB} MB"
+
 # Start MongoDB container with replica set enabled
 echo "Starting MongoDB container..."
 docker run -d \
@@ -42,7 +54,9 @@ docker run -d \
   -v /home/ec2-user/rocketchat/data/db:/data/db \
   -v /home/ec2-user/rocketchat/data/dump:/dump \
   mongo:5.0 \
-  mongod --replSet rs0 --bind_ip_all
+  mongod --replSet rs0 --bind_ip_all \
+    --wiredTigerCacheSizeGB "${MONGO_CACHE_GB}" \
+    --oplogSize "${MONGO_OPLOG_MB}"
 
 # Wait for MongoDB container to be ready
 echo "Waiting for MongoDB to initialize..."
@@ -76,19 +90,84 @@ echo "Password generated and stored in .env file (value masked): ***************
 # Save to .env
 echo "ROCKETCHAT_PASSWORD=${ROCKETCHAT_PASSWORD}" >> /tmp/.rocketchat_env_var
 
-# Start Rocket.Chat container
-echo "Starting Rocket.Chat container..."
-docker run -d \
-  --name rocketchat \
-  --network host \
-  -e MONGO_URL="mongodb://${EC2_PRIVATE_IP}:27017/rocketchat?replicaSet=rs0" \
-  -e MONGO_OPLOG_URL="mongodb://${EC2_PRIVATE_IP}:27017/local?replicaSet=rs0" \
-  -e ROOT_URL="http://${EC2_PRIVATE_IP}:3000" \
-  -e ADMIN_USERNAME=ec2-user \
-  -e ADMIN_PASS="${ROCKETCHAT_PASSWORD}" \
-  -e ADMIN_EMAIL=admin@example.com \
-  -e OVERWRITE_SETTING_Show_Setup_Wizard=completed \
-  rocketchat/rocket.chat:latest
+# Start Rocket.Chat container(s). A single instance listens on :3000 directly;
+# several listen on :3001.. behind an nginx proxy on :3000 with keep-alive upstreams
+if [ "$ROCKETCHAT_APP_INSTANCES" -gt 1 ]; then
+  FIRST_APP_PORT=3001
+else
+  FIRST_APP_PORT=3000
+fi
+
+UPSTREAMS=""
+for i in $(seq 1 "$ROCKETCHAT_APP_INSTANCES"); do
+  APP_PORT=$((FIRST_APP_PORT + i - 1))
+  if [ "$i" -eq 1 ]; then
+    APP_NAME=rocketchat
+  else
+    APP_NAME=rocketchat$i
+  fi
+  echo "Starting Rocket.Chat container ${APP_NAME} on port ${APP_PORT}..."
+  docker run -d \
+    --name "${APP_NAME}" \
+    --network host \
+    --restart unless-stopped \
+    -e PORT="${APP_PORT}" \
+    -e INSTANCE_IP="${EC2_PRIVATE_IP}" \
+    -e MONGO_URL="mongodb://${EC2_PRIVATE_IP}:27017/rocketchat?replicaSet=rs0" \
+    -e MONGO_OPLOG_URL="mongodb://${EC2_PRIVATE_IP}:27017/local?replicaSet=rs0" \
+    -e ROOT_URL="http://${EC2_PRIVATE_IP}:3000" \
+    -e ADMIN_USERNAME=ec2-user \
+    -e ADMIN_PASS="${ROCKETCHAT_PASSWORD}" \
+    -e ADMIN_EMAIL=admin@example.com \
+    -e OVERWRITE_SETTING_Show_Setup_Wizard=completed \
+    rocketchat/rocket.chat:latest
+  UPSTREAMS="${UPSTREAMS}    server 127.0.0.1:${APP_PORT} max_fails=3 fail_timeout=10s;
+"
+  # Let the first instance run the database migrations before the others start
+  if [ "$i" -eq 1 ] && [ "$ROCKETCHAT_APP_INSTANCES" -gt 1 ]; then
+    for j in {1..30}; do
+      sleep 5
+      curl -s "http://127.0.0.1:${APP_PORT}/api/info" | grep -q '"version"' && break
+    done
+  fi
+done
+
+if [ "$ROCKETCHAT_APP_INSTANCES" -gt 1 ]; then
+  echo "Starting nginx reverse proxy on port 3000..."
+  mkdir -p /home/ec2-user/rocketchat/nginx
+  cat > /home/ec2-user/rocketchat/nginx/nginx.conf <<NGINX
+worker_processes auto;
+events { worker_connections 4096; }
+http {
+  upstream rocketchat {
+    least_conn;
+${UPSTREAMS}    keepalive 64;
+  }
+  map \$http_upgrade \$connection_upgrade {
+    default upgrade;
+    ''      '';
+  }
+  server {
+    listen 3000;
+    client_max_body_size 100m;
+    location / {
+      proxy_pass http://rocketchat;
+      proxy_http_version 1.1;
+      proxy_set_header Upgrade \$http_upgrade;
+      proxy_set_header Connection \$connection_upgrade;
+      proxy_set_header Host \$host;
+      proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
+    }
+  }
+}
+NGINX
+  docker run -d \
+    --name rocketchat-proxy \
+    --network host \
+    --restart unless-stopped \
+    -v /home/ec2-user/rocketchat/nginx/nginx.conf:/etc/nginx/nginx.conf:ro \
+    nginx:stable
+fi
 
 # Wait for Rocket.Chat to become available
 echo "Waiting for Rocket.Chat to be ready..."
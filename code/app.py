@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import json
 import os
 
 from aws_cdk import App
@@ -7,13 +8,64 @@ from stacks.disk_monitor_stack import DiskMonitorStack
 from stacks.rocketchat_stack import RocketChatStack
 from stacks.lambda_stack import LambdaStack
 from stacks.cloudwatch_alarm_stack import CloudWatchAlarmStack
+from stacks.fleet import load_fleet
+from stacks.thresholds import load_thresholds
 
 app = App()
 
-EnvSetupStack(app, "EnvSetupStack")
-DiskMonitorStack(app, "DiskMonitorStack")
-RocketChatStack(app, "RocketChatStack")
-LambdaStack(app, "LambdaStack")
-CloudWatchAlarmStack(app, "CloudWatchAlarmStack")
+
+def load_routes(path):
+    """Routing table for the notifier's sinks, from a JSON file (None when unset)."""
+    if not path:
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+# Instances, volumes and thresholds shared by DiskMonitorStack and CloudWatchAlarmStack
+fleet = load_fleet(app.node.try_get_context("fleet_file"))
+
+env_stack = EnvSetupStack(app, "EnvSetupStack")
+disk_stack = DiskMonitorStack(app, "DiskMonitorStack", fleet=fleet)
+rocketchat_stack = RocketChatStack(app, "RocketChatStack",
+    capacity_profile=app.node.try_get_context("capacity_profile"),
+)
+lambda_stack = LambdaStack(app, "LambdaStack",
+    digest_mode=app.node.try_get_context("digest_mode") or "off",
+    digest_window_seconds=int(app.node.try_get_context("digest_window_seconds") or 30),
+    dedup_table=str(app.node.try_get_context("dedup_table")).lower() == "true",
+    dedup_suppression_seconds=int(app.node.try_get_context("dedup_suppression_seconds") or 120),
+    cold_start_ms=int(app.node.try_get_context("cold_start_ms")) if app.node.try_get_context("cold_start_ms") else None,
+    parameters_extension=str(app.node.try_get_context("parameters_extension")).lower() == "true",
+    templates_parameter=app.node.try_get_context("templates_parameter"),
+    forecast_horizon_hours=float(app.node.try_get_context("forecast_horizon_hours")) if app.node.try_get_context("forecast_horizon_hours") else None,
+    forecast_interval_minutes=int(app.node.try_get_context("forecast_interval_minutes") or 15),
+    forecast_model=app.node.try_get_context("forecast_model") or "linear",
+    routing_table=load_routes(app.node.try_get_context("routing_table_file")),
+    retry_queue=str(app.node.try_get_context("retry_queue")).lower() == "true",
+    retry_drain_concurrency=int(app.node.try_get_context("retry_drain_concurrency") or 2),
+    retry_max_attempts=int(app.node.try_get_context("retry_max_attempts") or 8),
+    threshold_path=app.node.try_get_context("threshold_path"),
+    history_table=str(app.node.try_get_context("history_table")).lower() == "true",
+    history_retention_days=int(app.node.try_get_context("history_retention_days") or 30),
+)
+alarm_stack = CloudWatchAlarmStack(app, "CloudWatchAlarmStack",
+    fleet=fleet,
+    alarm_mode=app.node.try_get_context("alarm_mode") or "volume",
+    volume_alarms=str(app.node.try_get_context("volume_alarms")).lower() == "true",
+    notifier_alarms=str(app.node.try_get_context("notifier_alarms")).lower() == "true",
+    notifier_alarm_email=app.node.try_get_context("notifier_alarm_email"),
+    thresholds=load_thresholds(
+        path=app.node.try_get_context("threshold_path"),
+        file=app.node.try_get_context("thresholds_file"),
+    ),
+)
+
+# Stacks exchange values through parameters and exports, which CDK cannot
+# see, so declare the order for `cdk deploy --all` and deploy.py
+for stack in (disk_stack, rocketchat_stack, lambda_stack):
+    stack.add_dependency(env_stack)
+alarm_stack.add_dependency(disk_stack)
+alarm_stack.add_dependency(lambda_stack)
 
 app.synth()
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""Parallel, dependency-aware deploy of the CDK stacks.
+
+Replaces the one-at-a-time ``deploy.sh all``:
+
+* synthesizes the app once into ``cdk.out`` (skipped when the app sources
+  and context are unchanged) and deploys every stack from that assembly;
+* orders stacks by the assembly's dependencies plus the outputs each stack
+  consumes, and deploys independent stacks concurrently;
+* reads each stack's parameters from its synthesized template and fills
+  those that are another stack's outputs from that stack's deploy (or the
+  live stack), so only true inputs need to be in ``.env.cdk.params``;
+* skips stacks whose template and parameters hash to the last deployed value,
+  as long as DescribeStacks still reports the stack as deployed;
+* reports per-stack wall-clock timings.
+
+Usage: python3 deploy.py [all | Stack ...] [--max-workers N] [--force] [-c key=value ...]
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ENV_FILE = os.path.join(HERE, ".env.cdk.params")
+CDK_OUT = os.path.join(HERE, "cdk.out")
+CACHE_FILE = os.path.join(HERE, ".deploy-cache.json")
+
+# Deploy order of deploy.sh; used to break ties and for "all"
+STACKS = ["EnvSetupStack", "DiskMonitorStack", "RocketChatStack", "LambdaStack", "CloudWatchAlarmStack"]
+
+# CfnParameters whose .env.cdk.params variable is not the UPPER_SNAKE form of their name
+PARAMETER_VARIABLES = {
+    "RocketChatStack": {
+        "RocketChatEIPAllocationId": "ROCKETCHAT_EIP_ALLOC_ID",
+        "KeyPairName": "ROCKETCHAT_KEY_PAIR",
+        "ImageId": "ROCKETCHAT_IMAGE_ID",
+    },
+    "CloudWatchAlarmStack": {
+        "InstanceId": "DISK_MONITOR_INSTANCE_ID",
+        "DiskUsageAlertsTopic": "DISK_USAGE_ALERTS_TOPIC_ARN",
+    },
+}
+
+# Variables fed by an output with a different id, as (stack, CfnOutput id); an
+# output named after the variable itself (EnvSetupStack's) is found in the templates
+OUTPUT_SOURCES = {
+    "DISK_MONITOR_INSTANCE_ID": ("DiskMonitorStack", "EBSAlertTestEC2Id"),
+    "DISK_USAGE_ALERTS_TOPIC_ARN": ("LambdaStack", "SNSTopicArn"),
+    "DISK_THRESHOLD_PARAM_NAME": ("LambdaStack", "DiskThresholdParameterName"),
+}
+
+# Stack statuses a skipped stack may be left in
+SETTLED_STATUSES = {"CREATE_COMPLETE", "UPDATE_COMPLETE", "IMPORT_COMPLETE"}
+
+# Files whose contents determine the synthesized templates
+SYNTH_INPUTS = ["app.py", "cdk.json", "fleet.json", "stacks/*.py"]
+
+
+def output_key(output_id):
+    """CloudFormation output name CDK derives from a top-level CfnOutput id."""
+    return re.sub(r"[^A-Za-z0-9]", "", output_id)
+
+
+def variable_name(stack, parameter):
+    """The ``.env.cdk.params`` variable for ``stack``'s CfnParameter ``parameter``."""
+    override = PARAMETER_VARIABLES.get(stack, {}).get(parameter)
+    if override:
+        return override
+    # RocketChat is one word in the variable names (ROCKETCHAT_SG)
+    words = parameter.replace("RocketChat", "Rocketchat")
+    return re.sub(r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])", "_", words).upper()
+
+
+def stack_inputs(templates):
+    """Map each stack to {CfnParameter: (variable, source, required)} from its synthesized template.
+
+    ``templates`` is {stack: template dict}. ``source`` is the (stack, output
+    id) that produces the variable, or None when it only comes from
+    ``.env.cdk.params``; parameters with a Default are not required.
+    """
+    produced = {}
+    for stack, template in templates.items():
+        for key in template.get("Outputs", {}):
+            produced.setdefault(key, stack)
+    inputs = {}
+    for stack, template in templates.items():
+        inputs[stack] = {}
+        for parameter, spec in template.get("Parameters", {}).items():
+            variable = variable_name(stack, parameter)
+            source = OUTPUT_SOURCES.get(variable)
+            if source is None and produced.get(output_key(variable), stack) != stack:
+                source = (produced[output_key(variable)], variable)
+            inputs[stack][parameter] = (variable, source, "Default" not in spec)
+    return inputs
+
+
+def load_env(path=ENV_FILE):
+    """Parse KEY=VALUE lines of ``.env.cdk.params`` (comments and blanks ignored)."""
+    env = {}
+    if not os.path.exists(path):
+        return env
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            env[key.strip()] = value.strip().strip('"').strip("'")
+    return env
+
+
+def build_graph(stacks, manifest=None, inputs=None):
+    """Map each stack to the set of stacks it must wait for.
+
+    Edges come from the cloud assembly (``add_dependency`` and CDK
+    cross-stack references) and from the outputs feeding each stack's
+    parameters (``stack_inputs``).
+    """
+    graph = {stack: set() for stack in stacks}
+    artifacts = (manifest or {}).get("artifacts", {})
+    for stack in stacks:
+        for dependency in artifacts.get(stack, {}).get("dependencies", []):
+            if dependency in graph and dependency != stack:
+                graph[stack].add(dependency)
+        for _, source, _ in (inputs or {}).get(stack, {}).values():
+            if source and source[0] in graph and source[0] != stack:
+                graph[stack].add(source[0])
+    _check_acyclic(graph)
+    return graph
+
+
+def _check_acyclic(graph):
+    visiting, done = set(), set()
+
+    def visit(stack, path):
+        if stack in done:
+            return
+        if stack in visiting:
+            raise ValueError(f"Dependency cycle: {' -> '.join(path + [stack])}")
+        visiting.add(stack)
+        for dependency in graph[stack]:
+            visit(dependency, path + [stack])
+        visiting.discard(stack)
+        done.add(stack)
+
+    for stack in graph:
+        visit(stack, [])
+
+
+def run_graph(graph, action, max_workers=4):
+    """Run ``action(stack)`` once all of the stack's dependencies succeeded.
+
+    ``action`` returns "deployed" or "skipped". A failure marks every stack
+    downstream of it "blocked"; independent branches keep going. Returns
+    {stack: {"status", "seconds", "started", "error"?}}.
+    """
+    results = {}
+    pending = [stack for stack in STACKS if stack in graph] + sorted(set(graph) - set(STACKS))
+    ok = ("deployed", "skipped")
+    origin = time.perf_counter()
+
+    def timed(stack):
+        started = time.perf_counter()
+        try:
+            status, error = action(stack), None
+        except Exception as e:
+            status, error = "failed", str(e)
+        result = {"status": status, "seconds": round(time.perf_counter() - started, 2),
+                  "started": round(started - origin, 2)}
+        if error:
+            result["error"] = error
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+        while pending or running:
+            for stack in list(pending):
+                statuses = [results.get(dependency, {}).get("status") for dependency in graph[stack]]
+                if any(status in ("failed", "blocked") for status in statuses):
+                    results[stack] = {"status": "blocked", "seconds": 0.0, "started": None}
+                    pending.remove(stack)
+                elif all(status in ok for status in statuses):
+                    running[pool.submit(timed, stack)] = stack
+                    pending.remove(stack)
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                results[running.pop(future)] = future.result()
+    return results
+
+
+def _sha256(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class Orchestrator:
+    """Synthesizes once, then deploys the selected stacks in dependency order."""
+
+    def __init__(self, env=None, context=None, cdk_out=CDK_OUT, cache_file=CACHE_FILE,
+                 runner=None, describe=None, force=False, out=None):
+        self.env = load_env() if env is None else env
+        self.context = context or {}
+        self.cdk_out = cdk_out
+        self.cache_file = cache_file
+        self.runner = runner or self._run
+        self.describe = describe or self._describe
+        self.force = force
+        self.out = out or sys.stdout
+        self.outputs = {}
+        self.inputs = {}
+        self.cache = self._load_cache()
+        self._lock = threading.Lock()
+
+    # === Synth ===
+    def synth_hash(self):
+        patterns = SYNTH_INPUTS + ([self.context["fleet_file"]] if "fleet_file" in self.context else [])
+        paths = sorted({p for pattern in patterns for p in glob.glob(os.path.join(HERE, pattern))})
+        parts = [json.dumps(self.context, sort_keys=True)]
+        for path in paths:
+            with open(path, "rb") as f:
+                parts += [os.path.relpath(path, HERE), f.read()]
+        return _sha256(*parts)
+
+    def synth(self):
+        """Synthesize into ``cdk_out`` unless the inputs match the cached assembly."""
+        digest = self.synth_hash()
+        manifest_path = os.path.join(self.cdk_out, "manifest.json")
+        if not self.force and self.cache.get("synth") == digest and os.path.exists(manifest_path):
+            self.say("♻️  App unchanged, reusing synthesized templates")
+            return 0.0, False
+        started = time.perf_counter()
+        self.runner(["cdk", "synth", "--quiet", "--output", self.cdk_out] + self._context_args())
+        self.cache["synth"] = digest
+        self._save_cache()
+        return round(time.perf_counter() - started, 2), True
+
+    def manifest(self):
+        with open(os.path.join(self.cdk_out, "manifest.json")) as f:
+            return json.load(f)
+
+    def templates(self):
+        templates = {}
+        for stack in STACKS:
+            path = os.path.join(self.cdk_out, f"{stack}.template.json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    templates[stack] = json.load(f)
+        return templates
+
+    # === Deploy ===
+    def parameters(self, stack):
+        """Resolve CfnParameter values from upstream outputs, then .env.cdk.params."""
+        values, missing = {}, []
+        for parameter, (variable, source, required) in self.inputs.get(stack, {}).items():
+            value = None
+            if source:
+                value = self.stack_outputs(source[0]).get(output_key(source[1]))
+            if value is None:
+                value = self.env.get(variable)
+            if value is not None:
+                values[parameter] = value
+            elif required:
+                missing.append(variable)
+        if missing:
+            raise KeyError(f"{stack} is missing {', '.join(missing)} (not in .env.cdk.params or upstream outputs)")
+        return values
+
+    def stack_outputs(self, stack):
+        """Outputs of ``stack`` from this run's deploy, else from the live stack (never the cache)."""
+        with self._lock:
+            if stack in self.outputs:
+                return self.outputs[stack]
+        described = self.describe(stack)
+        outputs = (described or {}).get("Outputs", {})
+        with self._lock:
+            return self.outputs.setdefault(stack, outputs)
+
+    def template_hash(self, stack, parameters):
+        with open(os.path.join(self.cdk_out, f"{stack}.template.json"), "rb") as f:
+            template = f.read()
+        return _sha256(template, json.dumps(parameters, sort_keys=True))
+
+    def deploy(self, stack):
+        parameters = self.parameters(stack)
+        digest = self.template_hash(stack, parameters)
+        cached = self.cache.get("stacks", {}).get(stack, {})
+        if not self.force and cached.get("hash") == digest:
+            # The cache outlives destroy.sh and console deletes; only skip a stack that still exists
+            described = self.describe(stack)
+            if described and described["StackStatus"] in SETTLED_STATUSES:
+                self.say(f"⏭️  {stack} unchanged, skipping")
+                with self._lock:
+                    self.outputs[stack] = described.get("Outputs", {})
+                return "skipped"
+            status = described["StackStatus"] if described else "not deployed"
+            self.say(f"🔁 {stack} unchanged but {status}, deploying")
+
+        self.say(f"🚀 Deploying {stack}...")
+        outputs_file = os.path.join(self.cdk_out, f"outputs-{stack}.json")
+        command = ["cdk", "deploy", stack, "--app", self.cdk_out, "--exclusively",
+                   "--require-approval", "never", "--outputs-file", outputs_file]
+        for parameter, value in parameters.items():
+            command += ["--parameters", f"{stack}:{parameter}={value}"]
+        self.runner(command)
+
+        outputs = {}
+        if os.path.exists(outputs_file):
+            with open(outputs_file) as f:
+                outputs = json.load(f).get(stack, {})
+        with self._lock:
+            self.outputs[stack] = outputs
+            self.cache.setdefault("stacks", {})[stack] = {"hash": digest}
+            self._save_cache()
+        self.say(f"✅ {stack} deployed")
+        return "deployed"
+
+    def run(self, stacks, max_workers=4):
+        """Synth, deploy ``stacks`` concurrently where possible, and return the timing report."""
+        started = time.perf_counter()
+        synth_seconds, synthesized = self.synth()
+        self.inputs = stack_inputs(self.templates())
+        graph = build_graph(stacks, self.manifest(), self.inputs)
+        results = run_graph(graph, self.deploy, max_workers=max_workers)
+        return {
+            "synth": {"seconds": synth_seconds, "cached": not synthesized},
+            "stacks": results,
+            "wall_clock_seconds": round(time.perf_counter() - started, 2),
+            "serial_seconds": round(synth_seconds + sum(r["seconds"] for r in results.values()), 2),
+        }
+
+    # === Helpers ===
+    def say(self, message):
+        with self._lock:
+            print(message, file=self.out, flush=True)
+
+    def _context_args(self):
+        args = []
+        for key, value in sorted(self.context.items()):
+            args += ["--context", f"{key}={value}"]
+        return args
+
+    def _run(self, command):
+        subprocess.run(command, cwd=HERE, check=True)
+
+    def _describe(self, stack):
+        """{"StackStatus", "Outputs": {key: value}} of the deployed ``stack``, or None if it does not exist."""
+        import boto3
+        from botocore.exceptions import ClientError
+        try:
+            described = boto3.client("cloudformation").describe_stacks(StackName=stack)["Stacks"][0]
+        except ClientError as e:
+            if "does not exist" in str(e):
+                return None
+            raise
+        outputs = {o["OutputKey"]: o["OutputValue"] for o in described.get("Outputs", [])}
+        return {"StackStatus": described["StackStatus"], "Outputs": outputs}
+
+    def _load_cache(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+        with open(self.cache_file) as f:
+            return json.load(f)
+
+    def _save_cache(self):
+        if self.cache_file:
+            with open(self.cache_file, "w") as f:
+                json.dump(self.cache, f, indent=2, sort_keys=True)
+
+
+def format_report(report):
+    lines = [f"{'Stack':<24}{'Status':<10}{'Start (s)':>10}{'Time (s)':>10}"]
+    lines.append(f"{'(synth)':<24}{'cached' if report['synth']['cached'] else 'done':<10}{0:>10.2f}"
+                 f"{report['synth']['seconds']:>10.2f}")
+    for stack, result in report["stacks"].items():
+        started = "-" if result["started"] is None else f"{result['started']:.2f}"
+        lines.append(f"{stack:<24}{result['status']:<10}{started:>10}{result['seconds']:>10.2f}")
+        if result.get("error"):
+            lines.append(f"    {result['error']}")
+    lines.append(f"Wall clock {report['wall_clock_seconds']:.2f}s (serial sum {report['serial_seconds']:.2f}s)")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("stacks", nargs="*", default=["all"], help="Stacks to deploy, or 'all'")
+    parser.add_argument("--max-workers", type=int, default=4, help="Stacks deployed at the same time")
+    parser.add_argument("--force", action="store_true", help="Re-synth and deploy even if unchanged")
+    parser.add_argument("-c", "--context", action="append", default=[], metavar="KEY=VALUE",
+                        help="CDK context passed to synth (e.g. alarm_mode=instance)")
+    parser.add_argument("--report", help="Write the timing report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    stacks = STACKS if args.stacks == ["all"] else args.stacks
+    unknown = [stack for stack in stacks if stack not in STACKS]
+    if unknown:
+        parser.error(f"unknown stacks: {', '.join(unknown)} (valid: {', '.join(STACKS)})")
+
+    context = dict(item.split("=", 1) for item in args.context)
+    report = Orchestrator(context=context, force=args.force).run(stacks, max_workers=args.max_workers)
+    print(format_report(report))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if any(r["status"] in ("failed", "blocked") for r in report["stacks"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,7 +25,7 @@ deploy_env_stack() {
   : "${FACILITY_PREFIX_LIST_ID:?Missing FACILITY_PREFIX_LIST_ID}"
 
   echo "🌐 Deploying EnvSetupStack..."
-  cdk deploy EnvSetupStack \
+  cdk deploy EnvSetupStack --exclusively \
     --parameters AvailabilityZone=$AVAILABILITY_ZONE \
     --parameters CIDRDiskMonitorVPC=$CIDR_DISK_MONITOR_VPC \
     --parameters CIDRRocketChatVPC=$CIDR_ROCKETCHAT_VPC \
@@ -45,7 +45,7 @@ deploy_disk_stack() {
   : "${DISK_FILL_SCRIPT_KEY:?Missing DISK_FILL_SCRIPT_KEY}"
 
   echo "💽 Deploying DiskMonitorStack..."
-  cdk deploy DiskMonitorStack \
+  cdk deploy DiskMonitorStack --exclusively \
     --parameters DiskMonitorSubnet=$DISK_MONITOR_SUBNET \
     --parameters DiskMonitorSG=$DISK_MONITOR_SG \
     --parameters DiskMonitorKeyPair=$DISK_MONITOR_KEY_PAIR \
@@ -67,7 +67,7 @@ deploy_rocketchat_stack() {
   : "${ROCKETCHAT_SETUP_SCRIPT_KEY:?Missing ROCKETCHAT_SETUP_SCRIPT_KEY}"
 
   echo "💬 Deploying RocketChatStack..."
-  cdk deploy RocketChatStack \
+  cdk deploy RocketChatStack --exclusively \
     --parameters RocketChatSubnet=$ROCKETCHAT_SUBNET \
     --parameters RocketChatSG=$ROCKETCHAT_SG \
     --parameters RocketChatEIPAllocationId=$ROCKETCHAT_EIP_ALLOC_ID \
@@ -89,7 +89,7 @@ deploy_lambda_stack() {
   : "${ROCKETCHAT_WEBHOOK_URL:?Missing ROCKETCHAT_WEBHOOK_URL}"
 
   echo "🛎️  Deploying LambdaStack..."
-  cdk deploy LambdaStack \
+  cdk deploy LambdaStack --exclusively \
     --parameters LambdaVPC=$LAMBDA_VPC \
     --parameters LambdaSG=$LAMBDA_SG \
     --parameters LambdaPublicSubnet=$LAMBDA_PUBLIC_SUBNET \
@@ -108,7 +108,7 @@ deploy_cloudwatch_alarm_stack() {
   : "${DISK_THRESHOLD_PARAM_NAME:?Missing DISK_THRESHOLD_PARAM_NAME}"
 
   echo "📊 Deploying CloudWatchAlarmStack..."
-  cdk deploy CloudWatchAlarmStack \
+  cdk deploy CloudWatchAlarmStack --exclusively \
     --parameters InstanceId=$DISK_MONITOR_INSTANCE_ID \
     --parameters DiskUsageAlertsTopic=$DISK_USAGE_ALERTS_TOPIC_ARN \
     --parameters DiskThresholdParamName=$DISK_THRESHOLD_PARAM_NAME \
@@ -117,7 +117,7 @@ deploy_cloudwatch_alarm_stack() {
 
 # === Main dispatcher ===
 if [ $# -eq 0 ]; then
-  echo "Usage: ./deploy.sh [EnvSetupStack|DiskMonitorStack|RocketChatStack|LambdaStack|CloudWatchAlarmStack|all]"
+  echo "Usage: ./deploy.sh [EnvSetupStack|DiskMonitorStack|RocketChatStack|LambdaStack|CloudWatchAlarmStack|all|all-sequential]"
   exit 1
 fi
 
@@ -138,6 +138,10 @@ case "$1" in
     deploy_cloudwatch_alarm_stack "${@:2}"
     ;;
   all)
+    # Dependency-aware, parallel deploy with output wiring and change detection
+    python3 deploy.py all "${@:2}"
+    ;;
+  all-sequential)
     deploy_env_stack
     deploy_disk_stack
     deploy_rocketchat_stack
@@ -146,7 +150,7 @@ case "$1" in
     ;;
   *)
     echo "❌ Unknown argument: $1"
-    echo "Valid options: EnvSetupStack, DiskMonitorStack, RocketChatStack, LambdaStack, CloudWatchAlarmStack or all"
+    echo "Valid options: EnvSetupStack, DiskMonitorStack, RocketChatStack, LambdaStack, CloudWatchAlarmStack, all or all-sequential"
     exit 1
     ;;
 esac
@@ -34,4 +34,7 @@ else
   done
 fi
 
+# deploy.py would otherwise skip the destroyed stacks as unchanged
+rm -f "$(dirname "$0")/.deploy-cache.json"
+
 echo "✅ Destruction complete."
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""Local docker-compose load test for Rocket.Chat webhook ingestion.
+
+For each capacity profile (see ``stacks/capacity.py``) this brings up the
+same layout ``rocketchat_setup.sh`` builds on the instance: a single-node
+``mongo:5.0`` replica set with the profile's WiredTiger cache and oplog, N
+Rocket.Chat app containers and, for N > 1, an nginx proxy with keep-alive
+upstreams. It then creates an incoming webhook and fires concurrent
+keep-alive POSTs at it, reporting accepted messages per second and latency.
+
+Container CPU and memory limits approximate the profile's instance type;
+absolute numbers depend on the machine running Docker, so compare profiles
+within one run.
+
+    python3 rocketchat_loadtest.py
+    python3 rocketchat_loadtest.py --profiles small medium --concurrency 64 --duration 60
+    python3 rocketchat_loadtest.py --url http://<rocketchat ip>:3000/hooks/<id>/<token>
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+from stacks.capacity import APP_INSTANCE_MIB, CAPACITY_PROFILES, get_profile, mongo_sizing
+
+ROCKETCHAT_IMAGE = "rocketchat/rocket.chat:latest"
+PROXY_PORT = 3000
+FIRST_APP_PORT = 3001
+ADMIN_USER = "loadtest"
+ADMIN_PASS = "loadtest-password"
+
+NGINX_CONF = """worker_processes auto;
+events {{ worker_connections 4096; }}
+http {{
+  upstream rocketchat {{
+    least_conn;
+{servers}
+    keepalive 64;
+  }}
+  server {{
+    listen {port};
+    location / {{
+      proxy_pass http://rocketchat;
+      proxy_http_version 1.1;
+      proxy_set_header Connection "";
+      proxy_set_header Host $host;
+    }}
+  }}
+}}
+"""
+
+
+def nginx_conf(app_instances):
+    """Keep-alive upstream proxy config, as in ``rocketchat_setup.sh``, for the compose service names."""
+    servers = "\n".join(f"    server rocketchat{i}:3000 max_fails=3 fail_timeout=10s;"
+                        for i in range(1, app_instances + 1))
+    return NGINX_CONF.format(servers=servers, port=PROXY_PORT)
+
+
+def compose_file(profile):
+    """docker-compose definition (as a dict; JSON is valid YAML) for one profile."""
+    cache_gb, oplog_mb = mongo_sizing(profile.memory_mib, profile.app_instances)
+    app_cpus = max(0.5, round(profile.vcpus / profile.app_instances, 2))
+    services = {
+        "mongo": {
+            "image": "mongo:5.0",
+            "command": ["mongod", "--replSet", "rs0", "--bind_ip_all",
+                        "--wiredTigerCacheSizeGB", str(cache_gb), "--oplogSize", str(oplog_mb)],
+            "mem_limit": f"{int(cache_gb * 1024) + 512}m",
+            "healthcheck": {
+                "test": ["CMD", "mongosh", "--quiet", "--eval",
+                         "try { rs.status().ok } catch (e) "
+                         "{ rs.initiate({_id: 'rs0', members: [{_id: 0, host: 'mongo:27017'}]}).ok }"],
+                "interval": "5s",
+                "retries": 30,
+            },
+        },
+    }
+    for i in range(1, profile.app_instances + 1):
+        services[f"rocketchat{i}"] = {
+            "image": ROCKETCHAT_IMAGE,
+            "depends_on": {"mongo": {"condition": "service_healthy"}},
+            "environment": {
+                "PORT": "3000",
+                "INSTANCE_IP": f"rocketchat{i}",
+                "MONGO_URL": "mongodb://mongo:27017/rocketchat?replicaSet=rs0",
+                "MONGO_OPLOG_URL": "mongodb://mongo:27017/local?replicaSet=rs0",
+                "ROOT_URL": f"http://localhost:{PROXY_PORT}",
+                "ADMIN_USERNAME": ADMIN_USER,
+                "ADMIN_PASS": ADMIN_PASS,
+                "ADMIN_EMAIL": "loadtest@example.com",
+                "OVERWRITE_SETTING_Show_Setup_Wizard": "completed",
+                # Measure ingestion, not the API rate limiter
+                "OVERWRITE_SETTING_API_Enable_Rate_Limiter": "false",
+            },
+            "ports": [f"{FIRST_APP_PORT + i - 1}:3000"],
+            "cpus": app_cpus,
+            "mem_limit": f"{APP_INSTANCE_MIB * 2}m",
+        }
+    if profile.app_instances > 1:
+        services["proxy"] = {
+            "image": "nginx:stable",
+            "volumes": ["./nginx.conf:/etc/nginx/nginx.conf:ro"],
+            "ports": [f"{PROXY_PORT}:{PROXY_PORT}"],
+            "depends_on": [f"rocketchat{i}" for i in range(1, profile.app_instances + 1)],
+        }
+    else:
+        services["rocketchat1"]["ports"].append(f"{PROXY_PORT}:3000")
+    return {"services": services}
+
+
+class ComposeStack:
+    """One profile's containers in a scratch directory, brought up in order."""
+
+    def __init__(self, name, profile, runner=subprocess.run):
+        self.name = name
+        self.profile = profile
+        self.workdir = tempfile.mkdtemp(prefix=f"rocketchat-{name}-")
+        self.runner = runner
+
+    def compose(self, *args):
+        self.runner(["docker", "compose", "-p", f"rocketchat-loadtest-{self.name}",
+                     "-f", os.path.join(self.workdir, "docker-compose.yml"), *args], check=True)
+
+    def up(self, ready_timeout=600):
+        with open(os.path.join(self.workdir, "docker-compose.yml"), "w") as f:
+            json.dump(compose_file(self.profile), f, indent=2)
+        with open(os.path.join(self.workdir, "nginx.conf"), "w") as f:
+            f.write(nginx_conf(self.profile.app_instances))
+
+        # The first app runs the migrations; start the rest once it answers
+        self.compose("up", "-d", "mongo", "rocketchat1")
+        wait_ready(f"http://127.0.0.1:{FIRST_APP_PORT}", ready_timeout)
+        self.compose("up", "-d")
+        for i in range(2, self.profile.app_instances + 1):
+            wait_ready(f"http://127.0.0.1:{FIRST_APP_PORT + i - 1}", ready_timeout)
+        return f"http://127.0.0.1:{PROXY_PORT}"
+
+    def down(self):
+        self.compose("down", "-v")
+
+
+def _call(base, path, payload=None, headers=None):
+    request = urllib.request.Request(base + path, data=json.dumps(payload).encode() if payload is not None else None,
+                                     headers={"Content-Type": "application/json", **(headers or {})})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read() or b"{}")
+
+
+def wait_ready(base, timeout, sleep=time.sleep, clock=time.monotonic):
+    deadline = clock() + timeout
+    while True:
+        try:
+            if "version" in _call(base, "/api/info"):
+                return
+        except OSError:
+            pass
+        if clock() > deadline:
+            raise TimeoutError(f"Rocket.Chat at {base} not ready after {timeout}s")
+        sleep(5)
+
+
+def create_webhook(base):
+    """Log in as the load-test admin and create an incoming webhook into #general."""
+    login = _call(base, "/api/v1/login", {"user": ADMIN_USER, "password": ADMIN_PASS})["data"]
+    auth = {"X-Auth-Token": login["authToken"], "X-User-Id": login["userId"]}
+    created = _call(base, "/api/v1/integrations.create", {
+        "type": "webhook-incoming", "name": "Load test", "enabled": True,
+        "username": ADMIN_USER, "channel": "#general", "scriptEnabled": False,
+    }, headers=auth)["integration"]
+    return f"{base}/hooks/{created['_id']}/{created['token']}"
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def fire(url, concurrency=32, duration=30.0, clock=time.perf_counter):
+    """POST alarm-sized messages from ``concurrency`` keep-alive connections for ``duration`` seconds."""
+    parts = urlsplit(url)
+    body = json.dumps({"text": "*Disk Usage Alert*\n*Alarm:* loadtest_mnt_vol1_high_disk_usage\n"
+                               "*State:* ALARM\n*Reason:* Threshold Crossed"}).encode()
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    started = clock()
+    stop_at = started + duration
+
+    def worker():
+        conn = None
+        local_latencies, local_statuses = [], {}
+        while clock() < stop_at:
+            if conn is None:
+                conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+            sent = clock()
+            try:
+                conn.request("POST", parts.path, body, {"Content-Type": "application/json"})
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except OSError:
+                conn.close()
+                conn = None
+                status = "error"
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+            if status == 200:
+                local_latencies.append((clock() - sent) * 1000)
+        if conn is not None:
+            conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = clock() - started
+
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "accepted": len(latencies),
+        "messagesPerSecond": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50Ms": _round(_percentile(latencies, 50)),
+        "p99Ms": _round(_percentile(latencies, 99)),
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 1)
+
+
+def format_report(results):
+    lines = [f"{'profile':<8} {'apps':>4} {'msgs/s':>8} {'p50 ms':>8} {'p99 ms':>8}  statuses"]
+    for name, result in results.items():
+        lines.append(f"{name:<8} {result.get('appInstances', '-'):>4} {result['messagesPerSecond']:>8} "
+                     f"{result['p50Ms'] if result['p50Ms'] is not None else '-':>8} "
+                     f"{result['p99Ms'] if result['p99Ms'] is not None else '-':>8}  "
+                     f"{json.dumps(result['statuses'])}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", default=list(CAPACITY_PROFILES), choices=list(CAPACITY_PROFILES))
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--url", help="webhook URL of a running Rocket.Chat; skips docker compose")
+    parser.add_argument("--keep", action="store_true", help="leave the containers running")
+    parser.add_argument("--report", help="write the results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = {}
+    if args.url:
+        results["target"] = fire(args.url, args.concurrency, args.duration)
+    for name in ([] if args.url else args.profiles):
+        profile = get_profile(name)
+        stack = ComposeStack(name, profile)
+        try:
+            print(f"Starting {name}: {profile.app_instances} app container(s)...", file=sys.stderr)
+            webhook = create_webhook(stack.up())
+            results[name] = dict(fire(webhook, args.concurrency, args.duration), appInstances=profile.app_instances)
+        finally:
+            if not args.keep:
+                stack.down()
+
+    print(format_report(results))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
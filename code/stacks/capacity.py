@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+
+# Memory kept back for the OS, Docker and the reverse proxy before sizing Mongo
+HOST_RESERVED_MIB = 1024
+# Working set of one Rocket.Chat (Meteor/Node) app container under webhook load
+APP_INSTANCE_MIB = 768
+
+# MongoDB's own floors: 0.25 GB WiredTiger cache, 990 MB oplog
+MIN_CACHE_GB = 0.25
+MIN_OPLOG_MB = 990
+
+
+@dataclass(frozen=True)
+class CapacityProfile:
+    """Rocket.Chat host sizing: instance, root gp3 volume and app containers."""
+    instance_type: str
+    memory_mib: int
+    vcpus: int
+    app_instances: int
+    volume_gb: int
+    ebs_iops: int
+    ebs_throughput: int
+
+
+# "small" is the original single-container t3.medium layout
+CAPACITY_PROFILES = {
+    "small": CapacityProfile("t3.medium", 4096, 2, 1, 20, 3000, 125),
+    "medium": CapacityProfile("m6i.large", 8192, 2, 2, 50, 3000, 250),
+    "large": CapacityProfile("m6i.xlarge", 16384, 4, 4, 100, 6000, 500),
+}
+
+
+def get_profile(name):
+    if name not in CAPACITY_PROFILES:
+        raise ValueError(f"capacity_profile must be one of {tuple(CAPACITY_PROFILES)}, got {name!r}")
+    return CAPACITY_PROFILES[name]
+
+
+def mongo_sizing(memory_mib, app_instances):
+    """(WiredTiger cache GB, oplog MB) for a host with ``memory_mib`` running ``app_instances`` apps.
+
+    Mirrors the calculation in ``rocketchat_setup.sh``, which runs it against
+    the instance's actual MemTotal: the cache gets half of what is left after
+    the host reserve and the app containers (MongoDB's own default is half of
+    RAM minus 1 GB, which starves the apps once several share the host), and
+    the oplog holds as many MB as the host has MiB of memory so a burst of
+    webhook writes cannot roll it over before the apps tail it.
+    """
+    available = memory_mib - HOST_RESERVED_MIB - app_instances * APP_INSTANCE_MIB
+    cache_gb = max(MIN_CACHE_GB, round(available / 2 / 1024, 2))
+    oplog_mb = max(MIN_OPLOG_MB, memory_mib)
+    return cache_gb, oplog_mb
@@ -2,14 +2,59 @@ from aws_cdk import (
     Stack,
     Token,
     aws_cloudwatch as cloudwatch,
+    aws_sns as sns,
+    aws_sns_subscriptions as subs,
+    CfnOutput,
     CfnParameter,
+    Fn,
+    NestedStack,
 )
 from constructs import Construct
 
+from stacks.fleet import (
+    COMPOSITE_CHILDREN, Fleet, Instance, Volume, alarm_name, fleet_filter, instance_filter, load_fleet,
+    rollup_alarm_name, rollup_query, shard,
+)
+from stacks.thresholds import ThresholdStore, apply_thresholds
+
+# "volume" alarms each volume; "instance" / "fleet" alarm on a Metric Insights MAX
+ALARM_MODES = ("volume", "instance", "fleet")
+
+
+def composite_alarm(scope: Construct, construct_id: str, name: str, children: list):
+    """ALARM when any child alarm is in ALARM (children referenced by name).
+
+    The rollup has no actions of its own: notifications come from the child
+    alarms, so a second instance breaching is not hidden behind one already
+    in ALARM. It gives dashboards and paging a single fleet-wide state.
+    """
+    composite = cloudwatch.CfnCompositeAlarm(scope, construct_id,
+        alarm_name=name,
+        alarm_description="Disk usage rollup across the fleet",
+        alarm_rule=" OR ".join(f'ALARM("{child.alarm_name}")' for child in children)
+    )
+    for child in children:
+        composite.add_dependency(child)
+    return composite
+
+
 class CloudWatchAlarmStack(Stack):
-    def __init__(self, scope: Construct, construct_id: str, **kwargs):
+    def __init__(self, scope: Construct, construct_id: str,
+                 fleet: Fleet = None,
+                 alarm_mode: str = "volume",
+                 volume_alarms: bool = False,
+                 notifier_alarms: bool = False,
+                 notifier_namespace: str = "RocketChatNotifier",
+                 notifier_p99_latency_ms: int = 5000,
+                 notifier_failure_rate_percent: int = 5,
+                 notifier_alarm_email: str = None,
+                 thresholds: ThresholdStore = None,
+                 **kwargs):
         super().__init__(scope, construct_id, **kwargs)
 
+        if alarm_mode not in ALARM_MODES:
+            raise ValueError(f"alarm_mode must be one of {ALARM_MODES}, got {alarm_mode!r}")
+
         # === Parameters ===
         instance_id = CfnParameter(self, "InstanceId", type="String")
         sns_topic_arn = CfnParameter(self, "DiskUsageAlertsTopic", type="String")
@@ -17,26 +62,256 @@ class CloudWatchAlarmStack(Stack):
                                             default="/diskmonitor/threshold/percent")
 
         # === Common alarm builder ===
-        def create_alarm(volume: str):
-            return cloudwatch.CfnAlarm(self, f"DiskAlarm{volume}",
-                alarm_name=f"mnt_{volume}_high_disk_usage",
+        fleet = fleet or load_fleet()
+
+        # Store thresholds become per-volume thresholds (or anomaly bands); a
+        # percent default in the store replaces the single SSM parameter
+        default_threshold = Token.as_number(disk_threshold_param.value_as_string)
+        if thresholds is not None:
+            fleet = apply_thresholds(fleet, thresholds)
+            if thresholds.default and thresholds.default[0] == "percent":
+                default_threshold = thresholds.default[1]
+
+        def instance_ref(instance: Instance):
+            # The original instance keeps taking its id as a parameter; the rest
+            # of the fleet is resolved from DiskMonitorStack's exports
+            if instance.legacy:
+                return instance_id.value_as_string
+            return Fn.import_value(instance.export_name)
+
+        def create_alarm(scope: Construct, instance: Instance, volume: Volume):
+            # Lets the notifier look the volume up in the threshold store by name
+            description = f"instance={instance.name} volume={volume.name}" if thresholds is not None else None
+            if volume.anomaly_band is not None:
+                return create_anomaly_alarm(scope, instance, volume, description)
+            threshold = volume.threshold_percent
+            if threshold is None:
+                threshold = default_threshold
+            return cloudwatch.CfnAlarm(scope, instance.logical_id(f"DiskAlarm{volume.name}"),
+                alarm_name=alarm_name(instance, volume),
+                alarm_description=description,
                 namespace="CWAgent",
                 metric_name="disk_used_percent",
                 statistic="Average",
-                period=60,
+                period=instance.profile.alarm_period,
                 evaluation_periods=1,
-                threshold=Token.as_number(disk_threshold_param.value_as_string),
+                threshold=threshold,
                 comparison_operator="GreaterThanThreshold",
                 dimensions=[
-                    cloudwatch.CfnAlarm.DimensionProperty(name="path", value=f"/mnt/{volume}"),
-                    cloudwatch.CfnAlarm.DimensionProperty(name="InstanceId", value=instance_id.value_as_string),
-                    cloudwatch.CfnAlarm.DimensionProperty(name="fstype", value="ext4"),
+                    cloudwatch.CfnAlarm.DimensionProperty(name="path", value=volume.mount_path),
+                    cloudwatch.CfnAlarm.DimensionProperty(name="InstanceId", value=instance_ref(instance)),
+                    cloudwatch.CfnAlarm.DimensionProperty(name="fstype", value=volume.fstype),
                 ],
                 alarm_actions=[sns_topic_arn.value_as_string],
                 treat_missing_data="notBreaching",
                 unit="Percent"
             )
 
-        # Volumes: vol1, vol2, vol3
-        for volume in ["vol1", "vol2", "vol3"]:
-            create_alarm(volume)
+        def create_anomaly_alarm(scope: Construct, instance: Instance, volume: Volume, description: str):
+            # ALARM above the upper edge of CloudWatch's anomaly-detection band
+            return cloudwatch.CfnAlarm(scope, instance.logical_id(f"DiskAlarm{volume.name}"),
+                alarm_name=alarm_name(instance, volume),
+                alarm_description=description,
+                evaluation_periods=1,
+                comparison_operator="GreaterThanUpperThreshold",
+                threshold_metric_id="band",
+                alarm_actions=[sns_topic_arn.value_as_string],
+                treat_missing_data="notBreaching",
+                metrics=[
+                    cloudwatch.CfnAlarm.MetricDataQueryProperty(
+                        id="used",
+                        return_data=True,
+                        metric_stat=cloudwatch.CfnAlarm.MetricStatProperty(
+                            metric=cloudwatch.CfnAlarm.MetricProperty(
+                                namespace="CWAgent",
+                                metric_name="disk_used_percent",
+                                dimensions=[
+                                    cloudwatch.CfnAlarm.DimensionProperty(name="path", value=volume.mount_path),
+                                    cloudwatch.CfnAlarm.DimensionProperty(name="InstanceId", value=instance_ref(instance)),
+                                    cloudwatch.CfnAlarm.DimensionProperty(name="fstype", value=volume.fstype),
+                                ]
+                            ),
+                            period=instance.profile.alarm_period,
+                            stat="Average"
+                        )
+                    ),
+                    cloudwatch.CfnAlarm.MetricDataQueryProperty(
+                        id="band",
+                        expression=f"ANOMALY_DETECTION_BAND(used, {volume.anomaly_band:g})",
+                        label="Expected disk used (%)",
+                        return_data=True
+                    ),
+                ]
+            )
+
+        def create_rollup(scope: Construct, instance: Instance = None):
+            # MAX(disk_used_percent) for one instance (or all of them). Agents that
+            # publish the matching aggregation_dimensions give a plain Maximum alarm;
+            # otherwise a Metric Insights query. The notifier resolves either to volumes.
+            profiles = [instance.profile] if instance else [i.profile for i in fleet.instances]
+            period = min(profile.alarm_period for profile in profiles)
+            dimensions = ["InstanceId"] if instance else []
+            # A dimension-only aggregate cannot leave out the volumes with their own threshold
+            covered = [instance] if instance else fleet.instances
+            aggregated = all(profile.aggregates(dimensions) for profile in profiles) and not any(
+                volume.own_threshold for member in covered for volume in member.volumes)
+
+            construct_id = f"{instance.name}DiskRollupAlarm" if instance else "FleetDiskRollupAlarm"
+
+            if aggregated:
+                rollup = cloudwatch.CfnAlarm(scope, construct_id,
+                    alarm_name=rollup_alarm_name(instance),
+                    alarm_description="Highest disk_used_percent across the watched volumes",
+                    namespace="CWAgent",
+                    metric_name="disk_used_percent",
+                    statistic="Maximum",
+                    period=period,
+                    evaluation_periods=1,
+                    threshold=default_threshold,
+                    comparison_operator="GreaterThanThreshold",
+                    dimensions=[
+                        cloudwatch.CfnAlarm.DimensionProperty(name="InstanceId", value=instance_ref(instance)),
+                    ] if instance else None,
+                    alarm_actions=[sns_topic_arn.value_as_string],
+                    treat_missing_data="notBreaching",
+                    unit="Percent"
+                )
+                rollups.append(rollup)
+                return rollup
+
+            if instance:
+                expression = Fn.sub(rollup_query(instance_filter(instance, "${InstanceId}")),
+                                    {"InstanceId": instance_ref(instance)})
+            else:
+                where = fleet_filter(fleet.instances, lambda member: "${%sId}" % member.name)
+                expression = Fn.sub(rollup_query(where), {
+                    f"{member.name}Id": instance_ref(member) for member in fleet.instances
+                    if any(volume.own_threshold for volume in member.volumes)
+                }) if where else rollup_query()
+            rollup = cloudwatch.CfnAlarm(scope, construct_id,
+                alarm_name=rollup_alarm_name(instance),
+                alarm_description="Highest disk_used_percent across the watched volumes",
+                evaluation_periods=1,
+                threshold=default_threshold,
+                comparison_operator="GreaterThanThreshold",
+                alarm_actions=[sns_topic_arn.value_as_string],
+                treat_missing_data="notBreaching",
+                metrics=[
+                    cloudwatch.CfnAlarm.MetricDataQueryProperty(
+                        id="max_disk_used",
+                        expression=expression,
+                        label="Max disk used (%)",
+                        # Metric Insights queries evaluate at one minute or coarser
+                        period=max(period, 60),
+                        return_data=True
+                    ),
+                ]
+            )
+            rollups.append(rollup)
+            return rollup
+
+        # "volume" alarms on every volume; "instance" and "fleet" evaluate one
+        # MAX per instance / for the fleet, keeping per-volume
+        # alarms only for volumes with their own threshold (or when opted in)
+        targets = []
+        if alarm_mode == "fleet":
+            targets.append((create_rollup, ()))
+        for instance in fleet.instances:
+            if alarm_mode == "instance":
+                targets.append((create_rollup, (instance,)))
+            for volume in instance.volumes:
+                if alarm_mode == "volume" or volume_alarms or volume.own_threshold:
+                    targets.append((create_alarm, (instance, volume)))
+
+        # Split across nested stacks for large fleets
+        rollups = []
+        shards = shard(targets, lambda target: 1)
+        for index, group in enumerate(shards):
+            scope = self if len(shards) == 1 else NestedStack(self, f"DiskAlarmShard{index + 1}")
+            for build, args in group:
+                build(scope, *args)
+
+        # === Composite rollups (one fleet-wide state over the instance alarms) ===
+        if alarm_mode == "instance":
+            # A rule takes at most 100 children, so larger fleets get a second tier
+            groups = [rollups[i:i + COMPOSITE_CHILDREN] for i in range(0, len(rollups), COMPOSITE_CHILDREN)]
+            if len(groups) == 1:
+                composite_alarm(self, "FleetDiskComposite", "fleet_disk_usage_rollup", groups[0])
+            else:
+                tier = [
+                    composite_alarm(self, f"FleetDiskComposite{n}", f"fleet_disk_usage_rollup_{n}", group)
+                    for n, group in enumerate(groups, start=1)
+                ]
+                composite_alarm(self, "FleetDiskComposite", "fleet_disk_usage_rollup", tier)
+
+        # === Notifier health alarms (from the notifier's EMF metrics) ===
+        if notifier_alarms:
+            # Not DiskUsageAlertsTopic: that topic invokes the very notifier these alarms watch
+            health_topic = sns.Topic(self, "NotifierHealthTopic", topic_name="rocketchat-notifier-health")
+            if notifier_alarm_email:
+                health_topic.add_subscription(subs.EmailSubscription(notifier_alarm_email))
+            CfnOutput(self, "NotifierHealthTopicArn", value=health_topic.topic_arn)
+
+            cloudwatch.CfnAlarm(self, "NotifierLatencyP99Alarm",
+                alarm_name="rocketchat_notifier_p99_latency",
+                alarm_description="Rocket.Chat notifier p99 handler latency is above budget",
+                namespace=notifier_namespace,
+                metric_name="HandlerLatency",
+                extended_statistic="p99",
+                period=300,
+                evaluation_periods=1,
+                threshold=notifier_p99_latency_ms,
+                comparison_operator="GreaterThanThreshold",
+                alarm_actions=[health_topic.topic_arn],
+                treat_missing_data="notBreaching",
+                unit="Milliseconds"
+            )
+
+            def notifier_metric(query_id: str, metric_name: str):
+                return cloudwatch.CfnAlarm.MetricDataQueryProperty(
+                    id=query_id,
+                    return_data=False,
+                    metric_stat=cloudwatch.CfnAlarm.MetricStatProperty(
+                        metric=cloudwatch.CfnAlarm.MetricProperty(
+                            namespace=notifier_namespace,
+                            metric_name=metric_name
+                        ),
+                        period=300,
+                        stat="Sum"
+                    )
+                )
+
+            cloudwatch.CfnAlarm(self, "NotifierFailureRateAlarm",
+                alarm_name="rocketchat_notifier_failure_rate",
+                alarm_description="Percentage of alarm records the Rocket.Chat notifier failed to post",
+                evaluation_periods=1,
+                threshold=notifier_failure_rate_percent,
+                comparison_operator="GreaterThanThreshold",
+                alarm_actions=[health_topic.topic_arn],
+                treat_missing_data="notBreaching",
+                metrics=[
+                    notifier_metric("failed", "RecordsFailed"),
+                    notifier_metric("processed", "RecordsProcessed"),
+                    cloudwatch.CfnAlarm.MetricDataQueryProperty(
+                        id="failure_rate",
+                        expression="100 * FILL(failed, 0) / processed",
+                        label="Notifier failure rate (%)",
+                        return_data=True
+                    ),
+                ]
+            )
+
+            # A dead-lettered alarm was never posted and will not be retried
+            cloudwatch.CfnAlarm(self, "NotifierDeadLetteredAlarm",
+                alarm_name="rocketchat_notifier_dead_lettered",
+                alarm_description="Rocket.Chat notifier gave up on alarm records and sent them to the DLQ",
+                namespace=notifier_namespace,
+                metric_name="RecordsDeadLettered",
+                statistic="Sum",
+                period=300,
+                evaluation_periods=1,
+                threshold=0,
+                comparison_operator="GreaterThanThreshold",
+                alarm_actions=[health_topic.topic_arn],
+                treat_missing_data="notBreaching"
+            )
@@ -1,3 +1,5 @@
+import json
+
 from aws_cdk import (
     Stack,
     aws_ec2 as ec2,
@@ -5,11 +7,14 @@ from aws_cdk import (
     CfnParameter,
     CfnOutput,
     Fn,
+    NestedStack,
 )
 from constructs import Construct
 
+from stacks.fleet import Fleet, Instance, OUTPUT_BUDGET, agent_config, collector_config, load_fleet, shard
+
 class DiskMonitorStack(Stack):
-    def __init__(self, scope: Construct, construct_id: str, **kwargs):
+    def __init__(self, scope: Construct, construct_id: str, fleet: Fleet = None, **kwargs):
         super().__init__(scope, construct_id, **kwargs)
 
         # === Parameters ===
@@ -37,80 +42,115 @@ class DiskMonitorStack(Stack):
             roles=[demo_role.role_name]
         )
 
-        # === EC2 Instance ===
-        ec2_instance = ec2.CfnInstance(self, "EBSAlertTestEC2",
-            instance_type="t3.micro",
-            image_id=image_id.value_as_string,
-            key_name=key_pair_name.value_as_string,
-            subnet_id=disk_monitor_subnet.value_as_string,
-            security_group_ids=[disk_monitor_sg.value_as_string],
-            iam_instance_profile=instance_profile.ref,
-            tags=[{"key": "Name", "value": "EBSAlertTestEC2"}],
-            user_data=Fn.base64(
-                Fn.sub(
-                    """#!/bin/bash
-            aws s3 cp s3://${DiskMonitorSetupS3}/${DiskMonitorSetupKey} /tmp/setup.sh
-            chmod +x /tmp/setup.sh
-            /tmp/setup.sh
+        # === Fleet (instances + volumes from fleet.json) ===
+        fleet = fleet or load_fleet()
+        settings = {
+            "image_id": image_id.value_as_string,
+            "key_name": key_pair_name.value_as_string,
+            "subnet_id": disk_monitor_subnet.value_as_string,
+            "security_group_id": disk_monitor_sg.value_as_string,
+            "instance_profile": instance_profile.ref,
+            "setup_vars": {
+                "DiskMonitorSetupS3": disk_monitor_setup_s3.value_as_string,
+                "DiskMonitorSetupKey": disk_monitor_setup_key.value_as_string,
+                "DiskFillScriptS3": disk_fill_script_s3.value_as_string,
+                "DiskFillScriptKey": disk_fill_script_key.value_as_string,
+            },
+        }
 
-            aws s3 cp s3://${DiskFillScriptS3}/${DiskFillScriptKey} /usr/local/bin/disk_fill_tool.sh
-            chmod +x /usr/local/bin/disk_fill_tool.sh
-            """,
-                    {
-                        "DiskMonitorSetupS3": disk_monitor_setup_s3.value_as_string,
-                        "DiskMonitorSetupKey": disk_monitor_setup_key.value_as_string,
-                        "DiskFillScriptS3": disk_fill_script_s3.value_as_string,
-                        "DiskFillScriptKey": disk_fill_script_key.value_as_string
-                    }
-                )
-            )
-        )
-            
-        # === EBS Volumes ===
-        az = Fn.select(0, Fn.get_azs(""))
+        # Instances on the python collector fetch it from the setup script's bucket
+        if any(instance.profile.collector == "python" for instance in fleet.instances):
+            collector_key = CfnParameter(self, "MetricsCollectorKey", type="String",
+                default="scripts/disk_metrics_collector.py",
+                description="Key of disk_metrics_collector.py in the DiskMonitorSetupS3 bucket")
+            settings["setup_vars"]["MetricsCollectorKey"] = collector_key.value_as_string
 
-        volume1 = ec2.CfnVolume(self, "EBSVolume1",
-            availability_zone=az,
-            size=10,
-            volume_type="gp3",
-            tags=[{"key": "Name", "value": "EBSVolume1"}]
-        )
+        # Small fleets live in this stack; larger ones are split across nested
+        # stacks so no template crosses the CloudFormation resource/output limits
+        shards = shard(fleet.instances, lambda instance: instance.resource_count, max_items=OUTPUT_BUDGET)
+        for index, instances in enumerate(shards):
+            scope = self if len(shards) == 1 else NestedStack(self, f"FleetShard{index + 1}")
+            for instance in instances:
+                add_instance(scope, instance, settings)
 
-        volume2 = ec2.CfnVolume(self, "EBSVolume2",
-            availability_zone=az,
-            size=10,
-            volume_type="gp3",
-            tags=[{"key": "Name", "value": "EBSVolume2"}]
-        )
 
-        volume3 = ec2.CfnVolume(self, "EBSVolume3",
+def add_instance(scope: Construct, instance: Instance, settings: dict):
+    """Create one fleet instance with its EBS volumes, attachments and id export."""
+    # Volumes are passed to the setup script as <volume-id>:<mount path>:<fstype>
+    # so it can find each NVMe device by EBS serial rather than by enumeration order
+    setup_vars = dict(settings["setup_vars"])
+    volume_specs = []
+    volumes = []
+    az = Fn.select(0, Fn.get_azs(""))
+
+    # === EBS Volumes ===
+    for index, volume in enumerate(instance.volumes, start=1):
+        ebs_volume = ec2.CfnVolume(scope, instance.logical_id(f"EBSVolume{index}"),
             availability_zone=az,
-            size=10,
-            volume_type="gp3",
-            tags=[{"key": "Name", "value": "EBSVolume3"}]
+            size=volume.size_gb,
+            volume_type=volume.volume_type,
+            tags=[{"key": "Name", "value": instance.logical_id(f"EBSVolume{index}")}]
         )
+        volumes.append(ebs_volume)
+        setup_vars[f"Volume{index}"] = ebs_volume.ref
+        volume_specs.append(f"${{Volume{index}}}:{volume.mount_path}:{volume.fstype}")
 
-        # === Attach Volumes ===
-        ec2.CfnVolumeAttachment(self, "AttachVolume1",
-            instance_id=ec2_instance.ref,
-            volume_id=volume1.ref,
-            device="/dev/xvdf"
-        )
+    # The python collector replaces the agent: its settings and script go in
+    # place of the agent config, and the setup script runs it as a service
+    if instance.profile.collector == "python":
+        metrics_setup = """cat > /tmp/disk-collector.json <<'COLLECTOR'
+""" + json.dumps(collector_config(instance), indent=2) + """
+COLLECTOR
+            aws s3 cp s3://${DiskMonitorSetupS3}/${MetricsCollectorKey} /usr/local/bin/disk_metrics_collector.py
+            chmod +x /usr/local/bin/disk_metrics_collector.py
+"""
+        setup_env = "METRICS_COLLECTOR_CONFIG=/tmp/disk-collector.json"
+    else:
+        # Agent config from the instance's collection profile; "${!" keeps the agent's
+        # own ${aws:InstanceId} placeholder literal through Fn::Sub
+        agent_config_json = json.dumps(agent_config(instance), indent=2).replace("${", "${!")
+        metrics_setup = """cat > /tmp/cwagent-config.json <<'CWAGENT'
+""" + agent_config_json + """
+CWAGENT
+"""
+        setup_env = "CWAGENT_CONFIG=/tmp/cwagent-config.json"
 
-        ec2.CfnVolumeAttachment(self, "AttachVolume2",
-            instance_id=ec2_instance.ref,
-            volume_id=volume2.ref,
-            device="/dev/xvdg"
+    # === EC2 Instance ===
+    ec2_instance = ec2.CfnInstance(scope, instance.name,
+        instance_type=instance.instance_type,
+        image_id=settings["image_id"],
+        key_name=settings["key_name"],
+        subnet_id=settings["subnet_id"],
+        security_group_ids=[settings["security_group_id"]],
+        iam_instance_profile=settings["instance_profile"],
+        tags=[{"key": "Name", "value": instance.name}],
+        user_data=Fn.base64(
+            Fn.sub(
+                """#!/bin/bash
+            """ + metrics_setup + """
+            aws s3 cp s3://${DiskMonitorSetupS3}/${DiskMonitorSetupKey} /tmp/setup.sh
+            chmod +x /tmp/setup.sh
+            """ + setup_env + """ /tmp/setup.sh """ + " ".join(volume_specs) + """
+
+            aws s3 cp s3://${DiskFillScriptS3}/${DiskFillScriptKey} /usr/local/bin/disk_fill_tool.sh
+            chmod +x /usr/local/bin/disk_fill_tool.sh
+            """,
+                setup_vars
+            )
         )
+    )
 
-        ec2.CfnVolumeAttachment(self, "AttachVolume3",
+    # === Attach Volumes ===
+    for index, ((volume, device), ebs_volume) in enumerate(zip(instance.devices(), volumes), start=1):
+        ec2.CfnVolumeAttachment(scope, instance.logical_id(f"AttachVolume{index}"),
             instance_id=ec2_instance.ref,
-            volume_id=volume3.ref,
-            device="/dev/xvdh"
+            volume_id=ebs_volume.ref,
+            device=device
         )
 
-        # === Outputs ===
-        CfnOutput(self, "EBSAlertTestEC2Id",
-            value=ec2_instance.ref,
-            description="EC2 instance for Disk Monitor"
-        )
+    # === Outputs ===
+    CfnOutput(scope, f"{instance.name}Id",
+        value=ec2_instance.ref,
+        description=f"EC2 instance for Disk Monitor ({instance.name})",
+        export_name=instance.export_name
+    )
@@ -204,6 +204,10 @@ class EnvSetupStack(Stack):
             value=rc_eip.ref, 
             description="Elastic IP allocation ID for Rocket.Chat EC2 instance"
         )
+        CfnOutput(self, "ROCKETCHAT_EIP_ALLOC_ID",
+            value=rc_eip.attr_allocation_id,
+            description="Elastic IP allocation ID for Rocket.Chat EC2 instance (RocketChatStack input)"
+        )
 
 
         # VPC Outpputs
@@ -0,0 +1,313 @@
+import json
+import os
+import re
+import string
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+DEFAULT_FLEET_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fleet.json")
+
+# Instance whose resources keep the original (unprefixed) logical ids and alarm names
+LEGACY_INSTANCE = "EBSAlertTestEC2"
+
+# CloudFormation allows 500 resources and 200 outputs per stack; leave room for the stack's own
+RESOURCE_BUDGET = 450
+OUTPUT_BUDGET = 190
+
+NAME_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9]*")
+
+# Metric Insights source for the CloudWatch Agent disk metrics the alarms watch
+DISK_SCHEMA = 'SCHEMA("CWAgent", InstanceId, fstype, path)'
+
+# Composite alarm rules may reference at most 100 alarms
+COMPOSITE_CHILDREN = 100
+
+# Publishers an instance can run: the CloudWatch agent, or disk_metrics_collector.py
+COLLECTORS = ("agent", "python")
+
+# Block device names handed to EBS attachments, in order (/dev/xvdf .. /dev/xvdz)
+DEVICE_NAMES = [f"/dev/xvd{letter}" for letter in string.ascii_lowercase[5:]]
+
+
+@dataclass
+class Volume:
+    name: str
+    mount_path: str
+    size_gb: int = 10
+    volume_type: str = "gp3"
+    fstype: str = "ext4"
+    threshold_percent: Optional[float] = None
+    # Alarm on CloudWatch's anomaly-detection band (this many standard deviations) instead
+    anomaly_band: Optional[float] = None
+
+    @property
+    def own_threshold(self):
+        """True when the volume needs its own alarm rather than the shared threshold."""
+        return self.threshold_percent is not None or self.anomaly_band is not None
+
+
+@dataclass
+class CollectionProfile:
+    """CloudWatch agent collection settings for an instance's volumes.
+
+    The agent's disk plugin has a single interval per host, so profiles are
+    chosen per instance. Intervals under 60 s publish high-resolution metrics.
+    """
+    interval: int = 60
+    measurements: List[str] = field(default_factory=lambda: ["used_percent"])
+    inodes: bool = False
+    diskio: bool = False
+    aggregation_dimensions: List[List[str]] = field(default_factory=list)
+    collector: str = "agent"
+
+    @property
+    def alarm_period(self):
+        """Shortest alarm period that matches the collection interval (10, 30 or n x 60)."""
+        if self.interval <= 10:
+            return 10
+        if self.interval <= 30:
+            return 30
+        return 60 * -(-self.interval // 60)
+
+    def aggregates(self, dimensions):
+        return list(dimensions) in [list(d) for d in self.aggregation_dimensions]
+
+
+# Built-in volume classes; fleet.json "profiles" may add to or override them
+DEFAULT_PROFILES = {
+    "standard": CollectionProfile(),
+    "high-res": CollectionProfile(
+        interval=10,
+        inodes=True,
+        diskio=True,
+        aggregation_dimensions=[["InstanceId"], []],
+    ),
+}
+
+
+@dataclass
+class Instance:
+    name: str
+    instance_type: str = "t3.micro"
+    volumes: List[Volume] = field(default_factory=list)
+    profile: CollectionProfile = field(default_factory=CollectionProfile)
+
+    @property
+    def legacy(self):
+        return self.name == LEGACY_INSTANCE
+
+    def logical_id(self, suffix):
+        """Construct id for a per-instance resource; the legacy instance keeps the old ids."""
+        return suffix if self.legacy else f"{self.name}{suffix}"
+
+    @property
+    def export_name(self):
+        return f"DiskMonitor-{self.name}-InstanceId"
+
+    @property
+    def resource_count(self):
+        """Instance plus one volume and one attachment per volume."""
+        return 1 + 2 * len(self.volumes)
+
+    def devices(self):
+        """Pairs of (volume, block device name) in attachment order."""
+        return list(zip(self.volumes, DEVICE_NAMES))
+
+
+@dataclass
+class Fleet:
+    instances: List[Instance]
+
+    @property
+    def volume_count(self):
+        return sum(len(instance.volumes) for instance in self.instances)
+
+
+def load_fleet(source=None):
+    """Load a fleet from a dict, a JSON file path, or the default ``fleet.json``."""
+    if source is None or isinstance(source, str):
+        with open(source or DEFAULT_FLEET_FILE) as f:
+            source = json.load(f)
+    return parse_fleet(source)
+
+
+def parse_fleet(data):
+    defaults = data.get("defaults", {})
+    volume_defaults = {k: v for k, v in defaults.items() if k in Volume.__dataclass_fields__}
+    instance_type = defaults.get("instance_type", "t3.micro")
+    profiles = dict(DEFAULT_PROFILES)
+    profiles.update({name: CollectionProfile(**raw) for name, raw in data.get("profiles", {}).items()})
+
+    instances = []
+    for raw in data.get("instances", []):
+        volumes = [Volume(**dict(volume_defaults, **volume)) for volume in raw.get("volumes", [])]
+        instances.append(Instance(
+            name=raw["name"],
+            instance_type=raw.get("instance_type", instance_type),
+            volumes=volumes,
+            profile=_profile(profiles, raw.get("profile", defaults.get("profile", "standard")), raw["name"]),
+        ))
+
+    fleet = Fleet(instances=instances)
+    validate_fleet(fleet)
+    return fleet
+
+
+def _profile(profiles, name, instance_name):
+    if name not in profiles:
+        raise ValueError(f"{instance_name} uses unknown profile {name!r} (known: {sorted(profiles)})")
+    profile = profiles[name]
+    # Alarm periods must be 10, 30 or a multiple of 60 seconds
+    if profile.interval not in (10, 30) and profile.interval % 60:
+        raise ValueError(f"Profile {name!r} interval must be 10, 30 or a multiple of 60 seconds")
+    if profile.collector not in COLLECTORS:
+        raise ValueError(f"Profile {name!r} collector must be one of {COLLECTORS}, got {profile.collector!r}")
+    if profile.collector == "python" and profile.diskio:
+        raise ValueError(f"Profile {name!r}: the python collector does not collect diskio")
+    return profile
+
+
+def validate_fleet(fleet):
+    if not fleet.instances:
+        raise ValueError("Fleet must define at least one instance")
+    names = set()
+    for instance in fleet.instances:
+        if not NAME_PATTERN.fullmatch(instance.name):
+            raise ValueError(f"Instance name {instance.name!r} must be alphanumeric (it is used in construct ids)")
+        if instance.name in names:
+            raise ValueError(f"Duplicate instance name {instance.name!r}")
+        names.add(instance.name)
+        if len(instance.volumes) > len(DEVICE_NAMES):
+            raise ValueError(f"{instance.name} has {len(instance.volumes)} volumes; at most {len(DEVICE_NAMES)} are supported")
+        volume_names = [volume.name for volume in instance.volumes]
+        if len(set(volume_names)) != len(volume_names):
+            raise ValueError(f"{instance.name} defines the same volume name twice")
+        for volume in instance.volumes:
+            if not NAME_PATTERN.fullmatch(volume.name):
+                raise ValueError(f"Volume name {volume.name!r} on {instance.name} must be alphanumeric")
+            if not volume.mount_path.startswith("/"):
+                raise ValueError(f"Mount path {volume.mount_path!r} on {instance.name} must be absolute")
+        paths = [volume.mount_path for volume in instance.volumes]
+        if len(set(paths)) != len(paths):
+            raise ValueError(f"{instance.name} mounts the same path twice")
+
+
+def alarm_name(instance, volume):
+    """``mnt_vol1_high_disk_usage`` style name, prefixed for non-legacy instances."""
+    slug = volume.mount_path.strip("/").replace("/", "_") or "root"
+    prefix = "" if instance.legacy else f"{instance.name}_"
+    return f"{prefix}{slug}_high_disk_usage"
+
+
+def agent_config(instance):
+    """CloudWatch agent ``config.json`` for one instance, from its collection profile."""
+    profile = instance.profile
+    measurements = list(profile.measurements)
+    if profile.inodes:
+        measurements += [m for m in ("inodes_used", "inodes_free", "inodes_total") if m not in measurements]
+
+    collected = {
+        "disk": {
+            "measurement": measurements,
+            "metrics_collection_interval": profile.interval,
+            "resources": [volume.mount_path for volume in instance.volumes],
+            "drop_device": True,
+            "drop_mount": False,
+            # fstype is one of the alarm dimensions
+            "drop_fstype": False,
+        },
+    }
+    if profile.diskio:
+        # Device names are only known on the host, so collect every block device
+        collected["diskio"] = {
+            "measurement": ["read_bytes", "write_bytes", "reads", "writes"],
+            "metrics_collection_interval": profile.interval,
+            "resources": ["*"],
+        }
+
+    metrics = {
+        "metrics_collected": collected,
+        "append_dimensions": {"InstanceId": "${aws:InstanceId}"},
+    }
+    if profile.aggregation_dimensions:
+        metrics["aggregation_dimensions"] = profile.aggregation_dimensions
+    return {"metrics": metrics}
+
+
+def collector_config(instance):
+    """Settings for ``disk_metrics_collector.py``, equivalent to ``agent_config`` for the disk plugin."""
+    profile = instance.profile
+    measurements = list(profile.measurements)
+    if profile.inodes:
+        measurements += [m for m in ("inodes_used", "inodes_free", "inodes_total") if m not in measurements]
+    return {
+        "namespace": "CWAgent",
+        "interval": profile.interval,
+        "measurements": measurements,
+        "mounts": [{"path": volume.mount_path, "fstype": volume.fstype} for volume in instance.volumes],
+        "aggregation_dimensions": profile.aggregation_dimensions,
+    }
+
+
+def rollup_alarm_name(instance=None):
+    """Name of the MAX(disk_used_percent) rollup for one instance, or for the whole fleet."""
+    return f"{instance.name}_high_disk_usage" if instance else "fleet_high_disk_usage"
+
+
+def rollup_query(where=None):
+    """Metric Insights query for the worst disk usage, optionally filtered with ``where``.
+
+    The notifier recognises this shape and re-runs it grouped by volume to
+    find which volumes breached.
+    """
+    query = f"SELECT MAX(disk_used_percent) FROM {DISK_SCHEMA}"
+    return f"{query} WHERE {where}" if where else query
+
+
+def instance_filter(instance, instance_id):
+    """WHERE clause for one instance's volumes that follow the shared threshold.
+
+    Volumes with their own ``threshold_percent`` or ``anomaly_band`` keep a
+    dedicated alarm and are left out of the rollup.
+    """
+    clauses = [f"InstanceId = '{instance_id}'"]
+    clauses.extend(
+        f"path != '{volume.mount_path}'"
+        for volume in instance.volumes if volume.own_threshold
+    )
+    return " AND ".join(clauses)
+
+
+def fleet_filter(instances, instance_id):
+    """WHERE clause leaving volumes with their own threshold out of a fleet-wide rollup.
+
+    ``instance_id(instance)`` gives the id to match for each instance.
+    Returns None when every volume follows the shared threshold.
+    """
+    clauses = []
+    for instance in instances:
+        paths = [f"path != '{volume.mount_path}'" for volume in instance.volumes if volume.own_threshold]
+        if paths:
+            excluded = paths[0] if len(paths) == 1 else f"({' AND '.join(paths)})"
+            clauses.append(f"(InstanceId != '{instance_id(instance)}' OR {excluded})")
+    return " AND ".join(clauses) or None
+
+
+def shard(items, weight, budget=RESOURCE_BUDGET, max_items=None):
+    """Split ``items`` into consecutive groups whose summed ``weight`` stays within ``budget``.
+
+    ``max_items`` additionally caps the number of items per group (e.g. one
+    output per item against the per-stack output limit).
+    """
+    shards, current, used = [], [], 0
+    for item in items:
+        cost = weight(item)
+        full = max_items is not None and len(current) >= max_items
+        if current and (used + cost > budget or full):
+            shards.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += cost
+    if current:
+        shards.append(current)
+    return shards
@@ -1,22 +1,73 @@
+import json
+
 from aws_cdk import (
     Duration,
+    RemovalPolicy,
     Stack,
+    aws_dynamodb as dynamodb,
+    aws_events as events,
+    aws_events_targets as targets,
     aws_lambda as _lambda,
+    aws_lambda_event_sources as event_sources,
     aws_iam as iam,
     aws_sns as sns,
     aws_sns_subscriptions as subs,
     aws_ssm as ssm,
     aws_ec2 as ec2,
     aws_s3 as s3,
+    aws_sqs as sqs,
     CfnParameter,
     CfnOutput,
 )
 from constructs import Construct
 
+# Digest modes understood by the notifier (see DIGEST_MODE in lambda_function.py)
+DIGEST_MODES = ("off", "instance", "family")
+
+# Fill-rate models understood by the forecaster (see FORECAST_MODEL in forecast.py)
+FORECAST_MODELS = ("linear", "exponential")
+
+def cold_start_profile(cold_start_ms):
+    """Pick (memory_size, warm_start) from a measured notifier cold start in ms.
+
+    The measurement is the ``initDurationMs`` the notifier logs on its first
+    invocation (or the Init Duration of the Lambda REPORT line). Cheap starts
+    stay on 128 MB; moderate ones get more CPU plus SnapStart; expensive ones
+    keep one provisioned environment warm.
+    """
+    if cold_start_ms is None or cold_start_ms < 400:
+        return 128, None
+    if cold_start_ms < 1500:
+        return 256, "snapstart"
+    return 512, "provisioned"
+
 class LambdaStack(Stack):
-    def __init__(self, scope: Construct, construct_id: str, **kwargs):
+    def __init__(self, scope: Construct, construct_id: str,
+                 digest_mode: str = "off",
+                 digest_window_seconds: int = 30,
+                 dedup_table: bool = False,
+                 dedup_suppression_seconds: int = 120,
+                 cold_start_ms: int = None,
+                 parameters_extension: bool = False,
+                 templates_parameter: str = None,
+                 forecast_horizon_hours: float = None,
+                 forecast_interval_minutes: int = 15,
+                 forecast_model: str = "linear",
+                 routing_table: dict = None,
+                 retry_queue: bool = False,
+                 retry_drain_concurrency: int = 2,
+                 retry_max_attempts: int = 8,
+                 threshold_path: str = None,
+                 history_table: bool = False,
+                 history_retention_days: int = 30,
+                 **kwargs):
         super().__init__(scope, construct_id, **kwargs)
 
+        if digest_mode not in DIGEST_MODES:
+            raise ValueError(f"digest_mode must be one of {DIGEST_MODES}, got {digest_mode!r}")
+        if forecast_model not in FORECAST_MODELS:
+            raise ValueError(f"forecast_model must be one of {FORECAST_MODELS}, got {forecast_model!r}")
+
         # === Parameters ===
         lambda_vpc = CfnParameter(self, "LambdaVPC", type="AWS::EC2::VPC::Id")
         lambda_sg = CfnParameter(self, "LambdaSG", type="AWS::EC2::SecurityGroup::Id")
@@ -51,6 +102,13 @@ class LambdaStack(Stack):
             ]
         )
 
+        # Rollup alarms name a Metric Insights query; the notifier re-runs it to find the breaching volumes.
+        # The forecaster lists instances when its SEARCH outgrows the series limit
+        lambda_role.add_to_policy(iam.PolicyStatement(
+            actions=["cloudwatch:GetMetricData", "cloudwatch:ListMetrics"],
+            resources=["*"]
+        ))
+
         # === VPC Reference with Both Subnets ===
         vpc = ec2.Vpc.from_vpc_attributes(self, "LambdaVPCRef",
             vpc_id=lambda_vpc.value_as_string,
@@ -64,33 +122,249 @@ class LambdaStack(Stack):
             self, "LambdaSGRef", lambda_sg.value_as_string
         )
 
+        # === Optional environment (message templates, shared dedup store) ===
+        optional_env = {}
+        if templates_parameter:
+            optional_env["TEMPLATES_PARAM_NAME"] = templates_parameter
+
+        # Hierarchical per-volume thresholds (see stacks/thresholds.py); seeded with
+        # the fleet-wide default, read by the notifier to show threshold and headroom
+        if threshold_path:
+            ssm.StringParameter(self, "DiskThresholdDefaultParameter",
+                parameter_name=f"{threshold_path.rstrip('/')}/default",
+                string_value=disk_threshold.value_as_string,
+                description="Fleet-wide disk usage threshold; more specific entries live under the same path"
+            )
+            optional_env["THRESHOLDS_PATH"] = threshold_path
+
+        # Routing table for the multi-sink fan-out (see sinks.py); kept in SSM so
+        # routes can be edited without a deploy and picked up within the cache TTL
+        if routing_table:
+            routes_param = ssm.StringParameter(self, "NotifierRoutesParameter",
+                parameter_name="/rocketchat/routes",
+                string_value=json.dumps(routing_table),
+                description="Notifier sinks and routing rules (JSON)"
+            )
+            optional_env["ROUTES_PARAM_NAME"] = routes_param.parameter_name
+            topic_arns = [sink["topic_arn"] for sink in routing_table.get("sinks", {}).values()
+                          if sink.get("type") == "sns"]
+            if topic_arns:
+                lambda_role.add_to_policy(iam.PolicyStatement(
+                    actions=["sns:Publish"],
+                    resources=topic_arns
+                ))
+
+        # Shared dedup store; keys expire through DynamoDB TTL
+        if dedup_table:
+            dedup_store = dynamodb.Table(self, "NotifierDedupTable",
+                partition_key=dynamodb.Attribute(name="pk", type=dynamodb.AttributeType.STRING),
+                billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                time_to_live_attribute="expires_at",
+                removal_policy=RemovalPolicy.DESTROY
+            )
+            dedup_store.grant_read_write_data(lambda_role)
+            optional_env["DEDUP_TABLE_NAME"] = dedup_store.table_name
+
+        # Alarm transition history, one item per transition: the table key serves an
+        # instance's time window and the volume-time index one volume's
+        if history_table:
+            history_store = dynamodb.Table(self, "AlarmHistoryTable",
+                partition_key=dynamodb.Attribute(name="pk", type=dynamodb.AttributeType.STRING),
+                sort_key=dynamodb.Attribute(name="sk", type=dynamodb.AttributeType.STRING),
+                billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                time_to_live_attribute="expires_at",
+                removal_policy=RemovalPolicy.DESTROY
+            )
+            history_store.add_global_secondary_index(
+                index_name="volume-time",
+                partition_key=dynamodb.Attribute(name="vk", type=dynamodb.AttributeType.STRING),
+                sort_key=dynamodb.Attribute(name="at", type=dynamodb.AttributeType.NUMBER)
+            )
+            history_store.grant_read_write_data(lambda_role)
+            optional_env["HISTORY_TABLE_NAME"] = history_store.table_name
+            optional_env["HISTORY_RETENTION_DAYS"] = str(history_retention_days)
+
+        # Failed deliveries are queued with exponential delay; exhausted ones land in the DLQ
+        if retry_queue:
+            retry_dlq = sqs.Queue(self, "NotifierRetryDLQ",
+                retention_period=Duration.days(14)
+            )
+            retry_jobs = sqs.Queue(self, "NotifierRetryQueue",
+                visibility_timeout=Duration.seconds(180),
+                retention_period=Duration.days(4),
+                # Drain crashes (not delivery failures) still end up in the DLQ
+                dead_letter_queue=sqs.DeadLetterQueue(queue=retry_dlq, max_receive_count=5)
+            )
+            retry_jobs.grant_send_messages(lambda_role)
+            retry_dlq.grant_send_messages(lambda_role)
+            optional_env["RETRY_QUEUE_URL"] = retry_jobs.queue_url
+            optional_env["RETRY_DLQ_URL"] = retry_dlq.queue_url
+            optional_env["RETRY_MAX_ATTEMPTS"] = str(retry_max_attempts)
+            optional_env["RETRY_BASE_DELAY_SECONDS"] = "30"
+
+        # === Cold-start tuning ===
+        memory_size, warm_start = cold_start_profile(cold_start_ms)
+
+        # Serve GetParameter from the extension's localhost cache instead of boto3
+        params_and_secrets = None
+        if parameters_extension:
+            params_and_secrets = _lambda.ParamsAndSecretsLayerVersion.from_version(
+                _lambda.ParamsAndSecretsVersions.V1_0_103,
+                cache_size=10,
+                parameter_store_ttl=Duration.minutes(5)
+            )
+
         # === Lambda Function ===
+        lambda_func_code = _lambda.Code.from_bucket(
+            bucket=s3.Bucket.from_bucket_name(self, "CodeBucket", lambda_bucket.value_as_string),
+            key=lambda_key.value_as_string
+        )
         lambda_func = _lambda.Function(self, "RocketChatNotifier",
             runtime=_lambda.Runtime.PYTHON_3_12,
             handler="lambda_function.lambda_handler",
-            code=_lambda.Code.from_bucket(
-                bucket=s3.Bucket.from_bucket_name(self, "CodeBucket", lambda_bucket.value_as_string),
-                key=lambda_key.value_as_string
-            ),
+            code=lambda_func_code,
             role=lambda_role,
             timeout=Duration.seconds(30),
-            memory_size=128,
+            memory_size=memory_size,
+            snap_start=_lambda.SnapStartConf.ON_PUBLISHED_VERSIONS if warm_start == "snapstart" else None,
+            params_and_secrets=params_and_secrets,
             vpc=vpc,
             vpc_subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS),
             security_groups=[security_group],
             environment={
-                "WEBHOOK_PARAM": "/rocketchat/webhook_url"
+                "WEBHOOK_PARAM_NAME": webhook_param.parameter_name,
+                "MAX_CONCURRENCY": "8",
+                "SSM_CACHE_TTL_SECONDS": "300",
+                "HTTP_POOL_SIZE": "8",
+                "HTTP_CONNECT_TIMEOUT": "3",
+                "HTTP_READ_TIMEOUT": "5",
+                "HTTP_MAX_RETRIES": "2",
+                # Retries stop early rather than run into the 30 s function timeout
+                "HTTP_TOTAL_TIMEOUT": "20",
+                "DIGEST_MODE": digest_mode,
+                "DEDUP_SUPPRESSION_SECONDS": str(dedup_suppression_seconds),
+                "USE_PARAMETERS_EXTENSION": "true" if parameters_extension else "false",
+                "LOG_LEVEL": "INFO",
+                "LOG_SAMPLE_RATE": "1.0",
+                "METRICS_NAMESPACE": "RocketChatNotifier",
+                **optional_env
             }
         )
 
+        # SnapStart and provisioned concurrency only apply to published versions,
+        # so route invocations through an alias when either is enabled
+        notifier = lambda_func
+        if warm_start is not None:
+            notifier = lambda_func.add_alias("live",
+                provisioned_concurrent_executions=1 if warm_start == "provisioned" else None
+            )
+
         # === SNS Topic and Subscription ===
         sns_topic = sns.Topic(self, "DiskUsageAlertsTopic", topic_name="disk-usage-alerts")
 
-        sns_topic.add_subscription(subs.LambdaSubscription(lambda_func))
+        if digest_mode == "off":
+            sns_topic.add_subscription(subs.LambdaSubscription(notifier))
+        else:
+            # Buffer alarm transitions in SQS so a storm arrives as one batch per window
+            digest_queue = sqs.Queue(self, "DiskUsageAlertsDigestQueue",
+                visibility_timeout=Duration.seconds(180),
+                retention_period=Duration.days(1)
+            )
+            sns_topic.add_subscription(subs.SqsSubscription(digest_queue))
+            notifier.add_event_source(event_sources.SqsEventSource(digest_queue,
+                batch_size=100,
+                max_batching_window=Duration.seconds(digest_window_seconds),
+                report_batch_item_failures=True
+            ))
+
+        # === Retry drain (same package, reserved concurrency caps the load on Rocket.Chat) ===
+        if retry_queue:
+            retry_drain = _lambda.Function(self, "RocketChatRetryDrain",
+                runtime=_lambda.Runtime.PYTHON_3_12,
+                handler="retry_queue.lambda_handler",
+                code=lambda_func_code,
+                role=lambda_role,
+                timeout=Duration.seconds(30),
+                memory_size=memory_size,
+                reserved_concurrent_executions=retry_drain_concurrency,
+                params_and_secrets=params_and_secrets,
+                vpc=vpc,
+                vpc_subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS),
+                security_groups=[security_group],
+                environment={
+                    "WEBHOOK_PARAM_NAME": webhook_param.parameter_name,
+                    "MAX_CONCURRENCY": "4",
+                    "SSM_CACHE_TTL_SECONDS": "300",
+                    "HTTP_POOL_SIZE": "4",
+                    "HTTP_CONNECT_TIMEOUT": "3",
+                    "HTTP_READ_TIMEOUT": "5",
+                    # Retries are the queue's job; don't sleep through 429s in-process
+                    "HTTP_MAX_RETRIES": "0",
+                    "DEDUP_SUPPRESSION_SECONDS": str(dedup_suppression_seconds),
+                    "USE_PARAMETERS_EXTENSION": "true" if parameters_extension else "false",
+                    "LOG_LEVEL": "INFO",
+                    "METRICS_NAMESPACE": "RocketChatNotifier",
+                    **optional_env
+                }
+            )
+            retry_drain.add_event_source(event_sources.SqsEventSource(retry_jobs,
+                batch_size=10,
+                report_batch_item_failures=True
+            ))
+
+        # === Fill-rate forecaster (same package, scheduled) ===
+        if forecast_horizon_hours:
+            forecaster = _lambda.Function(self, "DiskFillForecaster",
+                runtime=_lambda.Runtime.PYTHON_3_12,
+                handler="forecast.lambda_handler",
+                code=lambda_func_code,
+                role=lambda_role,
+                timeout=Duration.seconds(60),
+                memory_size=256,
+                vpc=vpc,
+                vpc_subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS),
+                security_groups=[security_group],
+                environment={
+                    "WEBHOOK_PARAM_NAME": webhook_param.parameter_name,
+                    "FORECAST_HORIZON_HOURS": str(forecast_horizon_hours),
+                    "FORECAST_LOOKBACK_HOURS": "6",
+                    "FORECAST_MODEL": forecast_model,
+                    "FORECAST_REPEAT_SECONDS": "21600",
+                    "LOG_LEVEL": "INFO",
+                    **optional_env
+                }
+            )
+            events.Rule(self, "DiskFillForecastSchedule",
+                schedule=events.Schedule.rate(Duration.minutes(forecast_interval_minutes)),
+                targets=[targets.LambdaFunction(forecaster)]
+            )
+
+        # === Alarm history chat command (same package, behind a function URL) ===
+        # Rocket.Chat cannot sign requests, so the URL is public and the handler
+        # checks the outgoing webhook's token against /rocketchat/history_token
+        if history_table:
+            history_command = _lambda.Function(self, "AlarmHistoryCommand",
+                runtime=_lambda.Runtime.PYTHON_3_12,
+                handler="history.lambda_handler",
+                code=lambda_func_code,
+                role=lambda_role,
+                timeout=Duration.seconds(10),
+                memory_size=memory_size,
+                vpc=vpc,
+                vpc_subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS),
+                security_groups=[security_group],
+                environment={
+                    "WEBHOOK_PARAM_NAME": webhook_param.parameter_name,
+                    "HISTORY_TOKEN_PARAM_NAME": "/rocketchat/history_token",
+                    "LOG_LEVEL": "INFO",
+                    **optional_env
+                }
+            )
+            history_url = history_command.add_function_url(auth_type=_lambda.FunctionUrlAuthType.NONE)
 
         # === Lambda invoke permission ===
         _lambda.CfnPermission(self, "LambdaInvokePermissionForSNS",
-            function_name=lambda_func.function_name,
+            function_name=notifier.function_arn,
             action="lambda:InvokeFunction",
             principal="sns.amazonaws.com",
             source_arn=sns_topic.topic_arn
@@ -102,3 +376,7 @@ class LambdaStack(Stack):
         CfnOutput(self, "WebhookSSMParameterName", value=webhook_param.parameter_name)
         CfnOutput(self, "DiskThresholdParameterName", value=disk_threshold_param.parameter_name)
         CfnOutput(self, "SNSTopicArn", value=sns_topic.topic_arn)
+        if retry_queue:
+            CfnOutput(self, "RetryDeadLetterQueueUrl", value=retry_dlq.queue_url)
+        if history_table:
+            CfnOutput(self, "AlarmHistoryCommandUrl", value=history_url.url)
@@ -8,10 +8,17 @@ from aws_cdk import (
 )
 from constructs import Construct
 
+from .capacity import get_profile
+
 class RocketChatStack(Stack):
-    def __init__(self, scope: Construct, construct_id: str, **kwargs):
+    def __init__(self, scope: Construct, construct_id: str,
+                 capacity_profile: str = None,
+                 **kwargs):
         super().__init__(scope, construct_id, **kwargs)
 
+        # None keeps the original t3.medium with one Rocket.Chat container
+        profile = get_profile(capacity_profile) if capacity_profile else None
+
         # === Parameters ===
         subnet = CfnParameter(self, "RocketChatSubnet", type="AWS::EC2::Subnet::Id")
         security_group = CfnParameter(self, "RocketChatSG", type="AWS::EC2::SecurityGroup::Id")
@@ -21,6 +28,40 @@ class RocketChatStack(Stack):
         rocketchat_setup_s3 = CfnParameter(self, "RocketChatSetupScriptS3", type="String")
         rocketchat_setup_key = CfnParameter(self, "RocketChatSetupScriptKey", type="String")
 
+        # === Capacity profile (instance, gp3 root volume, app containers) ===
+        instance_type = "t3.medium"
+        launch_template = None
+        setup_env = ""
+        if profile:
+            instance_type = CfnParameter(self, "RocketChatInstanceType", type="String",
+                default=profile.instance_type).value_as_string
+            ebs_iops = CfnParameter(self, "RocketChatEbsIops", type="Number",
+                default=profile.ebs_iops, min_value=3000, max_value=16000)
+            ebs_throughput = CfnParameter(self, "RocketChatEbsThroughput", type="Number",
+                default=profile.ebs_throughput, min_value=125, max_value=1000,
+                description="gp3 throughput in MiB/s for the root volume holding Mongo data")
+            # Instance block device mappings have no Throughput; launch templates do
+            root_volume = ec2.CfnLaunchTemplate(self, "RocketChatLaunchTemplate",
+                launch_template_data=ec2.CfnLaunchTemplate.LaunchTemplateDataProperty(
+                    block_device_mappings=[ec2.CfnLaunchTemplate.BlockDeviceMappingProperty(
+                        device_name="/dev/xvda",
+                        ebs=ec2.CfnLaunchTemplate.EbsProperty(
+                            volume_type="gp3",
+                            volume_size=profile.volume_gb,
+                            iops=ebs_iops.value_as_number,
+                            throughput=ebs_throughput.value_as_number,
+                            delete_on_termination=True
+                        )
+                    )]
+                )
+            )
+            launch_template = ec2.CfnInstance.LaunchTemplateSpecificationProperty(
+                launch_template_id=root_volume.ref,
+                version=root_volume.attr_latest_version_number
+            )
+            # The setup script sizes Mongo from the instance's memory and this app count
+            setup_env = f"export ROCKETCHAT_APP_INSTANCES={profile.app_instances}\n            "
+
         # === IAM Role ===
         role = iam.Role(self, "DemoEC2Role",
             assumed_by=iam.ServicePrincipal("ec2.amazonaws.com"),
@@ -35,12 +76,13 @@ class RocketChatStack(Stack):
 
         # === EC2 Instance ===
         instance = ec2.CfnInstance(self, "RocketChatInstance",
-            instance_type="t3.medium",
+            instance_type=instance_type,
             image_id=image_id.value_as_string,
             key_name=key_pair.value_as_string,
             subnet_id=subnet.value_as_string,
             security_group_ids=[security_group.value_as_string],
             iam_instance_profile=instance_profile.ref,
+            launch_template=launch_template,
             metadata_options=ec2.CfnInstance.MetadataOptionsProperty(
                 http_tokens="required",
                 http_endpoint="enabled"
@@ -49,7 +91,7 @@ class RocketChatStack(Stack):
             user_data=Fn.base64(
                 Fn.sub(
                     """#!/bin/bash
-            aws s3 cp s3://${RocketChatSetupScriptS3}/${RocketChatSetupScriptKey} /tmp/setup.sh
+            """ + setup_env + """aws s3 cp s3://${RocketChatSetupScriptS3}/${RocketChatSetupScriptKey} /tmp/setup.sh
             chmod +x /tmp/setup.sh
             /tmp/setup.sh > /var/log/rocketchat_setup.log 2>&1""",
                     {
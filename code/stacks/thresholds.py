@@ -0,0 +1,130 @@
+import json
+from dataclasses import replace
+
+from stacks.fleet import Fleet
+
+# SSM path holding the threshold hierarchy (relative keys below it):
+#   default                                  fleet-wide threshold
+#   path/<prefix>                            mount paths under <prefix>, e.g. path/var/log
+#   instance/<instance>/default              every volume of one instance
+#   instance/<instance>/path/<prefix>        one instance's mount paths under <prefix>
+#   instance/<instance>/volume/<volume>      one volume
+# <instance> is the fleet.json name (or the EC2 instance id, which only the
+# notifier can see). The most specific match wins; among path entries, the
+# longest prefix. Values are a percent ("90") or "anomaly[:<band width>]".
+DEFAULT_THRESHOLD_PATH = "/diskmonitor/thresholds"
+
+ANOMALY_BAND = 2.0
+
+
+def parse_threshold(value):
+    """("percent", 90.0) or ("anomaly", band width) from a stored threshold value."""
+    text = str(value).strip().lower()
+    if text.startswith("anomaly"):
+        _, _, width = text.partition(":")
+        band = float(width) if width else ANOMALY_BAND
+        if band <= 0:
+            raise ValueError(f"Anomaly band width must be positive, got {value!r}")
+        return "anomaly", band
+    percent = float(text)
+    if not 0 < percent <= 100:
+        raise ValueError(f"Threshold must be a percent between 0 and 100, got {value!r}")
+    return "percent", percent
+
+
+def _path_matches(prefix, mount_path):
+    return mount_path == prefix or mount_path.startswith(prefix.rstrip("/") + "/")
+
+
+class ThresholdStore:
+    """The threshold hierarchy from one ``GetParametersByPath`` fetch, keyed relative to the path."""
+
+    def __init__(self, entries=None):
+        self.entries = {key.strip("/"): parse_threshold(value) for key, value in (entries or {}).items()}
+
+    @classmethod
+    def from_parameters(cls, path, parameters):
+        prefix = path.rstrip("/") + "/"
+        return cls({p["Name"][len(prefix):]: p["Value"] for p in parameters if p["Name"].startswith(prefix)})
+
+    @property
+    def default(self):
+        return self.entries.get("default")
+
+    def resolve(self, instance_keys, volume=None, mount_path=None):
+        """(kind, value, key) of the most specific entry for a volume, or None."""
+        for instance in instance_keys:
+            if not instance:
+                continue
+            scope = f"instance/{instance}/"
+            if volume and scope + f"volume/{volume}" in self.entries:
+                key = scope + f"volume/{volume}"
+                return self.entries[key] + (key,)
+            match = self._longest_path(scope, mount_path)
+            if match:
+                return match
+            if scope + "default" in self.entries:
+                return self.entries[scope + "default"] + (scope + "default",)
+        match = self._longest_path("", mount_path)
+        if match:
+            return match
+        if self.default:
+            return self.default + ("default",)
+        return None
+
+    def _longest_path(self, scope, mount_path):
+        if not mount_path:
+            return None
+        best = None
+        for key in self.entries:
+            if not key.startswith(scope + "path/"):
+                continue
+            prefix = "/" + key[len(scope) + len("path/"):]
+            if _path_matches(prefix, mount_path) and (best is None or len(key) > len(best)):
+                best = key
+        return self.entries[best] + (best,) if best else None
+
+
+def fetch_thresholds(path=DEFAULT_THRESHOLD_PATH, client=None):
+    """Read the whole hierarchy under ``path`` with paginated ``GetParametersByPath``."""
+    if client is None:
+        import boto3
+        client = boto3.client("ssm")
+    parameters = []
+    for page in client.get_paginator("get_parameters_by_path").paginate(Path=path, Recursive=True):
+        parameters.extend(page["Parameters"])
+    return ThresholdStore.from_parameters(path, parameters)
+
+
+def load_thresholds(path=None, file=None):
+    """A store from a JSON file of relative keys (offline synth) or the SSM ``path``; None if neither."""
+    if file:
+        with open(file) as f:
+            return ThresholdStore(json.load(f))
+    if path:
+        return fetch_thresholds(path)
+    return None
+
+
+def apply_thresholds(fleet: Fleet, store: ThresholdStore):
+    """Copy of ``fleet`` with store thresholds set on volumes that need their own alarm.
+
+    Volumes with a ``threshold_percent`` or ``anomaly_band`` in fleet.json keep
+    it. A percent ``default`` stays the shared threshold (see the alarm stack);
+    an anomaly ``default`` applies to every volume.
+    """
+    instances = []
+    for instance in fleet.instances:
+        volumes = []
+        for volume in instance.volumes:
+            resolved = None if volume.own_threshold else store.resolve([instance.name], volume.name, volume.mount_path)
+            if resolved is None or resolved[2] == "default" and resolved[0] == "percent":
+                volumes.append(volume)
+                continue
+            kind, value, _ = resolved
+            if kind == "anomaly":
+                volumes.append(replace(volume, anomaly_band=value))
+            else:
+                volumes.append(replace(volume, threshold_percent=value))
+        instances.append(replace(instance, volumes=volumes))
+    return Fleet(instances=instances)
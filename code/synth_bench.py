@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""Offline synth-time and template-size benchmark for the CDK app.
+
+Synthesizes each stack of ``app.py`` in its own ``App`` against generated
+fleets of 1, 100 and 1000 volumes, then reports per stack:
+
+* construct and synth seconds,
+* template bytes, resources, outputs and parameters of the largest template
+  (nested stacks included) against the CloudFormation limits,
+* total resources across the stack and its nested stacks.
+
+The run fails (exit 1) when a template crosses a CloudFormation limit, when
+synth time or resources per volume exceed the budgets below, or when it
+regresses against a saved baseline.
+
+    python3 synth_bench.py
+    python3 synth_bench.py --sizes 1 100 --stacks DiskMonitorStack CloudWatchAlarmStack
+    python3 synth_bench.py --save-baseline synth-baseline.json
+    python3 synth_bench.py --baseline synth-baseline.json --report synth-report.json
+"""
+import argparse
+import json
+import math
+import sys
+import time
+
+from stacks.fleet import parse_fleet
+
+FLEET_SIZES = (1, 100, 1000)
+
+STACKS = ("EnvSetupStack", "DiskMonitorStack", "RocketChatStack", "LambdaStack", "CloudWatchAlarmStack")
+
+# Volumes per generated instance, matching fleet.json
+VOLUMES_PER_INSTANCE = 3
+
+# CloudFormation quotas per template (bytes are for templates uploaded via S3)
+LIMITS = {
+    "resources": 500,
+    "outputs": 200,
+    "parameters": 200,
+    "template_bytes": 1_000_000,
+}
+
+# Budgets: whole-stack synth seconds per fleet size, and resources per volume
+# for the stacks that scale with the fleet (fixed resources are allowed on top)
+SYNTH_SECONDS = {1: 15.0, 100: 30.0, 1000: 120.0}
+RESOURCES_PER_VOLUME = {"DiskMonitorStack": 2.5, "CloudWatchAlarmStack": 1.5}
+FIXED_RESOURCES = 25
+
+# Allowed growth over a saved baseline before a run counts as a regression
+BASELINE_SECONDS_TOLERANCE = 1.5
+BASELINE_RESOURCE_TOLERANCE = 0
+
+
+def synthetic_fleet(volumes, per_instance=VOLUMES_PER_INSTANCE):
+    """A fleet of ``volumes`` volumes spread over instances of ``per_instance`` volumes each."""
+    instances = []
+    for index in range(math.ceil(volumes / per_instance)):
+        count = min(per_instance, volumes - index * per_instance)
+        instances.append({
+            "name": f"BenchNode{index + 1}",
+            "volumes": [{"name": f"vol{j}", "mount_path": f"/mnt/vol{j}"} for j in range(1, count + 1)],
+        })
+    return parse_fleet({"instances": instances})
+
+
+def _builders():
+    # Imported lazily so the fleet helpers and budget checks work without aws_cdk
+    from stacks.env_setup_stack import EnvSetupStack
+    from stacks.disk_monitor_stack import DiskMonitorStack
+    from stacks.rocketchat_stack import RocketChatStack
+    from stacks.lambda_stack import LambdaStack
+    from stacks.cloudwatch_alarm_stack import CloudWatchAlarmStack
+
+    return {
+        "EnvSetupStack": lambda app, fleet: EnvSetupStack(app, "EnvSetupStack"),
+        "DiskMonitorStack": lambda app, fleet: DiskMonitorStack(app, "DiskMonitorStack", fleet=fleet),
+        "RocketChatStack": lambda app, fleet: RocketChatStack(app, "RocketChatStack"),
+        "LambdaStack": lambda app, fleet: LambdaStack(app, "LambdaStack"),
+        "CloudWatchAlarmStack": lambda app, fleet: CloudWatchAlarmStack(app, "CloudWatchAlarmStack", fleet=fleet),
+    }
+
+
+def template_stats(template):
+    """Size and counts of one synthesized template dict."""
+    return {
+        "template_bytes": len(json.dumps(template, separators=(",", ":"))),
+        "resources": len(template.get("Resources", {})),
+        "outputs": len(template.get("Outputs", {})),
+        "parameters": len(template.get("Parameters", {})),
+    }
+
+
+def measure_stack(name, fleet):
+    """Synthesize one stack in a fresh App and return its timings and template stats."""
+    from aws_cdk import App, Stack
+    from aws_cdk.assertions import Template
+
+    app = App()
+    started = time.perf_counter()
+    stack = _builders()[name](app, fleet)
+    constructed = time.perf_counter()
+    templates = {stack.stack_name: Template.from_stack(stack).to_json()}
+    synthesized = time.perf_counter()
+
+    # Nested stacks come out of the same synth as separate templates
+    for child in stack.node.find_all():
+        if isinstance(child, Stack) and child is not stack:
+            templates[child.node.path] = Template.from_stack(child).to_json()
+
+    stats = {path: template_stats(template) for path, template in templates.items()}
+    largest = {key: max(s[key] for s in stats.values()) for key in LIMITS}
+    return {
+        "construct_seconds": round(constructed - started, 3),
+        "synth_seconds": round(synthesized - constructed, 3),
+        "seconds": round(synthesized - started, 3),
+        "templates": len(templates),
+        "total_resources": sum(s["resources"] for s in stats.values()),
+        "largest": largest,
+    }
+
+
+def run_benchmark(sizes=FLEET_SIZES, stacks=STACKS, quiet=True):
+    """Measure every stack at every fleet size; returns {size: {stack: result}}."""
+    report = {}
+    for size in sizes:
+        fleet = synthetic_fleet(size)
+        report[size] = {}
+        for name in stacks:
+            report[size][name] = measure_stack(name, fleet)
+            if not quiet:
+                print(f"{size:>6} volumes  {name:<22} {report[size][name]['seconds']:>8.2f}s", file=sys.stderr)
+    return report
+
+
+def check_budget(report, baseline=None):
+    """Return a list of budget violations (empty when the run passes)."""
+    violations = []
+    for size, stacks in report.items():
+        size = int(size)
+        for name, result in stacks.items():
+            for key, limit in LIMITS.items():
+                if result["largest"][key] > limit:
+                    violations.append(f"{name} @ {size} volumes: {key} {result['largest'][key]} > limit {limit}")
+            seconds_budget = SYNTH_SECONDS.get(size)
+            if seconds_budget is not None and result["seconds"] > seconds_budget:
+                violations.append(f"{name} @ {size} volumes: synth {result['seconds']:.2f}s > budget {seconds_budget}s")
+            per_volume = RESOURCES_PER_VOLUME.get(name)
+            if per_volume is not None:
+                allowed = FIXED_RESOURCES + per_volume * size
+                if result["total_resources"] > allowed:
+                    violations.append(
+                        f"{name} @ {size} volumes: {result['total_resources']} resources > budget {allowed:.0f}"
+                    )
+
+            previous = (baseline or {}).get(str(size), {}).get(name)
+            if previous is None:
+                continue
+            if result["seconds"] > previous["seconds"] * BASELINE_SECONDS_TOLERANCE:
+                violations.append(
+                    f"{name} @ {size} volumes: synth {result['seconds']:.2f}s regressed from {previous['seconds']:.2f}s"
+                )
+            if result["total_resources"] > previous["total_resources"] + BASELINE_RESOURCE_TOLERANCE:
+                violations.append(
+                    f"{name} @ {size} volumes: resources grew from {previous['total_resources']} "
+                    f"to {result['total_resources']}"
+                )
+    return violations
+
+
+def format_report(report):
+    lines = [f"{'volumes':>8}  {'stack':<22}{'seconds':>9}{'templates':>11}{'resources':>11}"
+             f"{'max res':>9}{'max bytes':>11}"]
+    for size, stacks in report.items():
+        for name, result in stacks.items():
+            lines.append(
+                f"{size:>8}  {name:<22}{result['seconds']:>9.2f}{result['templates']:>11}"
+                f"{result['total_resources']:>11}{result['largest']['resources']:>9}"
+                f"{result['largest']['template_bytes']:>11}"
+            )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(FLEET_SIZES), help="Fleet sizes in volumes")
+    parser.add_argument("--stacks", nargs="+", default=list(STACKS), choices=STACKS)
+    parser.add_argument("--baseline", help="Fail on regressions against this saved report")
+    parser.add_argument("--save-baseline", help="Write this run as the new baseline")
+    parser.add_argument("--report", help="Write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.sizes, args.stacks, quiet=False)
+    print(format_report(report))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    for path in (args.report, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    violations = check_budget(report, baseline)
+    for violation in violations:
+        print(f"BUDGET: {violation}", file=sys.stderr)
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
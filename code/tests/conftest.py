@@ -0,0 +1,13 @@
+import os
+import sys
+
+# The notifier is deployed as a flat zip, not as part of the CDK app, so make
+# its modules (and the offline bench harness) importable for the unit tests,
+# along with the instance-side tools.
+CLOUD_FORMATION_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "cloud-formation")
+)
+for subdir in ("lambda/bench", "lambda/code", "sh"):
+    path = os.path.join(CLOUD_FORMATION_DIR, subdir)
+    if path not in sys.path:
+        sys.path.insert(0, path)
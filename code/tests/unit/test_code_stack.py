@@ -1,15 +1,141 @@
-import aws_cdk as core
-import aws_cdk.assertions as assertions
+import pytest
 
-from code.code_stack import CodeStack
+core = pytest.importorskip("aws_cdk")
+assertions = pytest.importorskip("aws_cdk.assertions")
 
-# example tests. To run these tests, uncomment this file along with the example
-# resource in code/code_stack.py
-def test_sqs_queue_created():
+from stacks.cloudwatch_alarm_stack import CloudWatchAlarmStack  # noqa: E402
+from stacks.disk_monitor_stack import DiskMonitorStack  # noqa: E402
+from stacks.env_setup_stack import EnvSetupStack  # noqa: E402
+from stacks.fleet import load_fleet, parse_fleet  # noqa: E402
+from stacks.lambda_stack import LambdaStack  # noqa: E402
+from stacks.rocketchat_stack import RocketChatStack  # noqa: E402
+
+
+def test_disk_monitor_keeps_default_fleet_layout():
+    app = core.App()
+    stack = DiskMonitorStack(app, "DiskMonitorStack", fleet=load_fleet())
+    template = assertions.Template.from_stack(stack)
+
+    template.resource_count_is("AWS::EC2::Instance", 1)
+    template.resource_count_is("AWS::EC2::Volume", 3)
+    template.resource_count_is("AWS::EC2::VolumeAttachment", 3)
+    template.has_output("EBSAlertTestEC2Id", {"Export": {"Name": "DiskMonitor-EBSAlertTestEC2-InstanceId"}})
+
+
+def test_alarm_stack_creates_one_alarm_per_volume():
     app = core.App()
-    stack = CodeStack(app, "code")
+    stack = CloudWatchAlarmStack(app, "CloudWatchAlarmStack", fleet=load_fleet())
     template = assertions.Template.from_stack(stack)
 
-#     template.has_resource_properties("AWS::SQS::Queue", {
-#         "VisibilityTimeout": 300
-#     })
+    template.resource_count_is("AWS::CloudWatch::Alarm", 3)
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {"AlarmName": "mnt_vol1_high_disk_usage"})
+
+
+def test_env_setup_exports_eip_allocation_id():
+    app = core.App()
+    template = assertions.Template.from_stack(EnvSetupStack(app, "EnvSetupStack"))
+
+    template.has_output("ROCKETCHATEIPALLOCID", {})
+
+
+def test_rocketchat_capacity_profile_sets_instance_and_gp3_throughput():
+    app = core.App()
+    template = assertions.Template.from_stack(RocketChatStack(app, "RocketChatStack", capacity_profile="medium"))
+
+    template.has_parameter("RocketChatInstanceType", {"Default": "m6i.large"})
+    template.has_parameter("RocketChatEbsThroughput", {"Default": 250})
+    template.has_resource_properties("AWS::EC2::LaunchTemplate", {
+        "LaunchTemplateData": {"BlockDeviceMappings": [{"DeviceName": "/dev/xvda", "Ebs": assertions.Match.object_like(
+            {"VolumeType": "gp3", "Throughput": {"Ref": "RocketChatEbsThroughput"}})}]},
+    })
+    template.has_resource_properties("AWS::EC2::Instance", {
+        "LaunchTemplate": assertions.Match.object_like({"LaunchTemplateId": {"Ref": "RocketChatLaunchTemplate"}}),
+    })
+
+
+def test_rocketchat_without_profile_keeps_original_instance():
+    app = core.App()
+    template = assertions.Template.from_stack(RocketChatStack(app, "RocketChatStack"))
+
+    template.resource_count_is("AWS::EC2::LaunchTemplate", 0)
+    template.has_resource_properties("AWS::EC2::Instance", {"InstanceType": "t3.medium"})
+
+
+def test_alarm_stack_applies_threshold_store():
+    from stacks.thresholds import ThresholdStore
+
+    app = core.App()
+    store = ThresholdStore({"default": "80", "instance/EBSAlertTestEC2/volume/vol2": "anomaly:3"})
+    template = assertions.Template.from_stack(
+        CloudWatchAlarmStack(app, "CloudWatchAlarmStack", fleet=load_fleet(), thresholds=store))
+
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {"AlarmName": "mnt_vol1_high_disk_usage", "Threshold": 80})
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {
+        "AlarmName": "mnt_vol2_high_disk_usage",
+        "ComparisonOperator": "GreaterThanUpperThreshold",
+        "ThresholdMetricId": "band",
+    })
+
+
+def test_fleet_rollup_excludes_volumes_with_their_own_threshold():
+    # high-res publishes the no-dimension aggregate, which cannot exclude a volume
+    fleet = parse_fleet({"instances": [
+        {"name": "Web1", "profile": "high-res", "volumes": [
+            {"name": "root", "mount_path": "/"}, {"name": "data", "mount_path": "/data", "anomaly_band": 2}]},
+        {"name": "Db1", "profile": "high-res", "volumes": [{"name": "data", "mount_path": "/data"}]},
+    ]})
+    app = core.App()
+    template = assertions.Template.from_stack(
+        CloudWatchAlarmStack(app, "CloudWatchAlarmStack", fleet=fleet, alarm_mode="fleet"))
+
+    rollup = template.find_resources("AWS::CloudWatch::Alarm", {"Properties": {"AlarmName": "fleet_high_disk_usage"}})
+    [properties] = [resource["Properties"] for resource in rollup.values()]
+    assert "MetricName" not in properties
+    query, variables = properties["Metrics"][0]["Expression"]["Fn::Sub"]
+    assert query.endswith("WHERE (InstanceId != '${Web1Id}' OR path != '/data')")
+    assert variables == {"Web1Id": {"Fn::ImportValue": "DiskMonitor-Web1-InstanceId"}}
+    # The excluded volume keeps its own alarm
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {"AlarmName": "Web1_data_high_disk_usage",
+                                                                "ThresholdMetricId": "band"})
+
+
+def test_notifier_health_alarms_do_not_notify_through_the_notifier():
+    app = core.App()
+    template = assertions.Template.from_stack(CloudWatchAlarmStack(
+        app, "CloudWatchAlarmStack", fleet=load_fleet(), notifier_alarms=True, notifier_alarm_email="ops@example.com"))
+
+    template.has_resource_properties("AWS::SNS::Subscription", {"Protocol": "email", "Endpoint": "ops@example.com"})
+    for name in ("rocketchat_notifier_p99_latency", "rocketchat_notifier_failure_rate",
+                 "rocketchat_notifier_dead_lettered"):
+        template.has_resource_properties("AWS::CloudWatch::Alarm", {
+            "AlarmName": name, "AlarmActions": [{"Ref": assertions.Match.string_like_regexp("NotifierHealthTopic")}],
+        })
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {
+        "AlarmName": "rocketchat_notifier_dead_lettered", "MetricName": "RecordsDeadLettered",
+        "Statistic": "Sum", "Threshold": 0, "ComparisonOperator": "GreaterThanThreshold",
+    })
+
+
+def test_lambda_stack_default_subscribes_notifier_to_topic():
+    app = core.App()
+    template = assertions.Template.from_stack(LambdaStack(app, "LambdaStack"))
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "lambda_function.lambda_handler",
+        "Environment": {"Variables": assertions.Match.object_like({"USE_PARAMETERS_EXTENSION": "false"})},
+    })
+    template.has_resource_properties("AWS::SNS::Subscription", {"Protocol": "lambda"})
+
+
+def test_lambda_stack_parameters_extension_adds_layer():
+    app = core.App()
+    template = assertions.Template.from_stack(LambdaStack(app, "LambdaStack", parameters_extension=True))
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "lambda_function.lambda_handler",
+        "Layers": assertions.Match.any_value(),
+        "Environment": {"Variables": assertions.Match.object_like({
+            "USE_PARAMETERS_EXTENSION": "true",
+            "PARAMETERS_SECRETS_EXTENSION_CACHE_SIZE": "10",
+        })},
+    })
@@ -0,0 +1,73 @@
+from dedup import Deduplicator, DynamoDBStore, LRUStore
+
+
+class ConditionalCheckFailed(Exception):
+    response = {"Error": {"Code": "ConditionalCheckFailedException"}}
+
+
+class LocalDynamoDB:
+    """Stand-in for the boto3 DynamoDB client honouring the claim condition."""
+
+    def __init__(self):
+        self.items = {}
+        self.puts = 0
+
+    def put_item(self, TableName, Item, ConditionExpression, ExpressionAttributeValues):
+        self.puts += 1
+        key = Item["pk"]["S"]
+        now = int(ExpressionAttributeValues[":now"]["N"])
+        existing = self.items.get(key)
+        if existing is not None and int(existing["expires_at"]["N"]) >= now:
+            raise ConditionalCheckFailed()
+        self.items[key] = Item
+
+    def delete_item(self, TableName, Key):
+        self.items.pop(Key["pk"]["S"], None)
+
+
+FIELDS = {"alarm_name": "mnt_vol1_high_disk_usage", "new_state": "ALARM", "state_change_time": "t0"}
+
+
+def test_lru_expires_and_evicts():
+    store = LRUStore(capacity=2)
+
+    assert store.claim("a", 10, now=0)
+    assert not store.claim("a", 10, now=5)
+    assert store.claim("a", 10, now=11)
+
+    store.claim("b", 10, now=11)
+    store.claim("c", 10, now=11)
+    assert store.claim("a", 10, now=12)
+
+
+def test_redelivery_and_refire_are_suppressed():
+    dedup = Deduplicator(suppression_seconds=120)
+
+    assert dedup.claim("m1", FIELDS)
+    assert dedup.claim("m1", FIELDS) is None
+    assert dedup.claim("m2", dict(FIELDS, state_change_time="t1")) is None
+    assert dedup.claim("m3", dict(FIELDS, new_state="OK", state_change_time="t2"))
+
+
+def test_shared_store_dedups_across_containers():
+    table = LocalDynamoDB()
+    first = Deduplicator(remote=DynamoDBStore("dedup", client_factory=lambda: table))
+    second = Deduplicator(remote=DynamoDBStore("dedup", client_factory=lambda: table))
+
+    keys = first.claim("m1", FIELDS)
+    assert keys
+    assert second.claim("m1", FIELDS) is None
+
+    first.release(keys)
+    assert Deduplicator(remote=DynamoDBStore("dedup", client_factory=lambda: table)).claim("m1", FIELDS)
+
+
+def test_warm_duplicates_never_reach_the_shared_store():
+    table = LocalDynamoDB()
+    dedup = Deduplicator(remote=DynamoDBStore("dedup", client_factory=lambda: table))
+
+    dedup.claim("m1", FIELDS)
+    puts = table.puts
+    dedup.claim("m1", FIELDS)
+
+    assert table.puts == puts
@@ -0,0 +1,228 @@
+import io
+import json
+import threading
+
+import pytest
+
+from deploy import Orchestrator, STACKS, build_graph, load_env, output_key, run_graph, stack_inputs, variable_name
+
+# Outputs each stack "returns" from the fake cdk deploy
+FAKE_OUTPUTS = {
+    "EnvSetupStack": {output_key(name): f"{name.lower()}-value" for name in (
+        "DISK_MONITOR_SUBNET", "DISK_MONITOR_SG", "ROCKETCHAT_SUBNET", "ROCKETCHAT_SG", "ROCKETCHAT_EIP_ALLOC_ID",
+        "LAMBDA_VPC", "LAMBDA_SG", "LAMBDA_PUBLIC_SUBNET", "LAMBDA_PRIVATE_SUBNET",
+    )},
+    "DiskMonitorStack": {"EBSAlertTestEC2Id": "i-0123"},
+    "RocketChatStack": {"RocketChatInstanceId": "i-0456"},
+    "LambdaStack": {"SNSTopicArn": "arn:aws:sns:topic", "DiskThresholdParameterName": "/diskmonitor/threshold/percent"},
+    "CloudWatchAlarmStack": {},
+}
+
+# CfnParameters of each synthesized template (True: has a Default)
+FAKE_PARAMETERS = {
+    "EnvSetupStack": {"AvailabilityZone": False, "CIDRDiskMonitorVPC": False, "CIDRRocketChatVPC": False,
+                      "CIDRLambdaVPC": False, "FacilityPrefixListId": False},
+    "DiskMonitorStack": {"DiskMonitorSubnet": False, "DiskMonitorSG": False, "DiskMonitorKeyPair": True,
+                         "DiskMonitorImageId": True, "DiskMonitorSetupS3": False, "DiskMonitorSetupKey": False,
+                         "DiskFillScriptS3": False, "DiskFillScriptKey": False, "MetricsCollectorKey": True},
+    "RocketChatStack": {"RocketChatSubnet": False, "RocketChatSG": False, "RocketChatEIPAllocationId": False,
+                        "KeyPairName": True, "ImageId": True, "RocketChatSetupScriptS3": False,
+                        "RocketChatSetupScriptKey": False},
+    "LambdaStack": {"LambdaVPC": False, "LambdaSG": False, "LambdaPublicSubnet": False, "LambdaPrivateSubnet": False,
+                    "LambdaS3Bucket": False, "LambdaS3Key": False, "DiskThresholdPercent": False,
+                    "RocketChatWebhookURL": False, "AvailabilityZone": False},
+    "CloudWatchAlarmStack": {"InstanceId": False, "DiskUsageAlertsTopic": False, "DiskThresholdParamName": True},
+}
+
+
+def fake_template(stack, resources=None):
+    return {
+        "Parameters": {name: dict({"Type": "String"}, **({"Default": "x"} if default else {}))
+                       for name, default in FAKE_PARAMETERS[stack].items()},
+        "Resources": resources or {stack: {}},
+        "Outputs": {key: {"Value": "x"} for key in FAKE_OUTPUTS[stack]},
+    }
+
+
+# Only the true inputs; everything else is wired from outputs
+ENV = {
+    "AVAILABILITY_ZONE": "us-east-2a", "CIDR_DISK_MONITOR_VPC": "10.10.0.0/28",
+    "CIDR_ROCKETCHAT_VPC": "10.20.0.0/28", "CIDR_LAMBDA_VPC": "10.0.0.0/27", "FACILITY_PREFIX_LIST_ID": "pl-1",
+    "DISK_MONITOR_KEY_PAIR": "kp", "DISK_MONITOR_IMAGE_ID": "ami-1", "DISK_MONITOR_SETUP_S3": "b",
+    "DISK_MONITOR_SETUP_KEY": "k", "DISK_FILL_SCRIPT_S3": "b", "DISK_FILL_SCRIPT_KEY": "k",
+    "ROCKETCHAT_KEY_PAIR": "kp", "ROCKETCHAT_IMAGE_ID": "ami-1", "ROCKETCHAT_SETUP_SCRIPT_S3": "b",
+    "ROCKETCHAT_SETUP_SCRIPT_KEY": "k", "LAMBDA_S3_BUCKET": "b", "LAMBDA_S3_KEY": "k",
+    "DISK_THRESHOLD_PERCENT": "85", "ROCKETCHAT_WEBHOOK_URL": "https://chat.example/hooks/x",
+}
+
+
+class FakeCdk:
+    """Stands in for the cdk CLI and DescribeStacks: writes the assembly on synth and outputs on deploy."""
+
+    def __init__(self, cdk_out, stacks=None):
+        self.cdk_out = cdk_out
+        self.commands = []
+        # Deployed stacks and their outputs, shared between runs like the real account
+        self.stacks = {} if stacks is None else stacks
+        self.lock = threading.Lock()
+
+    def __call__(self, command):
+        with self.lock:
+            self.commands.append(command)
+        if command[1] == "synth":
+            self.cdk_out.mkdir(exist_ok=True)
+            (self.cdk_out / "manifest.json").write_text(json.dumps({"artifacts": {
+                "CloudWatchAlarmStack": {"dependencies": ["DiskMonitorStack", "LambdaStack", "CloudWatchAlarmStack.assets"]},
+            }}))
+            for stack in STACKS:
+                (self.cdk_out / f"{stack}.template.json").write_text(json.dumps(fake_template(stack)))
+        else:
+            stack = command[2]
+            outputs_file = command[command.index("--outputs-file") + 1]
+            with open(outputs_file, "w") as f:
+                json.dump({stack: FAKE_OUTPUTS[stack]}, f)
+            with self.lock:
+                self.stacks[stack] = FAKE_OUTPUTS[stack]
+
+    def describe(self, stack):
+        with self.lock:
+            if stack not in self.stacks:
+                return None
+            return {"StackStatus": "UPDATE_COMPLETE", "Outputs": self.stacks[stack]}
+
+    def deployed(self):
+        return [c[2] for c in self.commands if c[1] == "deploy"]
+
+
+def orchestrator(tmp_path, cdk=None, **kwargs):
+    cdk = cdk or FakeCdk(tmp_path / "cdk.out")
+    return Orchestrator(env=dict(ENV), cdk_out=str(tmp_path / "cdk.out"), cache_file=str(tmp_path / "cache.json"),
+                        runner=cdk, describe=cdk.describe, out=io.StringIO(), **kwargs), cdk
+
+
+INPUTS = stack_inputs({stack: fake_template(stack) for stack in STACKS})
+
+
+def test_parameters_and_sources_come_from_the_templates():
+    assert variable_name("RocketChatStack", "CIDRRocketChatVPC") == "CIDR_ROCKETCHAT_VPC"
+    assert variable_name("LambdaStack", "LambdaS3Bucket") == "LAMBDA_S3_BUCKET"
+    assert INPUTS["RocketChatStack"]["RocketChatEIPAllocationId"] == (
+        "ROCKETCHAT_EIP_ALLOC_ID", ("EnvSetupStack", "ROCKETCHAT_EIP_ALLOC_ID"), True)
+    assert INPUTS["LambdaStack"]["LambdaVPC"] == ("LAMBDA_VPC", ("EnvSetupStack", "LAMBDA_VPC"), True)
+    assert INPUTS["CloudWatchAlarmStack"]["InstanceId"][1] == ("DiskMonitorStack", "EBSAlertTestEC2Id")
+    # A parameter added to a stack is picked up without editing deploy.py
+    assert INPUTS["DiskMonitorStack"]["MetricsCollectorKey"] == ("METRICS_COLLECTOR_KEY", None, False)
+
+
+def test_graph_combines_manifest_and_output_wiring():
+    manifest = {"artifacts": {"CloudWatchAlarmStack": {"dependencies": ["DiskMonitorStack", "X.assets"]}}}
+
+    graph = build_graph(STACKS, manifest, INPUTS)
+
+    assert graph["EnvSetupStack"] == set()
+    assert graph["DiskMonitorStack"] == graph["RocketChatStack"] == graph["LambdaStack"] == {"EnvSetupStack"}
+    assert graph["CloudWatchAlarmStack"] == {"DiskMonitorStack", "LambdaStack"}
+    # Selecting a subset drops edges to stacks that are not being deployed
+    assert build_graph(["CloudWatchAlarmStack"], manifest, INPUTS) == {"CloudWatchAlarmStack": set()}
+
+
+def test_independent_stacks_deploy_concurrently():
+    graph = build_graph(STACKS, inputs=INPUTS)
+    barrier = threading.Barrier(3, timeout=5)
+
+    def action(stack):
+        if stack in ("DiskMonitorStack", "RocketChatStack", "LambdaStack"):
+            barrier.wait()  # only passes if all three run at once
+        return "deployed"
+
+    results = run_graph(graph, action, max_workers=4)
+
+    assert {r["status"] for r in results.values()} == {"deployed"}
+
+
+def test_failure_blocks_only_dependents():
+    def action(stack):
+        if stack == "LambdaStack":
+            raise RuntimeError("boom")
+        return "deployed"
+
+    results = run_graph(build_graph(STACKS, inputs=INPUTS), action)
+
+    assert results["LambdaStack"]["status"] == "failed"
+    assert results["CloudWatchAlarmStack"]["status"] == "blocked"
+    assert results["DiskMonitorStack"]["status"] == results["RocketChatStack"]["status"] == "deployed"
+
+
+def test_cycles_are_rejected():
+    manifest = {"artifacts": {"EnvSetupStack": {"dependencies": ["DiskMonitorStack"]}}}
+
+    with pytest.raises(ValueError, match="cycle"):
+        build_graph(STACKS, manifest, INPUTS)
+
+
+def test_outputs_feed_downstream_parameters(tmp_path):
+    orch, cdk = orchestrator(tmp_path)
+
+    report = orch.run(STACKS)
+
+    assert {r["status"] for r in report["stacks"].values()} == {"deployed"}
+    alarm = next(c for c in cdk.commands if c[1] == "deploy" and c[2] == "CloudWatchAlarmStack")
+    assert "CloudWatchAlarmStack:InstanceId=i-0123" in alarm
+    assert "CloudWatchAlarmStack:DiskUsageAlertsTopic=arn:aws:sns:topic" in alarm
+    assert "--exclusively" in alarm
+    rocketchat = next(c for c in cdk.commands if c[1] == "deploy" and c[2] == "RocketChatStack")
+    assert "RocketChatStack:RocketChatEIPAllocationId=rocketchat_eip_alloc_id-value" in rocketchat
+
+
+def test_unchanged_stacks_and_app_are_skipped(tmp_path):
+    first, cdk = orchestrator(tmp_path)
+    first.run(STACKS)
+
+    second, cdk2 = orchestrator(tmp_path, FakeCdk(tmp_path / "cdk.out", cdk.stacks))
+    report = second.run(STACKS)
+
+    assert report["synth"]["cached"]
+    assert {r["status"] for r in report["stacks"].values()} == {"skipped"}
+    assert cdk2.commands == []
+
+    # A template change redeploys that stack only
+    (tmp_path / "cdk.out" / "LambdaStack.template.json").write_text('{"Resources": {"Changed": {}}}')
+    third, cdk3 = orchestrator(tmp_path, FakeCdk(tmp_path / "cdk.out", cdk.stacks))
+    report = third.run(STACKS)
+    assert cdk3.deployed() == ["LambdaStack"]
+    assert report["stacks"]["CloudWatchAlarmStack"]["status"] == "skipped"
+
+
+def test_destroyed_stacks_are_redeployed_despite_the_cache(tmp_path):
+    first, cdk = orchestrator(tmp_path)
+    first.run(STACKS)
+    del cdk.stacks["DiskMonitorStack"]
+
+    second, cdk2 = orchestrator(tmp_path, FakeCdk(tmp_path / "cdk.out", cdk.stacks))
+    report = second.run(["DiskMonitorStack", "CloudWatchAlarmStack"])
+
+    assert cdk2.deployed() == ["DiskMonitorStack"]
+    assert report["stacks"]["CloudWatchAlarmStack"]["status"] == "skipped"
+
+    # Without the upstream stack its outputs are not taken from the cache
+    del cdk.stacks["EnvSetupStack"]
+    third, _ = orchestrator(tmp_path, FakeCdk(tmp_path / "cdk.out", cdk.stacks), force=True)
+    report = third.run(["DiskMonitorStack"])
+    assert "DISK_MONITOR_SUBNET" in report["stacks"]["DiskMonitorStack"]["error"]
+
+
+def test_missing_inputs_fail_with_variable_names(tmp_path):
+    orch, _ = orchestrator(tmp_path)
+    del orch.env["LAMBDA_S3_KEY"]
+
+    report = orch.run(STACKS)
+
+    assert "LAMBDA_S3_KEY" in report["stacks"]["LambdaStack"]["error"]
+    assert report["stacks"]["CloudWatchAlarmStack"]["status"] == "blocked"
+
+
+def test_env_file_parsing(tmp_path):
+    path = tmp_path / ".env.cdk.params"
+    path.write_text('# comment\n\nLAMBDA_S3_KEY="lambda.zip"\nDISK_THRESHOLD_PERCENT=85\n')
+
+    assert load_env(str(path)) == {"LAMBDA_S3_KEY": "lambda.zip", "DISK_THRESHOLD_PERCENT": "85"}
@@ -0,0 +1,90 @@
+import os
+import shutil
+import subprocess
+from collections import namedtuple
+
+import pytest
+
+from disk_fill_tool import bytes_to_target, clear, fill, fill_many, main, parse_target, usage
+
+StatVfs = namedtuple("StatVfs", "f_frsize f_blocks f_bfree f_bavail")
+
+
+@pytest.fixture
+def loop_mounts(tmp_path):
+    """Two small ext4 loopback filesystems (skipped where mount is not allowed)."""
+    if os.geteuid() != 0 or not shutil.which("mkfs.ext4"):
+        pytest.skip("loopback mounts need root and mkfs.ext4")
+    mounts = []
+    try:
+        for name in ("vol1", "vol2"):
+            image, mount = tmp_path / f"{name}.img", tmp_path / name
+            with open(image, "wb") as f:
+                f.truncate(32 * 1024 * 1024)
+            mount.mkdir()
+            subprocess.run(["mkfs.ext4", "-q", "-m", "5", str(image)], check=True)
+            if subprocess.run(["mount", "-o", "loop", str(image), str(mount)], capture_output=True).returncode:
+                pytest.skip("loop devices unavailable")
+            mounts.append(str(mount))
+        yield mounts
+    finally:
+        for mount in mounts:
+            subprocess.run(["umount", mount], check=False)
+
+
+def test_target_bytes_from_single_statvfs():
+    # 1000 blocks of 4 KiB: 200 used, 50 root-reserved, 750 available to users
+    fake = lambda path: StatVfs(4096, 1000, 800, 750)  # noqa: E731
+
+    used, usable, percent = usage("/mnt/vol1", fake)
+
+    assert (used, usable) == (200 * 4096, 950 * 4096)
+    assert percent == pytest.approx(21.05, abs=0.01)
+    assert bytes_to_target("/mnt/vol1", 80, fake) == int(950 * 4096 * 0.8) - 200 * 4096
+    assert bytes_to_target("/mnt/vol1", 10, fake) == 0
+
+
+def test_ramp_rate_paces_allocation(tmp_path):
+    state = {"free": 1000}
+    fake = lambda path: StatVfs(4096, 1000, state["free"], state["free"])  # noqa: E731
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    result = fill(str(tmp_path), 50, rate_mb=1, chunk_mb=0.5, statvfs=fake, sleep=sleep, clock=lambda: now[0])
+
+    # 500 blocks of 4 KiB (~1.95 MB) at 1 MB/s in 0.5 MB steps
+    assert result["bytes"] == 500 * 4096
+    assert len(sleeps) == 4
+    assert result["seconds"] == pytest.approx(500 * 4096 / (1024 * 1024), abs=0.01)
+    assert os.path.getsize(result["file"]) == 500 * 4096
+
+
+def test_fills_mounts_concurrently_then_clears(loop_mounts):
+    vol1, vol2 = loop_mounts
+
+    results = fill_many([(vol1, 60), (vol2, 90)], chunk_mb=4)
+
+    assert [round(usage(path)[2]) for path in loop_mounts] == [60, 90]
+    assert all(r["bytes"] > 0 and r["end_percent"] >= r["target_percent"] - 1 for r in results)
+
+    assert clear(loop_mounts) >= sum(r["bytes"] for r in results)
+    assert usage(vol1)[2] < 5 and usage(vol2)[2] < 5
+
+
+def test_cli_accepts_shell_tool_arguments(loop_mounts, capsys):
+    vol1, vol2 = loop_mounts
+
+    assert main(["75", vol1, f"{vol2}:50"]) == 0
+    assert [round(usage(path)[2]) for path in loop_mounts] == [75, 50]
+
+    assert main(["--clear", vol1, vol2]) == 0
+    assert not any(name.startswith("fillfile_") for path in loop_mounts for name in os.listdir(path))
+
+
+def test_parse_target():
+    assert parse_target("/mnt/vol1", 85) == ("/mnt/vol1", 85)
+    assert parse_target("/mnt/vol1:95", 85) == ("/mnt/vol1", 95.0)
@@ -0,0 +1,94 @@
+import json
+from collections import namedtuple
+from types import SimpleNamespace
+
+from disk_fill_tool import usage
+from disk_metrics_collector import (
+    MAX_DATUMS_PER_CALL, CloudWatchSink, Collector, LocalSink, disk_values, main, run,
+)
+from stacks.fleet import collector_config, parse_fleet
+
+StatVfs = namedtuple("StatVfs", "f_frsize f_blocks f_bfree f_bavail f_files f_ffree")
+
+VOLUMES = {
+    "/mnt/vol1": StatVfs(4096, 1000, 100, 50, 640, 600),
+    "/mnt/vol2": StatVfs(4096, 1000, 900, 850, 640, 630),
+}
+
+
+class FakeCloudWatch:
+    def __init__(self):
+        self.calls = []
+
+    def put_metric_data(self, Namespace, MetricData):
+        self.calls.append((Namespace, MetricData))
+
+
+def collector(**kwargs):
+    rusage = iter([SimpleNamespace(ru_utime=1.0, ru_stime=0.5), SimpleNamespace(ru_utime=1.2, ru_stime=0.6)])
+    clock = iter([100.0, 110.0])
+    return Collector([("/mnt/vol1", "ext4"), ("/mnt/vol2", "xfs")], "i-0123", statvfs=VOLUMES.__getitem__,
+                     clock=lambda: next(clock), rusage=lambda: next(rusage), rss=lambda: 12_000_000, **kwargs)
+
+
+def test_used_percent_matches_df_and_the_fill_tool():
+    values = disk_values(VOLUMES["/mnt/vol1"])
+
+    assert values["used_percent"] == usage("/mnt/vol1", VOLUMES.__getitem__)[2]
+    assert values["used_percent"] == 100 * 900 / 950
+    assert values["inodes_used"] == 40
+
+
+def test_one_pass_yields_agent_shaped_datums_and_own_footprint():
+    c = collector(aggregation_dimensions=[["InstanceId"]], interval=10)
+    first = c.collect(1_700_000_000)
+    second = c.collect(1_700_000_010)
+
+    disk = [d for d in first if d["MetricName"] == "disk_used_percent"]
+    assert [d["Dimensions"] for d in disk] == [
+        [{"Name": "path", "Value": "/mnt/vol1"}, {"Name": "InstanceId", "Value": "i-0123"}, {"Name": "fstype", "Value": "ext4"}],
+        [{"Name": "InstanceId", "Value": "i-0123"}],
+        [{"Name": "path", "Value": "/mnt/vol2"}, {"Name": "InstanceId", "Value": "i-0123"}, {"Name": "fstype", "Value": "xfs"}],
+        [{"Name": "InstanceId", "Value": "i-0123"}],
+    ]
+    assert {d["StorageResolution"] for d in first} == {1}
+    # CPU needs two samples: 0.3 s of CPU over 10 s
+    assert [d["MetricName"] for d in first[-1:]] == ["procstat_memory_rss"]
+    cpu = next(d for d in second if d["MetricName"] == "procstat_cpu_usage")
+    assert cpu["Value"] == 3.0 and cpu["Dimensions"][1] == {"Name": "exe", "Value": "disk_metrics_collector"}
+
+
+def test_datums_go_out_in_as_few_calls_as_the_api_allows():
+    client = FakeCloudWatch()
+    sink = CloudWatchSink(client=client)
+
+    sink.publish(collector().collect())
+    sink.publish([{"MetricName": "x", "Value": i} for i in range(MAX_DATUMS_PER_CALL + 1)])
+
+    assert [len(data) for _, data in client.calls] == [3, MAX_DATUMS_PER_CALL, 1]
+    assert {namespace for namespace, _ in client.calls} == {"CWAgent"}
+
+
+def test_local_sink_records_requests(tmp_path):
+    out = tmp_path / "metrics.jsonl"
+    sink = LocalSink(path=str(out))
+
+    assert run(collector(), sink, interval=10, iterations=2, sleep=lambda s: None) == 2
+
+    requests = [json.loads(line) for line in out.read_text().splitlines()]
+    assert len(requests) == 2 and requests[0]["Namespace"] == "CWAgent"
+
+
+def test_config_from_the_fleet_profile_drives_the_cli(tmp_path):
+    fleet = parse_fleet({
+        "profiles": {"lean": {"interval": 30, "inodes": True, "collector": "python"}},
+        "instances": [{"name": "Web1", "profile": "lean", "volumes": [{"name": "tmp", "mount_path": str(tmp_path)}]}],
+    })
+    config = tmp_path / "collector.json"
+    config.write_text(json.dumps(collector_config(fleet.instances[0])))
+    out = tmp_path / "metrics.jsonl"
+
+    main(["--config", str(config), "--instance-id", "i-1", "--sink", "local", "--local-path", str(out), "--once"])
+
+    names = {d["MetricName"] for d in json.loads(out.read_text())["MetricData"]}
+    assert {"disk_used_percent", "disk_inodes_total", "procstat_memory_rss"} <= names
@@ -0,0 +1,140 @@
+import pytest
+
+from stacks.fleet import (
+    DEVICE_NAMES, agent_config, alarm_name, fleet_filter, instance_filter, load_fleet, parse_fleet, rollup_alarm_name, rollup_query, shard,
+)
+
+
+def fleet_with(*instances):
+    return {"defaults": {"size_gb": 20}, "instances": list(instances)}
+
+
+def test_default_fleet_matches_original_layout():
+    fleet = load_fleet()
+
+    [instance] = fleet.instances
+    assert instance.legacy
+    assert [v.mount_path for v in instance.volumes] == ["/mnt/vol1", "/mnt/vol2", "/mnt/vol3"]
+    assert [d for _, d in instance.devices()] == ["/dev/xvdf", "/dev/xvdg", "/dev/xvdh"]
+    assert [alarm_name(instance, v) for v in instance.volumes] == [
+        "mnt_vol1_high_disk_usage", "mnt_vol2_high_disk_usage", "mnt_vol3_high_disk_usage",
+    ]
+    assert instance.logical_id("EBSVolume1") == "EBSVolume1"
+
+
+def test_defaults_apply_and_volumes_override():
+    fleet = parse_fleet(fleet_with({
+        "name": "Web1",
+        "instance_type": "m6i.large",
+        "volumes": [
+            {"name": "data", "mount_path": "/data", "threshold_percent": 90},
+            {"name": "logs", "mount_path": "/var/log/app", "size_gb": 50, "fstype": "xfs"},
+        ],
+    }))
+
+    [instance] = fleet.instances
+    data, logs = instance.volumes
+    assert (data.size_gb, data.threshold_percent, data.fstype) == (20, 90, "ext4")
+    assert (logs.size_gb, logs.threshold_percent, logs.fstype) == (50, None, "xfs")
+    assert instance.logical_id("EBSVolume1") == "Web1EBSVolume1"
+    assert alarm_name(instance, logs) == "Web1_var_log_app_high_disk_usage"
+    assert instance.resource_count == 5
+
+
+@pytest.mark.parametrize("instances", [
+    [],
+    [{"name": "web-1", "volumes": []}],
+    [{"name": "Web", "volumes": []}, {"name": "Web", "volumes": []}],
+    [{"name": "Web", "volumes": [{"name": "a", "mount_path": "/a"}, {"name": "b", "mount_path": "/a"}]}],
+    [{"name": "Web", "volumes": [{"name": "a", "mount_path": "relative"}]}],
+    [{"name": "Web", "volumes": [
+        {"name": f"v{i}", "mount_path": f"/mnt/v{i}"} for i in range(len(DEVICE_NAMES) + 1)
+    ]}],
+])
+def test_invalid_fleets_are_rejected(instances):
+    with pytest.raises(ValueError):
+        parse_fleet(fleet_with(*instances))
+
+
+def test_shard_respects_budget_and_item_cap():
+    assert shard([3, 3, 3], weight=lambda n: n, budget=6) == [[3, 3], [3]]
+    assert shard([1, 1, 1, 1, 1], weight=lambda n: n, max_items=2) == [[1, 1], [1, 1], [1]]
+    # An item heavier than the budget still gets a shard of its own
+    assert shard([10, 1], weight=lambda n: n, budget=5) == [[10], [1]]
+
+
+def test_large_fleet_shards_under_resource_limit():
+    fleet = parse_fleet(fleet_with(*[
+        {"name": f"Node{i}", "volumes": [{"name": f"v{j}", "mount_path": f"/mnt/v{j}"} for j in range(5)]}
+        for i in range(200)
+    ]))
+
+    shards = shard(fleet.instances, lambda instance: instance.resource_count)
+    assert sum(len(group) for group in shards) == 200
+    assert all(sum(i.resource_count for i in group) <= 450 for group in shards)
+
+
+def test_instance_rollup_skips_volumes_with_their_own_threshold():
+    [instance] = parse_fleet(fleet_with({"name": "Web1", "volumes": [
+        {"name": "root", "mount_path": "/"},
+        {"name": "data", "mount_path": "/data", "threshold_percent": 95},
+    ]})).instances
+
+    assert rollup_alarm_name(instance) == "Web1_high_disk_usage"
+    assert rollup_query(instance_filter(instance, "i-1")) == (
+        'SELECT MAX(disk_used_percent) FROM SCHEMA("CWAgent", InstanceId, fstype, path) '
+        "WHERE InstanceId = 'i-1' AND path != '/data'"
+    )
+
+
+def test_fleet_rollup_skips_volumes_with_their_own_threshold_on_their_instance_only():
+    fleet = parse_fleet(fleet_with(
+        {"name": "Web1", "volumes": [{"name": "data", "mount_path": "/data", "threshold_percent": 95}]},
+        {"name": "Db1", "volumes": [{"name": "root", "mount_path": "/"},
+                                    {"name": "data", "mount_path": "/data", "anomaly_band": 2},
+                                    {"name": "logs", "mount_path": "/logs", "threshold_percent": 70}]},
+        {"name": "Logs1", "volumes": [{"name": "data", "mount_path": "/data"}]},
+    ))
+
+    assert fleet_filter(fleet.instances, lambda instance: instance.name.lower()) == (
+        "(InstanceId != 'web1' OR path != '/data') AND "
+        "(InstanceId != 'db1' OR (path != '/data' AND path != '/logs'))"
+    )
+    assert fleet_filter(fleet.instances[2:], lambda instance: instance.name) is None
+
+
+def test_collection_profiles_drive_agent_config_and_alarm_period():
+    fleet = parse_fleet({
+        "profiles": {"archive": {"interval": 300}},
+        "instances": [
+            {"name": "Db1", "profile": "high-res", "volumes": [{"name": "data", "mount_path": "/data"}]},
+            {"name": "Logs1", "profile": "archive", "volumes": [{"name": "logs", "mount_path": "/logs"}]},
+            {"name": "Web1", "volumes": [{"name": "root", "mount_path": "/"}]},
+        ],
+    })
+    db, logs, web = fleet.instances
+
+    config = agent_config(db)["metrics"]
+    assert config["metrics_collected"]["disk"]["metrics_collection_interval"] == 10
+    assert "inodes_used" in config["metrics_collected"]["disk"]["measurement"]
+    assert "write_bytes" in config["metrics_collected"]["diskio"]["measurement"]
+    assert config["aggregation_dimensions"] == [["InstanceId"], []]
+    assert config["append_dimensions"] == {"InstanceId": "${aws:InstanceId}"}
+    assert db.profile.alarm_period == 10
+
+    assert logs.profile.alarm_period == 300
+    web_config = agent_config(web)["metrics"]
+    assert web_config["metrics_collected"]["disk"]["resources"] == ["/"]
+    assert "diskio" not in web_config["metrics_collected"]
+    assert "aggregation_dimensions" not in web_config
+
+
+@pytest.mark.parametrize("profiles, profile", [
+    ({}, "missing"),
+    ({"odd": {"interval": 45}}, "odd"),
+    ({"lean": {"collector": "statsd"}}, "lean"),
+    ({"lean": {"collector": "python", "diskio": True}}, "lean"),
+])
+def test_invalid_profiles_are_rejected(profiles, profile):
+    with pytest.raises(ValueError):
+        parse_fleet({"profiles": profiles, "instances": [{"name": "Web1", "profile": profile, "volumes": []}]})
@@ -0,0 +1,149 @@
+import math
+from datetime import datetime, timezone
+
+import forecast
+from forecast import (
+    fetch_series, forecast as forecast_volumes, hours_to_full, instance_batches, search_expression,
+    series_from_results,
+)
+from templates import TemplateRegistry
+
+NOW = 1_700_000_000
+
+
+def recorded(label, start_percent, percent_per_hour, points=12, step=300):
+    """A GetMetricData result as recorded from the console/CLI (ISO timestamps)."""
+    times = [NOW - (points - 1 - i) * step for i in range(points)]
+    return {
+        "Label": label,
+        "Timestamps": [datetime.fromtimestamp(t, timezone.utc).isoformat() for t in times],
+        "Values": [start_percent + percent_per_hour * (t - times[0]) / 3600 for t in times],
+    }
+
+
+class FakeCloudWatch:
+    def __init__(self, pages, metrics=()):
+        self.pages = list(pages)
+        self.metrics = list(metrics)
+        self.requests = []
+
+    def get_metric_data(self, **kwargs):
+        self.requests.append(dict(kwargs))
+        return self.pages.pop(0)
+
+    def get_paginator(self, operation):
+        assert operation == "list_metrics"
+        metrics = self.metrics
+
+        class Paginator:
+            def paginate(self, **kwargs):
+                yield {"Metrics": metrics}
+
+        return Paginator()
+
+
+def test_linear_projection_matches_constant_fill_rate():
+    series = series_from_results([recorded("i-1|/mnt/vol1|ext4", 50.0, 5.0)])
+    points = series[("i-1", "/mnt/vol1", "ext4")]
+
+    # 11 steps of 5 minutes at 5%/h: now at ~54.6%, full ~9.1h later
+    assert abs(hours_to_full(points, NOW, "linear") - (100 - points[-1][1]) / 5.0) < 1e-6
+
+
+def test_exponential_model_projects_growth():
+    times = [NOW - (11 - i) * 300 for i in range(12)]
+    points = [(t, 10.0 * math.exp(0.2 * (t - NOW) / 3600)) for t in times]
+
+    # 10% growing e^(0.2/h) reaches 100% after ln(10)/0.2 hours
+    assert abs(hours_to_full(points, NOW, "exponential") - math.log(10) / 0.2) < 1e-6
+
+
+def test_only_volumes_filling_within_horizon_warn():
+    series = series_from_results([
+        recorded("i-1|/mnt/vol1|ext4", 60.0, 10.0),   # ~3.1h to full
+        recorded("i-1|/mnt/vol2|ext4", 20.0, 0.5),    # days away
+        recorded("i-1|/mnt/vol3|ext4", 70.0, -2.0),   # draining
+        recorded("i-2|/data|xfs", 90.0, 1.0, points=3),  # too few points
+    ])
+
+    warnings = forecast_volumes(series, NOW, horizon_hours=6, model="linear", min_points=6)
+
+    assert [(w["instance_id"], w["path"]) for w in warnings] == [("i-1", "/mnt/vol1")]
+    message = TemplateRegistry().render(warnings[0])
+    assert message.startswith("*Disk Fill Forecast*")
+    assert "rising 10.0%/h" in message
+    assert "Projected full in *3.1h*" in message
+
+
+def test_fetch_series_follows_pagination_and_merges_series():
+    first = recorded("i-1|/mnt/vol1|ext4", 50.0, 5.0)
+    half = len(first["Values"]) // 2
+    pages = [
+        {"MetricDataResults": [dict(first, Timestamps=first["Timestamps"][:half], Values=first["Values"][:half])],
+         "NextToken": "next"},
+        {"MetricDataResults": [dict(first, Timestamps=first["Timestamps"][half:], Values=first["Values"][half:])]},
+    ]
+    client = FakeCloudWatch(pages)
+
+    series = fetch_series(client, NOW, lookback_hours=1)
+
+    assert len(series[("i-1", "/mnt/vol1", "ext4")]) == len(first["Values"])
+    assert client.requests[1]["NextToken"] == "next"
+    assert "SEARCH(" in client.requests[0]["MetricDataQueries"][0]["Expression"]
+
+
+def test_full_search_is_repeated_per_batch_of_instances(monkeypatch):
+    monkeypatch.setattr(forecast, "SEARCH_LIMIT", 4)
+    monkeypatch.setattr(forecast, "SEARCH_MAX_CHARS", len(search_expression(forecast.PERIOD_SECONDS, ["i-0", "i-1"])))
+    volumes = [f"i-{n}|/mnt/vol{v}|ext4" for n in range(3) for v in range(2)]
+    truncated = {"MetricDataResults": [recorded(label, 50.0, 1.0) for label in volumes[:4]]}
+    batches = [{"MetricDataResults": [recorded(label, 50.0, 1.0) for label in volumes[:4]]},
+               {"MetricDataResults": [recorded(label, 50.0, 1.0) for label in volumes[4:]]}]
+    metrics = [{"Dimensions": [{"Name": "InstanceId", "Value": label.split("|")[0]},
+                               {"Name": "path", "Value": label.split("|")[1]}]} for label in volumes]
+    client = FakeCloudWatch([truncated] + batches, metrics)
+
+    series = fetch_series(client, NOW, lookback_hours=1)
+
+    assert len(series) == 6
+    expressions = [r["MetricDataQueries"][0]["Expression"] for r in client.requests]
+    assert '(InstanceId="i-0" OR InstanceId="i-1")' in expressions[1]
+    assert '(InstanceId="i-2")' in expressions[2]
+
+
+def test_instance_batches_stay_within_the_search_length_limit():
+    instance_ids = [f"i-{n:017x}" for n in range(200)]
+
+    batches = list(instance_batches(300, instance_ids))
+
+    assert [i for batch in batches for i in batch] == instance_ids
+    assert all(len(search_expression(300, batch)) <= 1024 for batch in batches)
+    assert len(batches[0]) > 10
+
+
+def test_rate_is_the_fitted_slope_not_the_endpoints():
+    result = recorded("i-1|/mnt/vol1|ext4", 60.0, 10.0)
+    # A spike in the last sample doubles the endpoint rate but barely moves the fit
+    result["Values"][-1] += 5.0
+    warnings = forecast_volumes(series_from_results([result]), NOW, horizon_hours=6, model="linear")
+
+    assert 10.0 < warnings[0]["rate_per_hour"] < 13.0
+
+
+def test_handler_warns_once_per_repeat_window(monkeypatch):
+    import lambda_function
+    from dedup import Deduplicator
+
+    posts = []
+    page = {"MetricDataResults": [recorded("i-1|/mnt/vol1|ext4", 80.0, 10.0)]}
+    monkeypatch.setattr(forecast, "_client", FakeCloudWatch([page, page]))
+    monkeypatch.setattr(forecast, "deduplicator", Deduplicator(suppression_seconds=3600))
+    monkeypatch.setattr(lambda_function.parameters, "get", lambda name: "https://chat.example/hooks/x")
+    monkeypatch.setattr(lambda_function, "post_message", lambda url, message: posts.append(message) or 200)
+
+    first = forecast.lambda_handler({}, None)
+    second = forecast.lambda_handler({}, None)
+
+    assert (first["warnings"], first["posted"]) == (1, 1)
+    assert (second["warnings"], second["posted"]) == (1, 0)
+    assert len(posts) == 1
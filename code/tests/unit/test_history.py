@@ -0,0 +1,185 @@
+import base64
+import json
+import time
+
+import pytest
+
+import lambda_function
+from dedup import Deduplicator
+from history import (
+    DynamoDBHistory, SQLiteHistory, lambda_handler, parse_command, render_history, summarize,
+)
+from ssm_cache import ParameterCache
+from stubs import StubRocketChat, StubSSM, synth_event
+
+NOW = 1767312000.0
+
+
+def entry(minutes_ago, state, old_state, volume="/mnt/vol1", value=None, instance="i-1"):
+    return {"instance": instance, "volume": volume, "at": NOW - minutes_ago * 60,
+            "alarm": f"{volume.strip('/').replace('/', '_')}_high_disk_usage", "state": state,
+            "old_state": old_state, "value": value}
+
+
+class FakeDynamoDB:
+    """Enough of BatchWriteItem/Query, over the table key and the volume-time index."""
+
+    def __init__(self, unprocessed_once=False):
+        self.items = {}
+        self.unprocessed_once = unprocessed_once
+        self.queries = []
+
+    def batch_write_item(self, RequestItems):
+        (table, requests), = RequestItems.items()
+        assert len(requests) <= 25
+        if self.unprocessed_once:
+            self.unprocessed_once = False
+            return {"UnprocessedItems": RequestItems}
+        for request in requests:
+            item = request["PutRequest"]["Item"]
+            self.items[(item["pk"]["S"], item["sk"]["S"])] = item
+        return {"UnprocessedItems": {}}
+
+    def query(self, TableName, KeyConditionExpression, ExpressionAttributeValues, Limit, ScanIndexForward,
+              IndexName=None, ExpressionAttributeNames=None, ExclusiveStartKey=None):
+        self.queries.append(IndexName)
+        values = ExpressionAttributeValues
+        if IndexName:
+            low, high = float(values[":since"]["N"]), float(values[":until"]["N"])
+            items = [i for i in self.items.values()
+                     if i["vk"]["S"] == values[":key"]["S"] and low <= float(i["at"]["N"]) <= high]
+            items.sort(key=lambda i: float(i["at"]["N"]))
+        else:
+            items = sorted((i for i in self.items.values() if i["pk"]["S"] == values[":key"]["S"]
+                            and values[":since"]["S"] <= i["sk"]["S"] <= values[":until"]["S"]),
+                           key=lambda i: i["sk"]["S"])
+        if not ScanIndexForward:
+            items.reverse()
+        return {"Items": items[:Limit]}
+
+
+@pytest.fixture(params=["sqlite", "dynamodb"])
+def store(request):
+    if request.param == "sqlite":
+        return SQLiteHistory()
+    client = FakeDynamoDB()
+    return DynamoDBHistory("history", client_factory=lambda: client)
+
+
+def test_store_queries_by_instance_volume_and_window(store):
+    store.append([
+        entry(300, "ALARM", "OK"),
+        entry(120, "ALARM", "OK", value=91.0),
+        entry(60, "OK", "ALARM", value=70.0),
+        entry(30, "ALARM", "OK", volume="/mnt/vol2", value=88.0),
+        entry(10, "ALARM", "OK", instance="i-2"),
+    ])
+    # A redelivered transition is stored once
+    store.append([entry(60, "OK", "ALARM", value=70.0)])
+
+    last_3h = store.query("i-1", NOW - 3 * 3600, NOW)
+    assert [(e["volume"], e["state"]) for e in last_3h] == [("/mnt/vol1", "ALARM"), ("/mnt/vol1", "OK"),
+                                                            ("/mnt/vol2", "ALARM")]
+    assert [e["at"] for e in store.query("i-1", NOW - 3 * 3600, NOW, volume="/mnt/vol2")] == [NOW - 1800]
+    assert last_3h[0]["value"] == 91.0
+    # The limit keeps the newest transitions
+    assert [e["volume"] for e in store.query("i-1", NOW - 3 * 3600, NOW, limit=1)] == ["/mnt/vol2"]
+
+
+def test_dynamodb_retries_unprocessed_writes_in_batches_of_25():
+    client = FakeDynamoDB(unprocessed_once=True)
+    store = DynamoDBHistory("history", retention_days=7, client_factory=lambda: client)
+
+    store.append([entry(minute, "ALARM", "OK") for minute in range(30)])
+
+    assert len(client.items) == 30
+    item = next(iter(client.items.values()))
+    assert int(item["expires_at"]["N"]) == int(float(item["at"]["N"])) + 7 * 86400
+
+
+def test_summary_counts_time_in_alarm_including_alarms_open_at_either_end():
+    entries = [
+        entry(200, "OK", "ALARM"),
+        entry(120, "ALARM", "OK", value=91.0),
+        entry(60, "OK", "ALARM"),
+        entry(20, "ALARM", "OK", value=95.5),
+    ]
+
+    summary = summarize(entries, NOW - 240 * 60, NOW)[("/mnt/vol1", "mnt_vol1_high_disk_usage")]
+
+    # 40m before the first OK, 60m between, 20m still open
+    assert summary["alarm_seconds"] == 120 * 60
+    assert summary["alarms"] == 2 and summary["peak"] == 95.5 and summary["state"] == "ALARM"
+    text = render_history("i-1", entries, 240 * 60, NOW)
+    assert "2 alarm(s), 2h 00m in ALARM, peak 95.5%, now ALARM since" in text
+    assert "No alarm transitions" in render_history("i-1", [], 3600, NOW)
+
+
+def test_command_parsing():
+    assert parse_command("!diskhistory i-0abc 6h", "!diskhistory") == ("i-0abc", None, 6 * 3600)
+    assert parse_command("i-0abc /mnt/vol1") == ("i-0abc", "/mnt/vol1", 24 * 3600)
+    with pytest.raises(ValueError):
+        parse_command("i-0abc soon")
+    with pytest.raises(ValueError):
+        parse_command("!diskhistory", "!diskhistory")
+
+
+def test_notifier_records_each_transition_once(monkeypatch):
+    store = SQLiteHistory()
+    monkeypatch.setattr(lambda_function, "history", store)
+    monkeypatch.setattr(lambda_function, "deduplicator", Deduplicator())
+    with StubRocketChat() as chat:
+        monkeypatch.setattr(lambda_function, "parameters",
+                            ParameterCache(client_factory=lambda: StubSSM({"/rocketchat/webhook_url": chat.url})))
+        event = synth_event(2, alarm_prefix="history", instance_id="i-0hist")
+        lambda_function.lambda_handler(event, None)
+        lambda_function.lambda_handler(event, None)
+
+    entries = store.query("i-0hist", 0, time.time() + 60)
+    assert sorted(e["volume"] for e in entries) == ["/mnt/vol1", "/mnt/vol2"]
+    assert {(e["state"], e["old_state"], e["value"]) for e in entries} == {("ALARM", "OK", 90.3)}
+
+
+def test_history_is_written_after_the_post(monkeypatch):
+    store = SQLiteHistory()
+    posted_before_append = []
+    monkeypatch.setattr(store, "append", lambda entries: posted_before_append.append(len(chat.received)))
+    monkeypatch.setattr(lambda_function, "history", store)
+    monkeypatch.setattr(lambda_function, "deduplicator", Deduplicator())
+    with StubRocketChat() as chat:
+        monkeypatch.setattr(lambda_function, "parameters",
+                            ParameterCache(client_factory=lambda: StubSSM({"/rocketchat/webhook_url": chat.url})))
+        lambda_function.lambda_handler(synth_event(3, alarm_prefix="history-order"), None)
+
+    # The history write is off the alarm-to-chat path
+    assert posted_before_append == [3]
+
+
+def test_command_handler_checks_token_and_answers_from_the_store(monkeypatch):
+    store = SQLiteHistory()
+    store.append([dict(entry(0, "ALARM", "OK", value=92.0), at=time.time() - 600)])
+    monkeypatch.setattr(lambda_function, "history", store)
+    monkeypatch.setattr(lambda_function, "parameters",
+                        ParameterCache(client_factory=lambda: StubSSM({"/rocketchat/history_token": "s3cret"})))
+
+    def invoke(payload):
+        body = base64.b64encode(json.dumps(payload).encode()).decode()
+        response = lambda_handler({"body": body, "isBase64Encoded": True}, None)
+        return response["statusCode"], json.loads(response["body"])["text"]
+
+    assert invoke({"token": "wrong", "text": "i-1"})[0] == 403
+    assert invoke({"token": "s3crét", "text": "i-1"})[0] == 403
+    status, text = invoke({"token": "s3cret", "trigger_word": "!diskhistory", "text": "!diskhistory i-1 1h"})
+    assert status == 200 and "mnt/vol1" in text and "now ALARM since" in text
+
+    monkeypatch.setattr(lambda_function, "history", None)
+    assert invoke({"token": "s3cret", "text": "i-1"})[0] == 503
+
+
+def test_command_handler_without_a_stored_token_is_unavailable(monkeypatch):
+    monkeypatch.setattr(lambda_function, "history", SQLiteHistory())
+    monkeypatch.setattr(lambda_function, "parameters", ParameterCache(client_factory=lambda: StubSSM({})))
+
+    response = lambda_handler({"token": "anything", "text": "i-1"}, None)
+
+    assert response["statusCode"] == 503
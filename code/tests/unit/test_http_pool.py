@@ -0,0 +1,137 @@
+import json
+import socket
+import threading
+import time
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import http_pool
+from http_pool import WebhookClient
+
+
+class StubRocketChat(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = set()
+    statuses = []
+    received = []
+    delays = []
+    retry_after = "0"
+
+    def do_POST(self):
+        StubRocketChat.connections.add(self.client_address)
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        StubRocketChat.received.append(json.loads(body))
+        if StubRocketChat.delays:
+            time.sleep(StubRocketChat.delays.pop(0))
+        status = StubRocketChat.statuses.pop(0) if StubRocketChat.statuses else 200
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", StubRocketChat.retry_after)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    StubRocketChat.connections = set()
+    StubRocketChat.statuses = []
+    StubRocketChat.received = []
+    StubRocketChat.delays = []
+    StubRocketChat.retry_after = "0"
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubRocketChat)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/hooks/abc/token"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_connections_are_reused(server):
+    client = WebhookClient(pool_size=2)
+
+    for i in range(5):
+        assert client.post_json(server, {"text": str(i)}) == 200
+
+    assert len(StubRocketChat.received) == 5
+    assert len(StubRocketChat.connections) == 1
+
+
+def test_throttled_posts_are_retried(server):
+    StubRocketChat.statuses = [429, 503]
+    client = WebhookClient(max_retries=2, backoff_base=0.01)
+
+    assert client.post_json(server, {"text": "hi"}) == 200
+    assert len(StubRocketChat.received) == 3
+
+
+def test_retry_budget_is_bounded(server):
+    StubRocketChat.statuses = [503, 503]
+    client = WebhookClient(max_retries=1, backoff_base=0.01)
+
+    with pytest.raises(urllib.error.HTTPError) as exc:
+        client.post_json(server, {"text": "hi"})
+    assert exc.value.code == 503
+
+
+def test_read_timeout_after_sending_is_not_retried(server):
+    StubRocketChat.delays = [0.5]
+    client = WebhookClient(read_timeout=0.1, max_retries=2, backoff_base=0.01)
+
+    with pytest.raises(socket.timeout):
+        client.post_json(server, {"text": "hi"})
+    # Rocket.Chat may well have posted it; a retry would duplicate the message
+    assert len(StubRocketChat.received) == 1
+
+
+def test_connect_errors_are_retried(server, monkeypatch):
+    connect = http_pool.ConnectionPool._connect
+    failures = [ConnectionRefusedError("refused")]
+
+    def flaky(pool):
+        if failures:
+            raise failures.pop()
+        return connect(pool)
+
+    monkeypatch.setattr(http_pool.ConnectionPool, "_connect", flaky)
+    client = WebhookClient(max_retries=1, backoff_base=0.01)
+
+    assert client.post_json(server, {"text": "hi"}) == 200
+    assert len(StubRocketChat.received) == 1
+
+
+def test_retries_stop_before_the_total_timeout(server):
+    StubRocketChat.statuses = [503, 503]
+    # One more attempt could take up to 3 + 5 s, past the 1 s budget
+    client = WebhookClient(max_retries=2, backoff_base=0.01, total_timeout=1.0)
+
+    with pytest.raises(urllib.error.HTTPError):
+        client.post_json(server, {"text": "hi"})
+    assert len(StubRocketChat.received) == 1
+
+
+def test_retry_after_is_honoured_beyond_the_backoff_cap(server):
+    StubRocketChat.statuses = [429]
+    StubRocketChat.retry_after = "0.3"
+    client = WebhookClient(connect_timeout=0.5, read_timeout=0.5, backoff_cap=0.1, total_timeout=5.0)
+
+    started = time.monotonic()
+    assert client.post_json(server, {"text": "hi"}) == 200
+    assert time.monotonic() - started >= 0.3
+
+
+def test_retry_after_past_the_total_timeout_is_raised_to_the_caller(server):
+    StubRocketChat.statuses = [429]
+    StubRocketChat.retry_after = "30"
+    client = WebhookClient(max_retries=2, total_timeout=20.0)
+
+    started = time.monotonic()
+    with pytest.raises(urllib.error.HTTPError) as exc:
+        client.post_json(server, {"text": "hi"})
+    assert exc.value.code == 429 and exc.value.headers["Retry-After"] == "30"
+    assert time.monotonic() - started < 1.0 and len(StubRocketChat.received) == 1
@@ -0,0 +1,139 @@
+import json
+
+import pytest
+
+import lambda_function
+from dedup import Deduplicator
+from ssm_cache import ParameterCache
+
+
+class FakeSSM:
+    def __init__(self, value="https://chat.example/hooks/abc"):
+        self.value = value
+        self.calls = 0
+
+    def get_parameter(self, Name, WithDecryption):
+        self.calls += 1
+        return {"Parameter": {"Name": Name, "Value": self.value}}
+
+
+def make_record(message_id, path="/mnt/vol1"):
+    alarm = {
+        "AlarmName": f"mnt_{path.rsplit('/', 1)[-1]}_high_disk_usage",
+        "NewStateValue": "ALARM",
+        "NewStateReason": "Threshold Crossed",
+        "Trigger": {
+            "Namespace": "CWAgent",
+            "MetricName": "disk_used_percent",
+            "Dimensions": [
+                {"name": "InstanceId", "value": "i-0123456789abcdef0"},
+                {"name": "path", "value": path},
+                {"name": "fstype", "value": "ext4"},
+            ]
+        },
+    }
+    return {"Sns": {"MessageId": message_id, "Message": json.dumps(alarm)}}
+
+
+@pytest.fixture(autouse=True)
+def fresh_dedup(monkeypatch):
+    monkeypatch.setattr(lambda_function, "deduplicator", Deduplicator())
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    ssm = FakeSSM()
+    monkeypatch.setattr(lambda_function, "parameters", ParameterCache(client_factory=lambda: ssm))
+    posted = []
+
+    def fake_post(url, message):
+        if "vol2" in message:
+            raise OSError("connection reset")
+        posted.append(message)
+        return 200
+
+    monkeypatch.setattr(lambda_function, "post_message", fake_post)
+    return posted
+
+
+def test_every_record_is_delivered(webhook):
+    event = {"Records": [make_record("m1"), make_record("m3", "/mnt/vol3")]}
+
+    result = lambda_function.lambda_handler(event, None)
+
+    assert result["statusCode"] == 200
+    assert len(webhook) == 2
+    assert result["batchItemFailures"] == []
+
+
+def test_failures_are_reported_per_record(webhook):
+    bad = {"Sns": {"MessageId": "m0", "Message": "not json"}}
+    event = {"Records": [bad, make_record("m1"), make_record("m2", "/mnt/vol2")]}
+
+    result = lambda_function.lambda_handler(event, None)
+
+    assert result["statusCode"] == 207
+    assert len(webhook) == 1
+    assert result["batchItemFailures"] == [{"itemIdentifier": "m0"}, {"itemIdentifier": "m2"}]
+
+
+def test_rotated_webhook_is_refetched(monkeypatch):
+    import urllib.error
+
+    ssm = FakeSSM(value="https://chat.example/hooks/old")
+    monkeypatch.setattr(lambda_function, "parameters", ParameterCache(client_factory=lambda: ssm))
+    lambda_function.parameters.get("/rocketchat/webhook_url")
+    ssm.value = "https://chat.example/hooks/new"
+
+    def fake_post(url, message):
+        if url.endswith("/old"):
+            raise urllib.error.HTTPError(url, 404, "Not Found", {}, None)
+        return 200
+
+    monkeypatch.setattr(lambda_function, "post_message", fake_post)
+
+    result = lambda_function.lambda_handler({"Records": [make_record("m1")]}, None)
+
+    assert result["statusCode"] == 200
+    assert ssm.calls == 2
+
+
+def test_digest_mode_posts_one_message_per_instance(webhook, monkeypatch):
+    monkeypatch.setattr(lambda_function, "DIGEST_MODE", "instance")
+    records = [
+        {"messageId": f"sqs-{i}", "body": json.dumps({"MessageId": f"m{i}", "Message": make_record(f"m{i}", path)["Sns"]["Message"]})}
+        for i, path in enumerate(["/mnt/vol1", "/mnt/vol3", "/mnt/vol4"])
+    ]
+
+    result = lambda_function.lambda_handler({"Records": records}, None)
+
+    assert result["statusCode"] == 200
+    assert result["deliveries"] == 1
+    assert len(webhook) == 1
+    assert "Transitions: 3 (ALARM: 3) across 3 volume(s)" in webhook[0]
+    assert "/mnt/vol3" in webhook[0]
+
+
+def test_duplicates_are_skipped_before_ssm(webhook, monkeypatch):
+    event = {"Records": [make_record("m1"), make_record("m1")]}
+
+    first = lambda_function.lambda_handler(event, None)
+
+    assert len(webhook) == 1
+    assert sorted(r["status"] for r in first["results"]) == ["deduped", "posted"]
+
+    ssm = FakeSSM()
+    monkeypatch.setattr(lambda_function, "parameters", ParameterCache(client_factory=lambda: ssm))
+    again = lambda_function.lambda_handler({"Records": [make_record("m1")]}, None)
+
+    assert [(r["id"], r["status"]) for r in again["results"]] == [("m1", "deduped")]
+    assert ssm.calls == 0
+
+
+def test_failed_posts_stay_retryable(webhook):
+    event = {"Records": [make_record("m2", "/mnt/vol2")]}
+
+    lambda_function.lambda_handler(event, None)
+    retry = lambda_function.lambda_handler(event, None)
+
+    assert retry["batchItemFailures"] == [{"itemIdentifier": "m2"}]
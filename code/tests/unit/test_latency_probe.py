@@ -0,0 +1,47 @@
+import json
+
+from latency_probe import check_slo, delivered_entry, run_local, slo_report, stages
+from lambda_function import published_at
+
+
+def test_stage_breakdown_from_timestamps():
+    trial = {"breachAt": 100.0, "datapointAt": 130.0, "stateChangeTime": 190.0, "publishedAt": 190.2,
+             "postStartedAt": 191.0, "postedAt": 191.1}
+
+    breakdown = stages(trial)
+
+    assert breakdown["agent"] == 30.0 and breakdown["alarm"] == 60.0
+    assert round(breakdown["lambda"], 3) == 0.8 and round(breakdown["total"], 3) == 91.1
+    assert stages(dict(trial, datapointAt=None))["agent"] is None
+
+
+def test_only_matching_deliveries_are_correlated():
+    line = json.dumps({"msg": "alarm delivered", "alarm": "mnt_vol1_high_disk_usage", "state": "ALARM",
+                       "stateChangeTime": 200.0})
+
+    assert delivered_entry(line, "mnt_vol1_high_disk_usage", after=100)["stateChangeTime"] == 200.0
+    assert delivered_entry(line, "mnt_vol1_high_disk_usage", after=300) is None
+    assert delivered_entry(line, "mnt_vol2_high_disk_usage", after=100) is None
+    assert delivered_entry("START RequestId: abc", "mnt_vol1_high_disk_usage", after=100) is None
+
+
+def test_local_probe_reports_percentiles_per_stage():
+    import lambda_function
+    singletons = (lambda_function.parameters, lambda_function.deduplicator)
+
+    trials = run_local(trials=8, interval=10, period=10, flush_interval=5, latency_ms=0, jitter_ms=0)
+    assert (lambda_function.parameters, lambda_function.deduplicator) == singletons
+    report = slo_report(trials, modelled=("agent", "alarm", "sns"))
+
+    assert report["trials"] == 8
+    assert all(report["stages"][stage]["samples"] == 8 for stage in report["stages"])
+    assert report["stages"]["agent"]["max"] <= 10
+    assert report["stages"]["total"]["p99"] >= report["stages"]["total"]["p50"] > 0
+    assert report["dominant_stage"] in ("agent", "alarm")
+    assert check_slo(report, max_p99_seconds=60) == []
+    assert check_slo(report, max_p95_seconds=0)
+
+
+def test_publish_time_from_sns_and_sqs_records():
+    assert published_at({"Sns": {"Timestamp": "2024-05-01T12:00:00.500Z"}}) == 1714564800.5
+    assert published_at({"attributes": {"SentTimestamp": "1714564800500"}}) == 1714564800.5
@@ -0,0 +1,53 @@
+import io
+import json
+
+from metrics import MetricsEmitter, parse_state_change_time
+
+
+def records(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_emf_record_shape():
+    stream = io.StringIO()
+    MetricsEmitter(namespace="Test", stream=stream).emit(
+        {"RecordsPosted": (2, "Count"), "WebhookLatency": ([12.5, 30.0], "Milliseconds"), "Empty": ([], "Count")},
+        {"AlarmFamily": "disk_used_percent"},
+    )
+
+    (record,) = records(stream)
+    directive = record["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Namespace"] == "Test"
+    assert directive["Dimensions"] == [["AlarmFamily"]]
+    assert [m["Name"] for m in directive["Metrics"]] == ["RecordsPosted", "WebhookLatency"]
+    assert record["WebhookLatency"] == [12.5, 30.0]
+    assert record["AlarmFamily"] == "disk_used_percent"
+
+
+def test_invocation_metrics_per_family():
+    stream = io.StringIO()
+    changed = "2025-06-28T14:42:00.000+0000"
+    items = [{"id": "m1", "fields": {"metric": "disk_used_percent", "state_change_time": changed}}]
+    results = [
+        {"id": "m1", "status": "posted", "latencyMs": 40.0, "postedAt": parse_state_change_time(changed) + 90},
+        {"id": "m2", "status": "deduped", "family": "disk_used_percent"},
+        {"id": "m3", "status": "failed"},
+        {"id": "m4", "status": "dead-lettered"},
+    ]
+
+    MetricsEmitter(stream=stream).emit_invocation(items, results, handler_ms=55.0, ssm_ms=3.0)
+
+    family, unknown, function = records(stream)
+    assert family["AlarmFamily"] == "disk_used_percent"
+    assert (family["RecordsProcessed"], family["RecordsPosted"], family["RecordsDeduped"]) == (2, 1, 1)
+    assert family["AlarmToChatDelay"] == [90000.0]
+    assert unknown["AlarmFamily"] == "unknown" and unknown["RecordsFailed"] == 1
+    assert unknown["RecordsDeadLettered"] == 1 and family["RecordsDeadLettered"] == 0
+    assert function["HandlerLatency"] == 55.0 and function["SsmLatency"] == 3.0
+
+
+def test_disabled_emitter_is_silent():
+    stream = io.StringIO()
+    MetricsEmitter(enabled=False, stream=stream).emit({"RecordsPosted": (1, "Count")})
+
+    assert stream.getvalue() == ""
@@ -0,0 +1,33 @@
+from notifier_bench import check_budget, percentile, run_benchmark
+from stubs import synth_event
+
+
+def test_synth_event_shape():
+    event = synth_event(4, dimensions=6)
+
+    assert len(event["Records"]) == 4
+    assert len({r["Sns"]["MessageId"] for r in event["Records"]}) == 4
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 99) == 0.0
+
+
+def test_benchmark_reports_and_gates():
+    import lambda_function
+    singletons = (lambda_function.parameters, lambda_function.deduplicator, lambda_function.MAX_CONCURRENCY)
+
+    report = run_benchmark(records=5, invocations=3, throttle_rate=0.2, concurrency=2, measure_import=False)
+
+    # The run's stubs do not outlive it
+    assert (lambda_function.parameters, lambda_function.deduplicator, lambda_function.MAX_CONCURRENCY) == singletons
+
+    assert report["outcome"]["posted"] == 15
+    assert report["ssm_calls"] == 1
+    assert report["latency_ms"]["p99"] >= report["latency_ms"]["p50"]
+    assert check_budget(report, max_p99_ms=report["latency_ms"]["p99"] + 1) == []
+    assert check_budget(report, max_p99_ms=0)
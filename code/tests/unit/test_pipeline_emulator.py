@@ -0,0 +1,175 @@
+import json
+
+import lambda_function
+from pipeline_emulator import (
+    Alarm, Notifier, alarms_from_templates, emulate, format_report, load_series, load_templates, resolvers,
+    transitions,
+)
+
+START = 1767225600
+
+
+def alarm_template(threshold=None):
+    """CloudWatchAlarmStack as `cdk synth` writes it: one legacy and one imported instance."""
+    def alarm(name, instance, path):
+        return {
+            "Type": "AWS::CloudWatch::Alarm",
+            "Properties": {
+                "AlarmName": name,
+                "MetricName": "disk_used_percent",
+                "Namespace": "CWAgent",
+                "Statistic": "Average",
+                "Period": 60,
+                "EvaluationPeriods": 1,
+                "Threshold": threshold if threshold is not None else {"Ref": "DiskThresholdParamName"},
+                "ComparisonOperator": "GreaterThanThreshold",
+                "Dimensions": [
+                    {"Name": "path", "Value": path},
+                    {"Name": "InstanceId", "Value": instance},
+                    {"Name": "fstype", "Value": "ext4"},
+                ],
+                "AlarmActions": [{"Ref": "DiskUsageAlertsTopic"}],
+                "TreatMissingData": "notBreaching",
+                "Unit": "Percent",
+            },
+        }
+
+    return {
+        "Parameters": {
+            "InstanceId": {"Type": "String"},
+            "DiskUsageAlertsTopic": {"Type": "String"},
+            "DiskThresholdParamName": {"Type": "AWS::SSM::Parameter::Value<String>",
+                                       "Default": "/diskmonitor/threshold/percent"},
+        },
+        "Resources": {
+            "DiskAlarmvol1": alarm("mnt_vol1_high_disk_usage", {"Ref": "InstanceId"}, "/mnt/vol1"),
+            "web1DiskAlarmdata": alarm("web1_mnt_data_high_disk_usage",
+                                       {"Fn::ImportValue": "DiskMonitor-web1-InstanceId"}, "/mnt/data"),
+            "DiskAlarmrollup": {"Type": "AWS::CloudWatch::Alarm",
+                                "Properties": {"AlarmName": "web1_disk_usage_rollup", "Metrics": []}},
+        },
+    }
+
+
+def lambda_template(digest_window=None):
+    resources = {
+        "DiskUsageThresholdParameter": {"Type": "AWS::SSM::Parameter", "Properties": {
+            "Name": "/diskmonitor/threshold/percent", "Type": "String", "Value": {"Ref": "DiskThresholdPercent"}}},
+        "WebhookSSMParameter": {"Type": "AWS::SSM::Parameter", "Properties": {
+            "Name": "/rocketchat/webhook_url", "Type": "String", "Value": {"Ref": "RocketChatWebhookURL"}}},
+        "RocketChatNotifier": {"Type": "AWS::Lambda::Function", "Properties": {
+            "Handler": "lambda_function.lambda_handler",
+            "Environment": {"Variables": {
+                "WEBHOOK_PARAM_NAME": {"Ref": "WebhookSSMParameter"},
+                "DIGEST_MODE": "instance" if digest_window is not None else "off",
+                "DEDUP_SUPPRESSION_SECONDS": "0",
+                "DEDUP_TABLE_NAME": {"Ref": "NotifierDedupTable"},
+                "LOG_LEVEL": "INFO",
+            }},
+        }},
+    }
+    if digest_window is not None:
+        resources["RocketChatNotifierSqsEventSource"] = {"Type": "AWS::Lambda::EventSourceMapping", "Properties": {
+            "FunctionName": {"Ref": "RocketChatNotifier"}, "BatchSize": 100,
+            "MaximumBatchingWindowInSeconds": digest_window}}
+    return {
+        "Parameters": {"DiskThresholdPercent": {"Type": "String"},
+                       "RocketChatWebhookURL": {"Type": "String", "NoEcho": True}},
+        "Resources": resources,
+    }
+
+
+def series(rows):
+    return [{"timestamp": START + minute * 60, "metric": "disk_used_percent",
+             "dimensions": {"InstanceId": instance, "path": path, "fstype": "ext4"}, "value": value}
+            for minute, instance, path, value in rows]
+
+
+def test_alarms_resolve_parameters_exports_and_ssm_threshold():
+    templates = {"CloudWatchAlarmStack": alarm_template(), "LambdaStack": lambda_template()}
+    resolver_for = resolvers(templates, {"DiskThresholdPercent": "80"})
+    for resolve in resolver_for.values():
+        resolve.ssm_values = {"/diskmonitor/threshold/percent": "80"}
+
+    alarms, skipped = alarms_from_templates(templates, resolver_for)
+
+    assert skipped == ["web1_disk_usage_rollup"]
+    by_name = {alarm.name: alarm for alarm in alarms}
+    assert by_name["mnt_vol1_high_disk_usage"].dimensions["InstanceId"] == "EBSAlertTestEC2"
+    assert by_name["web1_mnt_data_high_disk_usage"].dimensions["InstanceId"] == "web1"
+    assert by_name["mnt_vol1_high_disk_usage"].threshold == 80.0
+
+
+def test_notifier_environment_and_subscription_from_template():
+    templates = {"LambdaStack": lambda_template(digest_window=30)}
+
+    notifier = Notifier.from_templates(templates, resolvers(templates))
+
+    assert notifier.environment["WEBHOOK_PARAM_NAME"] == "/rocketchat/webhook_url"
+    assert notifier.dropped == ["DEDUP_TABLE_NAME"]
+    assert notifier.via_sqs and notifier.batch_size == 100 and notifier.batching_window == 30
+
+
+def test_alarm_evaluation_only_publishes_actionable_transitions():
+    alarm = Alarm("a", "disk_used_percent", {"InstanceId": "i", "path": "/mnt/vol1", "fstype": "ext4"}, 85,
+                  evaluation_periods=2, datapoints_to_alarm=2, treat_missing_data="notBreaching")
+    rows = [(m, "i", "/mnt/vol1", v) for m, v in enumerate([80, 90, 80, 90, 91, 92, 70])]
+
+    found = transitions([alarm], series(rows))
+
+    # One breaching period is not enough with 2 of 2; OK transitions have no action
+    assert [(t["newState"], t["time"] - START) for t in found] == [("ALARM", 300)]
+    assert found[0]["reason"].startswith("Threshold Crossed: 2 out of the last 2 datapoints [91 (")
+    payload = alarm.payload(found[0])
+    assert payload["OldStateValue"] == "OK" and payload["Trigger"]["Threshold"] == 85.0
+
+
+def test_series_files_load_csv_and_json_lines(tmp_path):
+    csv_path = tmp_path / "series.csv"
+    csv_path.write_text("timestamp,instance,path,fstype,value\n120,web1,/mnt/data,,91.5\n60,web1,/mnt/data,ext4,80\n")
+    jsonl_path = tmp_path / "series.jsonl"
+    jsonl_path.write_text(json.dumps({"timestamp": "2026-01-01T00:00:00Z", "instance": "web1", "path": "/",
+                                      "value": 12, "metric": "disk_inodes_used"}) + "\n")
+
+    points = load_series(str(csv_path))
+    assert [p["timestamp"] for p in points] == [60.0, 120.0]
+    assert "fstype" not in points[1]["dimensions"]
+    assert load_series(str(jsonl_path))[0] == {"timestamp": float(START), "metric": "disk_inodes_used",
+                                               "dimensions": {"InstanceId": "web1", "path": "/"}, "value": 12.0}
+
+
+def test_emulated_pipeline_posts_each_alarm_and_dedups_redeliveries(tmp_path):
+    for name, template in {"CloudWatchAlarmStack": alarm_template(), "LambdaStack": lambda_template()}.items():
+        (tmp_path / f"{name}.template.json").write_text(json.dumps(template))
+    rows = []
+    for minute in range(10):
+        rows.append((minute, "EBSAlertTestEC2", "/mnt/vol1", 70 + minute * 3))
+        rows.append((minute, "web1", "/mnt/data", 90 if minute % 4 == 1 else 50))
+
+    report = emulate(load_templates(str(tmp_path)), series(rows), duplicate_rate=0.5, seed=1)
+
+    # vol1 crosses 85 once; web1 flaps into ALARM three times
+    assert report["alarms"] == 2 and report["states"] == {"ALARM": 4}
+    assert report["subscription"] == "sns" and report["invocations"] == 4 + report["duplicatesInjected"]
+    assert report["duplicatesInjected"] > 0 and report["deduped"] == report["duplicatesInjected"]
+    assert report["posted"] == report["messages"] == 4
+    assert report["deadLettered"] == 0
+    assert report["droppedEnvironment"] == ["DEDUP_TABLE_NAME"]
+    assert "Threshold" in report["sample"][0]["text"]
+    assert "4 posted" in format_report(report) and "0 dead-lettered" in format_report(report)
+    # The handler module is rebuilt from the test environment afterwards
+    assert lambda_function.DIGEST_MODE == "off"
+
+
+def test_digest_subscription_batches_a_storm_by_window(tmp_path):
+    for name, template in {"CloudWatchAlarmStack": alarm_template(threshold=85),
+                           "LambdaStack": lambda_template(digest_window=120)}.items():
+        (tmp_path / f"{name}.template.json").write_text(json.dumps(template))
+    rows = [(minute, "EBSAlertTestEC2", "/mnt/vol1", 95) for minute in range(3)]
+    rows += [(minute, "web1", "/mnt/data", 95) for minute in range(1, 3)]
+
+    report = emulate(load_templates(str(tmp_path)), series(rows))
+
+    assert report["subscription"] == "sqs" and report["transitions"] == 2
+    # Both transitions land inside one batching window: one invocation, one digest per instance
+    assert report["invocations"] == 1 and report["records"] == 2 and report["deliveries"] == 2
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+import lambda_function
+import retry_queue
+from dedup import Deduplicator
+from http_pool import WebhookClient
+from retry_queue import RetryQueue, parse_retry_after, retry_delay
+from ssm_cache import ParameterCache
+from stubs import StubRocketChat, StubSSM, synth_event
+
+
+class FakeSQS:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, QueueUrl, MessageBody, DelaySeconds=0):
+        self.sent.append({"queue": QueueUrl, "body": json.loads(MessageBody), "delay": DelaySeconds})
+
+
+class Ceiling:
+    def uniform(self, low, high):
+        return high
+
+
+@pytest.fixture
+def sqs(monkeypatch):
+    client = FakeSQS()
+    queue = RetryQueue("retry-url", dlq_url="dlq-url", max_attempts=2, base_delay=30, client_factory=lambda: client)
+    monkeypatch.setattr(lambda_function, "retry_queue", queue)
+    monkeypatch.setattr(lambda_function, "deduplicator", Deduplicator())
+    return client
+
+
+def as_sqs(message):
+    return {"Records": [{"messageId": "sqs-1", "body": json.dumps(message["body"])}]}
+
+
+def test_delay_doubles_per_attempt_and_honours_retry_after():
+    assert [retry_delay(n, 30, rng=Ceiling()) for n in (1, 2, 3, 6, 10)] == [30, 60, 120, 900, 900]
+    assert 15 <= retry_delay(1, 30) <= 30
+    assert retry_delay(1, 30, retry_after=120, rng=Ceiling()) == 120
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after("Thu, 01 Jan 1970 00:00:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+
+
+def test_failed_posts_are_queued_then_dead_lettered(sqs, monkeypatch):
+    with StubRocketChat(error_rate=1.0) as chat:
+        monkeypatch.setattr(lambda_function, "parameters",
+                            ParameterCache(client_factory=lambda: StubSSM({"/rocketchat/webhook_url": chat.url})))
+        monkeypatch.setattr(lambda_function, "webhook_client", WebhookClient(max_retries=0))
+
+        first = lambda_function.lambda_handler(synth_event(1), None)
+        second = lambda_function.lambda_handler(as_sqs(sqs.sent[0]), None)
+        third = lambda_function.lambda_handler(as_sqs(sqs.sent[1]), None)
+
+    assert first["statusCode"] == 202 and first["batchItemFailures"] == []
+    assert second["results"][0]["status"] == "queued"
+    assert third["results"][0]["status"] == "dead-lettered"
+    assert third["statusCode"] == 502 and third["body"].endswith(", 1 dead-lettered")
+    assert [(m["queue"], m["body"]["RetryAttempt"]) for m in sqs.sent] == [
+        ("retry-url", 1), ("retry-url", 2), ("dlq-url", 3)]
+    assert "500" in sqs.sent[-1]["body"]["LastError"]
+
+
+def test_enqueue_failure_falls_back_to_batch_item_failures(sqs, monkeypatch):
+    def broken(**kwargs):
+        raise OSError("sqs unreachable")
+
+    monkeypatch.setattr(sqs, "send_message", broken)
+    monkeypatch.setattr(lambda_function, "parameters",
+                        ParameterCache(client_factory=lambda: StubSSM({"/rocketchat/webhook_url": "http://127.0.0.1:9/x"})))
+    monkeypatch.setattr(lambda_function, "webhook_client", WebhookClient(max_retries=0, connect_timeout=0.2))
+
+    result = lambda_function.lambda_handler({"Records": [dict(synth_event(1)["Records"][0], messageId="sqs-1")]}, None)
+
+    assert result["batchItemFailures"] == [{"itemIdentifier": "sqs-1"}]
+
+
+def test_drain_honours_retry_after_and_defers_the_next_batch(sqs, monkeypatch):
+    with StubRocketChat(throttle_rate=1.0, retry_after=120) as chat:
+        monkeypatch.setattr(lambda_function, "parameters",
+                            ParameterCache(client_factory=lambda: StubSSM({"/rocketchat/webhook_url": chat.url})))
+        monkeypatch.setattr(lambda_function, "webhook_client", WebhookClient(max_retries=0))
+
+        retry_queue.lambda_handler(synth_event(1), None)
+        deferred = retry_queue.lambda_handler(as_sqs(sqs.sent[0]), None)
+
+    assert chat.statuses == {429: 1}
+    assert sqs.sent[0]["delay"] >= 120 and sqs.sent[0]["body"]["RetryAttempt"] == 1
+    # Backoff re-sends the notification as-is, without spending an attempt
+    assert deferred["batchItemFailures"] == []
+    assert 110 <= sqs.sent[1]["delay"] <= 120 and sqs.sent[1]["body"]["RetryAttempt"] == 1
@@ -0,0 +1,53 @@
+import pytest
+
+from rocketchat_loadtest import ComposeStack, compose_file, fire, format_report, nginx_conf
+from stacks.capacity import CAPACITY_PROFILES, get_profile, mongo_sizing
+from stubs import StubRocketChat
+
+
+def test_mongo_sizing_leaves_room_for_the_apps():
+    assert mongo_sizing(4096, 1) == (1.12, 4096)
+    assert mongo_sizing(16384, 4) == (6.0, 16384)
+    # Never below MongoDB's minimums
+    assert mongo_sizing(2048, 2) == (0.25, 2048)
+    assert mongo_sizing(512, 1)[1] == 990
+
+    with pytest.raises(ValueError, match="capacity_profile"):
+        get_profile("huge")
+
+
+def test_compose_puts_multiple_apps_behind_the_proxy():
+    services = compose_file(CAPACITY_PROFILES["large"])["services"]
+
+    assert sorted(services) == ["mongo", "proxy", "rocketchat1", "rocketchat2", "rocketchat3", "rocketchat4"]
+    assert services["mongo"]["command"][-4:] == ["--wiredTigerCacheSizeGB", "6.0", "--oplogSize", "16384"]
+    assert services["proxy"]["ports"] == ["3000:3000"]
+    conf = nginx_conf(4)
+    assert conf.count("server rocketchat") == 4 and "keepalive 64;" in conf
+
+
+def test_single_app_profile_serves_port_3000_directly():
+    services = compose_file(CAPACITY_PROFILES["small"])["services"]
+
+    assert "proxy" not in services
+    assert services["rocketchat1"]["ports"] == ["3001:3000", "3000:3000"]
+
+
+def test_stack_starts_the_first_app_before_the_rest(monkeypatch):
+    calls = []
+    monkeypatch.setattr("rocketchat_loadtest.wait_ready", lambda base, timeout: calls.append(("ready", base)))
+    stack = ComposeStack("medium", CAPACITY_PROFILES["medium"], runner=lambda cmd, check: calls.append(cmd[6:]))
+
+    assert stack.up() == "http://127.0.0.1:3000"
+    assert calls == [["up", "-d", "mongo", "rocketchat1"], ("ready", "http://127.0.0.1:3001"),
+                     ["up", "-d"], ("ready", "http://127.0.0.1:3002")]
+
+
+def test_fire_reports_rate_latency_and_statuses():
+    with StubRocketChat(latency=0.005, throttle_rate=0.2, seed=1) as chat:
+        result = fire(chat.url, concurrency=4, duration=0.5)
+
+    assert result["accepted"] == len(chat.received) > 0
+    assert result["messagesPerSecond"] > 0 and result["p50Ms"] >= 5
+    assert set(result["statuses"]) == {"200", "429"}
+    assert "small" in format_report({"small": dict(result, appInstances=1)})
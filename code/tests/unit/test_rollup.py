@@ -0,0 +1,97 @@
+from rollup import BreachResolver, breakdown_query, rollup_expression
+from templates import TemplateRegistry, alarm_fields
+
+INSTANCE_QUERY = (
+    'SELECT MAX(disk_used_percent) FROM SCHEMA("CWAgent", InstanceId, fstype, path) '
+    "WHERE InstanceId = 'i-1' AND path != '/data'"
+)
+
+
+class FakeCloudWatch:
+    def __init__(self, results=None, error=None):
+        self.results = results or []
+        self.error = error
+        self.queries = []
+
+    def get_metric_data(self, **kwargs):
+        self.queries.append(kwargs["MetricDataQueries"][0])
+        if self.error:
+            raise self.error
+        return {"MetricDataResults": self.results}
+
+
+def rollup_alarm(expression=INSTANCE_QUERY, threshold=80.0):
+    return {
+        "AlarmName": "Web1_high_disk_usage",
+        "NewStateValue": "ALARM",
+        "NewStateReason": "Threshold Crossed",
+        "Trigger": {
+            "Threshold": threshold,
+            "Dimensions": [],
+            "Metrics": [{"Id": "max_disk_used", "Expression": expression, "ReturnData": True}],
+        },
+    }
+
+
+def test_only_metric_insights_rollups_are_recognised():
+    assert rollup_expression(rollup_alarm()) == INSTANCE_QUERY
+    assert rollup_expression({"Trigger": {"Dimensions": [{"name": "path", "value": "/mnt/vol1"}]}}) is None
+    assert rollup_expression(rollup_alarm(expression="100 * FILL(failed, 0) / processed")) is None
+
+
+def test_breakdown_query_groups_by_volume_and_keeps_filter():
+    query = breakdown_query(INSTANCE_QUERY + " LIMIT 5", limit=10)
+
+    assert query == (
+        'SELECT MAX(disk_used_percent) FROM SCHEMA("CWAgent", InstanceId, fstype, path) '
+        "WHERE InstanceId = 'i-1' AND path != '/data' "
+        "GROUP BY InstanceId, path, fstype ORDER BY MAX() DESC LIMIT 10"
+    )
+
+
+def test_resolve_points_fields_at_worst_breaching_volume():
+    client = FakeCloudWatch(results=[
+        {"Label": "i-1|/mnt/vol1|ext4", "Values": [85.0, 70.0]},
+        {"Label": "i-1|/mnt/vol2|ext4", "Values": [92.5]},
+        {"Label": "i-1|/mnt/vol3|ext4", "Values": [40.0]},
+        {"Label": "i-1|/mnt/vol4|ext4", "Values": []},
+    ])
+    resolver = BreachResolver(client_factory=lambda: client)
+    alarm = rollup_alarm()
+
+    fields = resolver.resolve(alarm, alarm_fields(alarm), now=1_700_000_000)
+
+    assert (fields["instance_id"], fields["path"], fields["metric"]) == ("i-1", "/mnt/vol2", "disk_used_percent")
+    assert fields["breach_count"] == 2
+    assert "`/mnt/vol2` (ext4): 92.5%" in fields["breaches"].splitlines()[0]
+    assert "/mnt/vol3" not in fields["breaches"]
+    assert "GROUP BY InstanceId, path, fstype" in client.queries[0]["Expression"]
+
+    message = TemplateRegistry().render(fields)
+    assert message.startswith("*Disk Alarm Triggered*")
+    assert "Breaching volumes (2)" in message
+
+
+def test_failed_lookup_still_renders():
+    resolver = BreachResolver(client_factory=lambda: FakeCloudWatch(error=RuntimeError("throttled")))
+    alarm = rollup_alarm()
+
+    fields = resolver.resolve(alarm, alarm_fields(alarm))
+
+    assert fields["breaches"] == "unavailable"
+    assert "Breaching volumes (unknown)" in TemplateRegistry().render(fields)
+
+
+def test_aggregated_maximum_alarms_resolve_like_rollups():
+    aggregated = {"Trigger": {
+        "Namespace": "CWAgent",
+        "MetricName": "disk_used_percent",
+        "Dimensions": [{"name": "InstanceId", "value": "i-1"}],
+    }}
+    fleet_wide = {"Trigger": {"Namespace": "CWAgent", "MetricName": "disk_used_percent", "Dimensions": []}}
+
+    assert rollup_expression(aggregated) == (
+        'SELECT MAX(disk_used_percent) FROM SCHEMA("CWAgent", InstanceId, fstype, path) '
+        "WHERE InstanceId = 'i-1'"
+    )
+    assert rollup_expression(fleet_wide).endswith("path)")
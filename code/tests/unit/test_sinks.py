@@ -0,0 +1,183 @@
+import json
+import threading
+
+import pytest
+
+import lambda_function
+from dedup import Deduplicator
+from retry_queue import RetryQueue
+from sinks import CircuitBreaker, FanOut, FileSink, Router
+from ssm_cache import ParameterCache
+from stubs import StubRocketChat, StubSSM, synth_event
+from templates import alarm_fields
+
+
+class FakeSQS:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, QueueUrl, MessageBody, DelaySeconds=0):
+        self.sent.append(json.loads(MessageBody))
+
+
+def fields(name="prod_mnt_data_high_disk_usage", path="/data", description=None):
+    alarm = {
+        "AlarmName": name,
+        "NewStateValue": "ALARM",
+        "Trigger": {"Namespace": "CWAgent", "MetricName": "disk_used_percent",
+                    "Dimensions": [{"name": "path", "value": path}]},
+    }
+    if description:
+        alarm["AlarmDescription"] = description
+    return alarm_fields(alarm)
+
+
+def test_breaker_opens_fails_fast_and_recovers():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10, clock=lambda: now[0])
+
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] = 10
+    assert breaker.allow() and not breaker.allow()  # a single half-open trial
+    breaker.record(False)
+    assert breaker.state == "open"
+
+    now[0] = 20
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed"
+
+
+def test_routes_match_name_dimension_and_severity():
+    router = Router(
+        routes=[
+            {"match": {"severity": "critical"}, "sinks": ["email"]},
+            {"match": {"alarm_name": "prod_*", "dimension:path": ["/data*", "/var/*"]}, "sinks": ["slack"]},
+            {"match": {"alarm_name": "prod_*"}, "sinks": ["chat"], "stop": True},
+            {"match": {"state": "ALARM"}, "sinks": ["audit"]},
+        ],
+        default=["chat"],
+    )
+
+    assert router.sinks_for(fields()) == ["slack", "chat"]
+    assert router.sinks_for(fields(description="Severity: CRITICAL")) == ["email", "slack", "chat"]
+    assert router.sinks_for(fields(name="dev_root_high_disk_usage", path="/")) == ["audit"]
+    assert router.sinks_for(dict(fields(name="dev"), new_state="OK")) == ["chat"]
+
+
+def test_slow_sink_does_not_delay_the_others(tmp_path):
+    audit = tmp_path / "alarms.jsonl"
+    with StubRocketChat(latency=1.0) as slow_chat:
+        ssm = StubSSM({"/notifier/slack": slow_chat.url})
+        fanout = FanOut(ParameterCache(client_factory=lambda: ssm))
+        fanout._apply({
+            "sinks": {
+                "slack": {"type": "slack", "url_param": "/notifier/slack", "timeout": 0.2, "retries": 0,
+                          "required": False},
+                "audit": {"type": "file", "path": str(audit)},
+            },
+            "default": ["slack", "audit"],
+        })
+
+        results = fanout.deliver([{"ids": ["m1"], "message": "disk full", "fields": fields()}])
+
+    assert results[0]["status"] == "posted"
+    assert results[0]["sinks"] == {"slack": "failed", "audit": "ok"}
+    assert results[0]["latencyMs"] < 150
+    assert json.loads(audit.read_text())["message"] == "disk full"
+
+
+def test_a_failed_required_sink_fails_the_record_and_is_retried_alone(tmp_path, monkeypatch):
+    audit = tmp_path / "alarms.jsonl"
+    sqs = FakeSQS()
+    sent = sqs.sent
+    monkeypatch.setattr(lambda_function, "retry_queue", RetryQueue("retry-url", client_factory=lambda: sqs))
+    monkeypatch.setattr(lambda_function, "deduplicator", Deduplicator())
+    routes = {"sinks": {"rocketchat": {"type": "rocketchat", "retries": 0},
+                        "audit": {"type": "file", "path": str(audit)}},
+              "default": ["rocketchat", "audit"]}
+
+    with StubRocketChat(error_rate=1.0) as down:
+        parameters = ParameterCache(client_factory=lambda: StubSSM({"/rocketchat/webhook_url": down.url,
+                                                                    "/rocketchat/routes": json.dumps(routes)}))
+        monkeypatch.setattr(lambda_function, "parameters", parameters)
+        monkeypatch.setattr(lambda_function, "fanout", FanOut(parameters, parameter_name="/rocketchat/routes"))
+        first = lambda_function.lambda_handler(synth_event(1), None)
+
+    # The audit line alone does not count as delivered
+    assert first["results"][0]["status"] == "queued"
+    assert sent[0]["Sinks"] == ["rocketchat"]
+
+    with StubRocketChat() as chat:
+        parameters = ParameterCache(client_factory=lambda: StubSSM({"/rocketchat/webhook_url": chat.url,
+                                                                    "/rocketchat/routes": json.dumps(routes)}))
+        monkeypatch.setattr(lambda_function, "parameters", parameters)
+        monkeypatch.setattr(lambda_function, "fanout", FanOut(parameters, parameter_name="/rocketchat/routes"))
+        retried = lambda_function.lambda_handler({"Records": [{"messageId": "sqs-1", "body": json.dumps(sent[0])}]},
+                                                 None)
+
+    assert retried["results"][0]["status"] == "posted" and len(chat.received) == 1
+    assert len(audit.read_text().splitlines()) == 1
+
+
+def test_a_timed_out_delivery_counts_one_breaker_failure():
+    release = threading.Event()
+
+    class Hung(FileSink):
+        def send(self, message, fields):
+            release.wait(5)
+            raise TimeoutError("read timed out")
+
+    fanout = FanOut(None)
+    sink = fanout.sinks["hung"] = Hung("hung", path="/dev/null", timeout=0.05, retries=0)
+    fanout.router = Router(default=["hung"])
+
+    results = fanout.deliver([{"ids": ["m1"], "message": "disk full", "fields": fields()}])
+    release.set()
+    sink._executor.shutdown(wait=True)
+
+    assert results[0]["sinks"] == {"hung": "timeout"}
+    assert sink.breaker._failures == 1
+
+
+def test_a_throttled_sink_passes_its_retry_after_to_the_failure():
+    with StubRocketChat(throttle_rate=1.0, retry_after=30) as throttled:
+        fanout = FanOut(ParameterCache(client_factory=lambda: StubSSM({"/notifier/slack": throttled.url})))
+        fanout._apply({"sinks": {"slack": {"type": "slack", "url_param": "/notifier/slack", "retries": 0}},
+                       "default": ["slack"]})
+
+        results = fanout.deliver([{"ids": ["m1"], "message": "disk full", "fields": fields()}])
+
+    assert results[0]["status"] == "failed" and results[0]["retrySinks"] == ["slack"]
+    assert results[0]["retryAfter"] == 30.0
+
+
+def test_unknown_sinks_in_routes_are_rejected():
+    with pytest.raises(ValueError, match="undefined sinks"):
+        FanOut(None)._apply({"sinks": {}, "routes": [{"sinks": ["pager"]}]})
+
+
+def test_handler_fans_out_per_routing_table(tmp_path, monkeypatch):
+    audit = tmp_path / "alarms.jsonl"
+    with StubRocketChat() as chat:
+        ssm = StubSSM({
+            "/rocketchat/webhook_url": chat.url,
+            "/rocketchat/routes": json.dumps({
+                "sinks": {"rocketchat": {"type": "rocketchat"}, "audit": {"type": "file", "path": str(audit)}},
+                "routes": [{"match": {"dimension:path": "/mnt/vol2"}, "sinks": ["audit"]}],
+            }),
+        })
+        parameters = ParameterCache(client_factory=lambda: ssm)
+        monkeypatch.setattr(lambda_function, "parameters", parameters)
+        monkeypatch.setattr(lambda_function, "deduplicator", Deduplicator())
+        monkeypatch.setattr(lambda_function, "fanout", FanOut(parameters, parameter_name="/rocketchat/routes"))
+
+        result = lambda_function.lambda_handler(synth_event(3), None)
+
+    assert result["statusCode"] == 200
+    assert len(chat.received) == 2
+    assert [json.loads(line)["alarm"] for line in audit.read_text().splitlines()] == ["bench_mnt_vol2_high_disk_usage"]
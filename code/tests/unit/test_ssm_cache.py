@@ -0,0 +1,140 @@
+import time
+
+from ssm_cache import ParameterCache
+
+
+class FakeSSM:
+    def __init__(self):
+        self.value = "v1"
+        self.calls = 0
+
+    def get_parameter(self, Name, WithDecryption):
+        self.calls += 1
+        return {"Parameter": {"Name": Name, "Value": self.value}}
+
+
+def test_warm_hits_skip_ssm():
+    ssm = FakeSSM()
+    cache = ParameterCache(ttl=60, client_factory=lambda: ssm)
+
+    assert cache.get("/rocketchat/webhook_url") == "v1"
+    assert cache.get("/rocketchat/webhook_url") == "v1"
+
+    assert ssm.calls == 1
+    assert cache.stats() == {"hits": 1, "misses": 1, "refreshes": 0}
+
+
+def test_invalidate_forces_refetch():
+    ssm = FakeSSM()
+    cache = ParameterCache(ttl=60, client_factory=lambda: ssm)
+    cache.get("/rocketchat/webhook_url")
+
+    ssm.value = "v2"
+    cache.invalidate("/rocketchat/webhook_url")
+
+    assert cache.get("/rocketchat/webhook_url") == "v2"
+    assert ssm.calls == 2
+
+
+def test_concurrent_refetches_of_a_rejected_value_share_one_ssm_read():
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    class SlowSSM(FakeSSM):
+        def get_parameter(self, Name, WithDecryption):
+            time.sleep(0.05)
+            return super().get_parameter(Name, WithDecryption)
+
+    ssm = SlowSSM()
+    cache = ParameterCache(ttl=60, client_factory=lambda: ssm)
+    cache.get("/rocketchat/webhook_url")
+    ssm.value = "v2"
+    start = threading.Barrier(8)
+
+    def rejected():
+        start.wait()
+        return cache.refetch("/rocketchat/webhook_url", "v1")
+
+    with ThreadPoolExecutor(8) as pool:
+        values = list(pool.map(lambda _: rejected(), range(8)))
+
+    assert values == ["v2"] * 8 and ssm.calls == 2
+    # A late rejection of the old value keeps the refreshed one
+    assert cache.refetch("/rocketchat/webhook_url", "v1") == "v2" and ssm.calls == 2
+
+
+def test_a_value_confirmed_by_refetch_is_not_reread_until_its_ttl():
+    ssm = FakeSSM()
+    cache = ParameterCache(ttl=60, client_factory=lambda: ssm)
+    cache.get("/rocketchat/webhook_url")
+
+    # SSM still has the rejected value (e.g. a revoked webhook nobody rotated yet)
+    assert cache.refetch("/rocketchat/webhook_url", "v1") == "v1"
+    assert cache.refetch("/rocketchat/webhook_url", "v1") == "v1"
+    assert ssm.calls == 2
+
+
+def test_stale_entry_refreshes_in_background():
+    ssm = FakeSSM()
+    cache = ParameterCache(ttl=60, refresh_after=0.0, client_factory=lambda: ssm)
+    cache.get("/rocketchat/webhook_url")
+
+    ssm.value = "v2"
+    assert cache.get("/rocketchat/webhook_url") == "v1"
+
+    deadline = time.monotonic() + 2
+    while cache.refreshes == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.get("/rocketchat/webhook_url") == "v2"
+
+
+def test_extension_client_reads_local_cache(monkeypatch):
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    from ssm_cache import ExtensionClient
+
+    seen = {}
+
+    class Extension(BaseHTTPRequestHandler):
+        def do_GET(self):
+            seen["path"] = self.path
+            seen["token"] = self.headers.get("X-Aws-Parameters-Secrets-Token")
+            body = json.dumps({"Parameter": {"Name": "/rocketchat/webhook_url", "Value": "v-ext"}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Extension)
+    threading.Thread(target=server.handle_request, daemon=True).start()
+    monkeypatch.setenv("AWS_SESSION_TOKEN", "session-token")
+
+    cache = ParameterCache(client_factory=lambda: ExtensionClient(port=server.server_address[1]))
+
+    assert cache.get("/rocketchat/webhook_url") == "v-ext"
+    assert seen["path"] == "/systemsmanager/parameters/get?name=%2Frocketchat%2Fwebhook_url&withDecryption=true"
+    assert seen["token"] == "session-token"
+    server.server_close()
+
+
+def test_invalidated_parameter_bypasses_the_extension_cache():
+    class CachingExtension(FakeSSM):
+        caches_values = True
+
+    extension, direct = CachingExtension(), FakeSSM()
+    cache = ParameterCache(ttl=60, client_factory=lambda: extension, direct_client_factory=lambda: direct)
+    cache.get("/rocketchat/webhook_url")
+
+    # The extension still serves the rotated-out URL; SSM has the new one
+    direct.value = "v2"
+    cache.invalidate("/rocketchat/webhook_url")
+
+    assert cache.get("/rocketchat/webhook_url") == "v2"
+    assert (extension.calls, direct.calls) == (1, 1)
+    # Later reads go back through the extension
+    assert cache.get("/rocketchat/webhook_url") == "v2" and direct.calls == 1
@@ -0,0 +1,45 @@
+import io
+import json
+
+from structured_log import StructuredLogger
+
+
+def lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_lines_are_single_line_json_with_request_id():
+    stream = io.StringIO()
+    log = StructuredLogger(level="INFO", sample_rate=1.0, stream=stream)
+    log.start_invocation(type("Context", (), {"aws_request_id": "req-1"})())
+
+    log.debug("hidden")
+    log.info("shown", records=3)
+
+    (entry,) = lines(stream)
+    assert entry["msg"] == "shown"
+    assert entry["requestId"] == "req-1"
+    assert entry["records"] == 3
+
+
+def test_sampling_never_drops_warnings():
+    stream = io.StringIO()
+    log = StructuredLogger(level="DEBUG", sample_rate=0.0, stream=stream)
+    log.start_invocation()
+
+    log.info("sampled out")
+    log.warning("kept")
+
+    assert [e["msg"] for e in lines(stream)] == ["kept"]
+
+
+def test_stage_timings_accumulate():
+    log = StructuredLogger(stream=io.StringIO())
+    log.start_invocation()
+
+    for _ in range(3):
+        with log.stage("decode"):
+            pass
+
+    assert set(log.timings) == {"decode"}
+    assert log.timings["decode"] >= 0
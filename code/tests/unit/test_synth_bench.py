@@ -0,0 +1,47 @@
+import pytest
+
+from synth_bench import FLEET_SIZES, LIMITS, check_budget, measure_stack, synthetic_fleet
+
+
+def result(seconds=1.0, total_resources=10, **largest):
+    return {
+        "seconds": seconds,
+        "templates": 1,
+        "total_resources": total_resources,
+        "largest": dict({key: 1 for key in LIMITS}, **largest),
+    }
+
+
+def test_synthetic_fleet_sizes():
+    fleet = synthetic_fleet(100)
+
+    assert fleet.volume_count == 100
+    assert len(fleet.instances) == 34
+    assert len(fleet.instances[-1].volumes) == 1
+
+
+def test_budget_flags_limits_time_resources_and_regressions():
+    assert check_budget({1: {"DiskMonitorStack": result()}}) == []
+
+    violations = check_budget({100: {
+        "DiskMonitorStack": result(seconds=31.0, total_resources=400),
+        "CloudWatchAlarmStack": result(resources=501),
+    }})
+    assert len(violations) == 3
+    assert any("synth 31.00s > budget" in v for v in violations)
+    assert any("400 resources > budget 275" in v for v in violations)
+    assert any("resources 501 > limit 500" in v for v in violations)
+
+    baseline = {"1": {"LambdaStack": result(seconds=1.0, total_resources=10)}}
+    regressed = check_budget({1: {"LambdaStack": result(seconds=2.0, total_resources=11)}}, baseline)
+    assert len(regressed) == 2
+
+
+@pytest.mark.parametrize("volumes", FLEET_SIZES)
+@pytest.mark.parametrize("stack", ["DiskMonitorStack", "CloudWatchAlarmStack"])
+def test_fleet_stacks_stay_within_budget(stack, volumes):
+    pytest.importorskip("aws_cdk")
+
+    report = {volumes: {stack: measure_stack(stack, synthetic_fleet(volumes))}}
+
+    assert check_budget(report) == []
@@ -0,0 +1,116 @@
+import json
+
+from templates import CompiledTemplate, TemplateRegistry, alarm_fields, index_dimensions
+
+
+class FakeParameters:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def get(self, name):
+        self.calls += 1
+        return self.value
+
+
+def fields_for(namespace, metric, **dims):
+    return alarm_fields({
+        "AlarmName": "alarm",
+        "NewStateValue": "ALARM",
+        "Trigger": {
+            "Namespace": namespace,
+            "MetricName": metric,
+            "Threshold": 85.0,
+            "Dimensions": [{"name": k, "value": v} for k, v in dims.items()],
+        },
+    })
+
+
+def test_dimension_index_is_case_insensitive():
+    index = index_dimensions([{"name": "InstanceId", "value": "i-1"}, {"Name": "path", "Value": "/mnt/vol1"}])
+
+    assert index == {"instanceid": "i-1", "path": "/mnt/vol1"}
+
+
+def test_compiled_template_reads_fields_and_dimensions():
+    template = CompiledTemplate("{alarm_name} on {dim_device} ({missing})")
+    fields = fields_for("CWAgent", "disk_used_percent", device="nvme1n1")
+
+    assert template.render(fields) == "alarm on nvme1n1 (unknown)"
+
+
+def test_renderer_selected_by_namespace_and_metric():
+    registry = TemplateRegistry()
+
+    disk = registry.render(fields_for("CWAgent", "disk_used_percent", InstanceId="i-1", path="/mnt/vol1"))
+    cpu = registry.render(fields_for("AWS/EC2", "CPUUtilization", InstanceId="i-1"))
+    other = registry.render(fields_for("Custom", "queue_depth"))
+
+    assert disk.startswith("*Disk Alarm Triggered*") and "/mnt/vol1" in disk
+    assert cpu.startswith("*CPU Alarm Triggered*") and "85.0%" in cpu
+    assert "`Custom/queue_depth`" in other
+
+
+# SNS payload of a CloudWatchAlarmStack anomaly-band alarm as CloudWatch sends it
+ANOMALY_BAND_ALARM = {
+    "AlarmName": "mnt_vol2_high_disk_usage",
+    "AlarmDescription": "Disk usage on /mnt/vol2 above its expected band",
+    "AWSAccountId": "123456789012",
+    "AlarmConfigurationUpdatedTimestamp": "2026-10-17T08:00:00.000+0000",
+    "NewStateValue": "ALARM",
+    "NewStateReason": "Thresholds Crossed: 1 out of the last 1 datapoints [91.2 (17/10/26 09:14:00)] was greater "
+                      "than the upper thresholds [78.4] (minimum 1 datapoint for OK -> ALARM transition).",
+    "StateChangeTime": "2026-10-17T09:15:12.345+0000",
+    "Region": "US East (Ohio)",
+    "AlarmArn": "arn:aws:cloudwatch:us-east-2:123456789012:alarm:mnt_vol2_high_disk_usage",
+    "OldStateValue": "OK",
+    "OKActions": [],
+    "AlarmActions": ["arn:aws:sns:us-east-2:123456789012:DiskUsageAlertsTopic"],
+    "InsufficientDataActions": [],
+    "Trigger": {
+        "Period": 60,
+        "EvaluationPeriods": 1,
+        "ComparisonOperator": "GreaterThanUpperThreshold",
+        "ThresholdMetricId": "band",
+        "TreatMissingData": "notBreaching",
+        "EvaluateLowSampleCountPercentile": "",
+        "Metrics": [
+            {"Expression": "ANOMALY_DETECTION_BAND(used, 2)", "Id": "band", "Label": "Expected disk used (%)",
+             "ReturnData": True},
+            {"Id": "used", "ReturnData": True, "MetricStat": {
+                "Metric": {"Dimensions": [{"value": "/mnt/vol2", "name": "path"},
+                                          {"value": "i-0abc123", "name": "InstanceId"},
+                                          {"value": "ext4", "name": "fstype"}],
+                           "MetricName": "disk_used_percent", "Namespace": "CWAgent"},
+                "Period": 60, "Stat": "Average"}},
+        ],
+    },
+}
+
+
+def test_anomaly_band_alarms_read_the_metric_from_trigger_metrics():
+    from history import transition
+
+    fields = alarm_fields(ANOMALY_BAND_ALARM)
+
+    assert (fields["namespace"], fields["metric"]) == ("CWAgent", "disk_used_percent")
+    assert (fields["instance_id"], fields["path"], fields["fstype"]) == ("i-0abc123", "/mnt/vol2", "ext4")
+    assert fields["used_percent"] == 91.2
+    assert TemplateRegistry().render(fields).startswith("*Disk Alarm Triggered*")
+    entry = transition({"fields": fields, "alarm": ANOMALY_BAND_ALARM})
+    assert (entry["instance"], entry["volume"]) == ("i-0abc123", "/mnt/vol2")
+
+
+def test_ssm_overrides_recompile_only_on_change(tmp_path):
+    local = tmp_path / "templates.json"
+    local.write_text(json.dumps({"CWAgent:*": "agent {metric}"}))
+    parameters = FakeParameters(json.dumps({"CWAgent:disk_used_percent": "disk {path}"}))
+    registry = TemplateRegistry(file_path=str(local), parameter_name="/rocketchat/templates", parameters=parameters)
+
+    registry.refresh()
+    compiled = registry.renderer_for("CWAgent", "disk_used_percent")
+    registry.refresh()
+
+    assert registry.renderer_for("CWAgent", "disk_used_percent") is compiled
+    assert registry.render(fields_for("CWAgent", "disk_used_percent", path="/mnt/vol2")) == "disk /mnt/vol2"
+    assert registry.render(fields_for("CWAgent", "swap_used_percent")) == "agent swap_used_percent"
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+import lambda_function
+from dedup import Deduplicator
+from stacks.fleet import instance_filter, load_fleet
+from stacks.thresholds import ThresholdStore, apply_thresholds, fetch_thresholds
+from ssm_cache import ParameterCache
+from stubs import StubSSM, synth_alarm
+from templates import alarm_fields
+from thresholds import ThresholdIndex
+
+PATH = "/diskmonitor/thresholds"
+
+ENTRIES = {
+    "default": "85",
+    "path/var/log": "70",
+    "instance/EBSAlertTestEC2/volume/vol1": "95",
+    "instance/EBSAlertTestEC2/path/mnt": "90",
+    "instance/i-0bench000000000000/volume/vol3": "anomaly:3",
+}
+
+
+class FakePaginatedSSM:
+    def __init__(self, entries, page_size=2):
+        self.parameters = [{"Name": f"{PATH}/{key}", "Value": value} for key, value in entries.items()]
+        self.page_size = page_size
+        self.calls = 0
+
+    def get_paginator(self, name):
+        assert name == "get_parameters_by_path"
+        return self
+
+    def paginate(self, Path, Recursive):
+        self.calls += 1
+        for start in range(0, len(self.parameters), self.page_size):
+            yield {"Parameters": self.parameters[start:start + self.page_size]}
+
+
+def test_most_specific_entry_wins():
+    store = fetch_thresholds(PATH, client=FakePaginatedSSM(ENTRIES))
+
+    assert store.resolve(["EBSAlertTestEC2"], "vol1", "/mnt/vol1") == ("percent", 95.0, "instance/EBSAlertTestEC2/volume/vol1")
+    assert store.resolve(["EBSAlertTestEC2"], "vol2", "/mnt/vol2")[2] == "instance/EBSAlertTestEC2/path/mnt"
+    assert store.resolve(["Other"], "logs", "/var/log/app")[1] == 70.0
+    assert store.resolve(["Other"], "logs", "/var/logs")[2] == "default"
+
+    with pytest.raises(ValueError, match="percent"):
+        ThresholdStore({"default": "120"})
+
+
+def test_store_thresholds_give_volumes_their_own_alarms():
+    store = ThresholdStore({"default": "85", "instance/EBSAlertTestEC2/volume/vol1": "95",
+                            "instance/EBSAlertTestEC2/volume/vol2": "anomaly"})
+    fleet = apply_thresholds(load_fleet(), store)
+    vol1, vol2, vol3 = fleet.instances[0].volumes
+
+    assert (vol1.threshold_percent, vol2.anomaly_band, vol3.own_threshold) == (95.0, 2.0, False)
+    assert instance_filter(fleet.instances[0], "i-1") == "InstanceId = 'i-1' AND path != '/mnt/vol1' AND path != '/mnt/vol2'"
+    # The fleet passed in is left untouched for DiskMonitorStack
+    assert not any(volume.own_threshold for volume in load_fleet().instances[0].volumes)
+
+
+def test_index_is_cached_and_annotates_headroom():
+    now = [0.0]
+    ssm = FakePaginatedSSM(ENTRIES)
+    index = ThresholdIndex(PATH, ttl=300, client_factory=lambda: ssm, clock=lambda: now[0])
+
+    alarm = dict(synth_alarm(0), AlarmDescription="instance=EBSAlertTestEC2 volume=vol1")
+    index.refresh()
+    fields = index.annotate(alarm, alarm_fields(alarm))
+    assert (fields["effective_threshold"], fields["headroom"]) == ("95%", "+4.7 pts")
+    assert fields["threshold_source"] == f"{PATH}/instance/EBSAlertTestEC2/volume/vol1"
+
+    # Entries keyed by EC2 instance id match the InstanceId dimension
+    alarm = dict(synth_alarm(2), AlarmDescription="instance=BenchHost volume=vol3")
+    fields = index.annotate(alarm, alarm_fields(alarm))
+    assert fields["effective_threshold"] == "anomaly band ±3σ"
+
+    now[0] = 200
+    index.refresh()
+    now[0] = 301
+    index.refresh()
+    assert ssm.calls == 2
+
+
+def test_handler_message_shows_effective_threshold(monkeypatch):
+    posted = []
+    monkeypatch.setattr(lambda_function, "deduplicator", Deduplicator())
+    monkeypatch.setattr(lambda_function, "parameters",
+                        ParameterCache(client_factory=lambda: StubSSM({"/rocketchat/webhook_url": "https://chat"})))
+    monkeypatch.setattr(lambda_function, "post_message", lambda url, message: posted.append(message) or 200)
+    monkeypatch.setattr(lambda_function, "thresholds",
+                        ThresholdIndex(PATH, client_factory=lambda: FakePaginatedSSM({"path/mnt": "80"})))
+
+    record = {"Sns": {"MessageId": "m1", "Message": json.dumps(synth_alarm(0))}}
+    lambda_function.lambda_handler({"Records": [record]}, None)
+
+    assert "Threshold: 80% (headroom -10.3 pts)" in posted[0]